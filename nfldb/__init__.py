@@ -60,10 +60,11 @@ from __future__ import absolute_import, division, print_function
 
 from nfldb.db import __pdoc__ as __db_pdoc__
 from nfldb.db import api_version, connect, now, set_timezone, schema_version
-from nfldb.db import Tx
+from nfldb.db import add_query_hook, bulk_load, remove_query_hook
+from nfldb.db import pool, Pool, Tx
 from nfldb.query import __pdoc__ as __query_pdoc__
 from nfldb.query import aggregate, current, guess_position, player_search
-from nfldb.query import Query, QueryOR
+from nfldb.query import Param, Query, QueryOR
 from nfldb.team import standard_team
 from nfldb.types import __pdoc__ as __types_pdoc__
 from nfldb.types import stat_categories
@@ -82,11 +83,12 @@ __pdoc__ = dict(__pdoc__, **__version_pdoc__)
 __all__ = [
     # nfldb.db
     'api_version', 'connect', 'now', 'set_timezone', 'schema_version',
+    'add_query_hook', 'bulk_load', 'remove_query_hook', 'pool', 'Pool',
     'Tx',
 
     # nfldb.query
     'aggregate', 'current', 'guess_position', 'player_search',
-    'Query', 'QueryOR',
+    'Param', 'Query', 'QueryOR',
 
     # nfldb.team
     'standard_team',
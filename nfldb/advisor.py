@@ -0,0 +1,419 @@
+"""
+An index advisor for `nfldb` databases. It observes the criteria used
+in `nfldb.Query` objects and suggests indexes that would make them
+faster, using the statistics PostgreSQL keeps about every column.
+
+The advisor is a query hook, so it is used by registering it with
+`nfldb.add_query_hook` and running a representative workload:
+
+    #!python
+    import nfldb.advisor
+
+    advisor = nfldb.advisor.IndexAdvisor()
+    nfldb.add_query_hook(advisor)
+
+    # ... run queries ...
+
+    with nfldb.Tx(db) as cursor:
+        print advisor.report(cursor)
+
+        # Optionally, create the suggested indexes.
+        advisor.create(cursor, advisor.suggest(cursor))
+"""
+from __future__ import absolute_import, division, print_function
+from collections import defaultdict
+import re
+import threading
+
+from nfldb.db import _row_values
+from nfldb.query import Comparison, Param, Query
+
+
+_MAX_DISJUNCTS = 64
+"""
+The maximum number of conjunctions that a single query's criteria is
+expanded to. Anything beyond this is ignored.
+"""
+
+_DEFAULT_EQ_SEL = 0.005
+"""
+The selectivity of an equality comparison on a column without any
+statistics. (This is the same default that PostgreSQL uses.)
+"""
+
+_DEFAULT_RANGE_SEL = 1 / 3
+"""
+The selectivity of a range comparison. (This is the same default that
+PostgreSQL uses.)
+"""
+
+
+class IndexSuggestion (object):
+    """
+    A single index suggested by `nfldb.advisor.IndexAdvisor`.
+    """
+    __slots__ = ['table', 'columns', 'where', 'count', 'seconds',
+                 'selectivity', 'rows']
+
+    def __init__(self, table, columns, where, count, seconds, selectivity,
+                 rows):
+        self.table = table
+        """The table that the index is on."""
+
+        self.columns = columns
+        """
+        The list of columns in the index, in order. Columns compared
+        with equality always come before a column compared with a
+        range operator.
+        """
+
+        self.where = where
+        """
+        The predicate of a partial index as a SQL string, or `None`
+        if the index isn't partial.
+        """
+
+        self.count = count
+        """The number of statements that would have used this index."""
+
+        self.seconds = seconds
+        """The total time in seconds spent executing those statements."""
+
+        self.selectivity = selectivity
+        """
+        The estimated fraction of rows in `table` that satisfy the
+        criteria this index is suggested for.
+        """
+
+        self.rows = rows
+        """The estimated number of rows satisfying the criteria."""
+
+    @property
+    def name(self):
+        """A name for the index that won't conflict with nfldb's."""
+        name = 'advised_%s_%s' % (self.table, '_'.join(self.columns))
+        if self.where is not None:
+            name += '_partial'
+        return name[0:63]
+
+    @property
+    def sql(self):
+        """The `CREATE INDEX` statement for this index."""
+        s = 'CREATE INDEX %s ON %s (%s)' \
+            % (self.name, self.table, ', '.join(self.columns))
+        if self.where is not None:
+            s += ' WHERE %s' % self.where
+        return s
+
+    def __str__(self):
+        return '%s  -- %d statements, %.3fs total, ~%d rows (%.4f%%)' \
+               % (self.sql, self.count, self.seconds, self.rows,
+                  100 * self.selectivity)
+
+
+class IndexAdvisor (object):
+    """
+    A query hook that records the shape of the criteria in every
+    `nfldb.Query` executed: which columns of which tables are compared
+    together, and whether each comparison is an equality or a range.
+    `nfldb.advisor.IndexAdvisor.suggest` turns the recorded shapes into
+    composite and partial index suggestions. It is safe to use from
+    multiple threads.
+
+    Use it with `nfldb.add_query_hook`. Only statements executed by a
+    `nfldb.Query` method are recorded.
+    """
+    def __init__(self, partial_frac=0.9, partial_max_distinct=10):
+        """
+        Introduces a new advisor with no recorded shapes.
+
+        A column compared with equality is moved into the predicate of
+        a partial index (instead of being a column in the index) if it
+        is compared with the same value in at least `partial_frac` of
+        the statements and has at most `partial_max_distinct` distinct
+        values. (e.g., `season_type = 'Regular'`.)
+        """
+        self.partial_frac = partial_frac
+        self.partial_max_distinct = partial_max_distinct
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets every shape recorded so far."""
+        with self.__lock:
+            self.__counts = defaultdict(int)
+            self.__seconds = defaultdict(float)
+            self.__values = defaultdict(lambda: defaultdict(int))
+
+    def __call__(self, event):
+        if event.query is None:
+            return
+        seen = set()
+        for conj in _conjunctions(event.query):
+            kinds, values = defaultdict(dict), defaultdict(dict)
+            for comp in conj:
+                table, kind = _table_of(comp), _kind(comp)
+                if table is None or kind is None:
+                    continue
+                if kinds[table].get(comp.column) != 'eq':
+                    kinds[table][comp.column] = kind
+                if kind == 'eq' \
+                        and not isinstance(comp.value, (list, tuple, Param)):
+                    values[table][comp.column] = comp.value
+            for table, cols in kinds.items():
+                shape = (table, tuple(sorted(cols.items())))
+                if shape in seen:
+                    continue
+                seen.add(shape)
+                with self.__lock:
+                    self.__counts[shape] += 1
+                    self.__seconds[shape] += event.seconds
+                    for col, v in values[table].items():
+                        self.__values[(shape, col)][v] += 1
+
+    def shapes(self):
+        """
+        Returns a list of triples `(table, columns, count)` for every
+        recorded shape, sorted by the time spent in statements with
+        that shape in descending order. `columns` is a list of pairs
+        `(column, kind)` where `kind` is either `eq` or `range`.
+        """
+        with self.__lock:
+            shapes = sorted(self.__counts, key=self.__seconds.get,
+                            reverse=True)
+            return [(t, list(cols), self.__counts[(t, cols)])
+                    for t, cols in shapes]
+
+    def suggest(self, cursor, min_count=1, max_selectivity=0.1):
+        """
+        Returns a list of `nfldb.advisor.IndexSuggestion` objects for
+        the recorded shapes, sorted by the time spent in statements
+        that would use them in descending order.
+
+        Shapes seen fewer than `min_count` times are skipped, as are
+        shapes whose estimated selectivity is greater than
+        `max_selectivity` (since an index is unlikely to be used).
+        Shapes already covered by an existing index are also skipped.
+
+        `cursor` must be a cursor from `nfldb.Tx`. Selectivity is
+        estimated from the `pg_stats` view, so the statistics should be
+        up to date (run `ANALYZE`).
+        """
+        with self.__lock:
+            shapes = [(shape, self.__counts[shape], self.__seconds[shape])
+                      for shape in self.__counts]
+            values = dict((k, dict(v)) for k, v in self.__values.items())
+
+        suggestions = []
+        existing = _existing_indexes(cursor)
+        for (table, cols), count, seconds in shapes:
+            if count < min_count:
+                continue
+            stats = _column_stats(cursor, table, [c for c, _ in cols])
+            total = stats.pop(None)
+            sel, keys, ranges, where = 1.0, [], [], []
+            for col, kind in cols:
+                distinct = stats.get(col)
+                if kind == 'range':
+                    sel *= _DEFAULT_RANGE_SEL
+                    ranges.append((_DEFAULT_RANGE_SEL, col))
+                    continue
+                colsel = _DEFAULT_EQ_SEL if not distinct else 1 / distinct
+                sel *= colsel
+                v, n = _most_common(values.get(((table, cols), col), {}))
+                if n >= self.partial_frac * count and distinct \
+                        and distinct <= self.partial_max_distinct:
+                    where.append(cursor.mogrify('%s = %%s' % col, (v,)))
+                else:
+                    keys.append((colsel, col))
+            if sel > max_selectivity:
+                continue
+
+            # Most selective equality columns first. Only one range
+            # column can be used to narrow an index scan, so we pick
+            # the most selective one and put it last.
+            columns = [c for _, c in sorted(keys)]
+            if len(ranges) > 0:
+                columns.append(min(ranges)[1])
+            if len(columns) == 0:
+                continue
+            where = ' AND '.join(where) if where else None
+            if _covered(existing.get(table, []), columns, where):
+                continue
+            suggestions.append(IndexSuggestion(
+                table, columns, where, count, seconds, sel, int(total * sel)))
+        suggestions.sort(key=lambda s: s.seconds, reverse=True)
+        return suggestions
+
+    def unused(self, cursor):
+        """
+        Returns a list of triples `(table, index, bytes)` of every
+        non-unique single column index that has never been used in an
+        index scan, with the largest indexes first.
+
+        Note that this uses PostgreSQL's cumulative statistics, which
+        count index scans since the statistics were last reset.
+        """
+        cursor.execute('''
+            SELECT s.relname, s.indexrelname,
+                   pg_relation_size(s.indexrelid) AS size
+            FROM pg_stat_user_indexes AS s
+            JOIN pg_index AS i ON i.indexrelid = s.indexrelid
+            WHERE s.schemaname = current_schema()
+              AND s.idx_scan = 0 AND i.indnatts = 1
+              AND NOT i.indisunique AND NOT i.indisprimary
+            ORDER BY size DESC, s.relname, s.indexrelname
+        ''')
+        return [_row_values(row, 'relname', 'indexrelname', 'size')
+                for row in cursor.fetchall()]
+
+    def create(self, cursor, suggestions):
+        """
+        Creates every index in `suggestions`, which should be a list
+        of `nfldb.advisor.IndexSuggestion` objects.
+
+        Note that creating an index blocks writes to its table until
+        the transaction is committed.
+        """
+        for s in suggestions:
+            cursor.execute(s.sql)
+
+    def report(self, cursor, **kwargs):
+        """
+        Returns a human readable report of suggested indexes and unused
+        single column indexes. Any keyword arguments are passed to
+        `nfldb.advisor.IndexAdvisor.suggest`.
+        """
+        lines = ['Suggested indexes:']
+        for s in self.suggest(cursor, **kwargs):
+            lines.append('    %s' % s)
+        lines.append('Unused single column indexes:')
+        for table, index, size in self.unused(cursor):
+            lines.append('    %s on %s (%d KB)' % (index, table, size // 1024))
+        return '\n'.join(lines)
+
+
+def _conjunctions(q):
+    """
+    Returns the criteria in the `nfldb.Query` `q` in disjunctive
+    normal form, as a list of lists of `nfldb.Comparison` objects.
+    (Aggregate criteria are ignored, since they can't use an index.)
+    """
+    disjuncts = []
+    for conds in [q._andalso] + [[c] for c in q._orelse]:
+        if len(conds) == 0:
+            continue
+        conjs = [[]]
+        for c in conds:
+            if isinstance(c, Comparison):
+                alts = [[c]]
+            elif isinstance(c, Query):
+                alts = _conjunctions(c) or [[]]
+            else:
+                continue
+            conjs = [a + b for a in conjs for b in alts][0:_MAX_DISJUNCTS]
+        disjuncts += conjs
+    return disjuncts[0:_MAX_DISJUNCTS]
+
+
+def _table_of(comp):
+    """
+    Returns the table storing the column in `comp`, or `None` if it
+    is a derived field.
+    """
+    try:
+        return comp.entity._sql_column_to_table(comp.column)
+    except KeyError:
+        return None
+
+
+def _kind(comp):
+    """
+    Returns `eq` or `range` for the operator in `comp`, or `None` if
+    an index can't be used for it.
+    """
+    if comp.operator == '=':
+        return 'eq'
+    elif comp.operator in ('<', '<=', '>', '>='):
+        return 'range'
+    return None
+
+
+def _most_common(counts):
+    if len(counts) == 0:
+        return None, 0
+    return max(counts.items(), key=lambda x: x[1])
+
+
+def _column_stats(cursor, table, columns):
+    """
+    Returns a dictionary mapping each column in `columns` with
+    statistics to its estimated number of distinct values. The total
+    number of rows in `table` is mapped from `None`.
+    """
+    cursor.execute('''
+        SELECT reltuples FROM pg_class WHERE oid = %s::regclass
+    ''', (table,))
+    total = max(1, _row_values(cursor.fetchone(), 'reltuples')[0])
+    cursor.execute('''
+        SELECT attname, n_distinct FROM pg_stats
+        WHERE schemaname = current_schema() AND tablename = %s
+          AND attname = ANY (%s)
+    ''', (table, columns))
+    stats = {None: total}
+    for row in cursor.fetchall():
+        col, n = _row_values(row, 'attname', 'n_distinct')
+        stats[col] = n if n > 0 else -n * total
+    return stats
+
+
+def _existing_indexes(cursor):
+    """
+    Returns a dictionary mapping table name to a list of pairs
+    `(columns, where)` for each index on the table.
+    """
+    cursor.execute('''
+        SELECT tablename, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema()
+    ''')
+    indexes = defaultdict(list)
+    for row in cursor.fetchall():
+        table, indexdef = _row_values(row, 'tablename', 'indexdef')
+        m = re.search(r'USING \w+ \((.*?)\)(?: WHERE (.*))?$', indexdef)
+        if m is None:
+            continue
+        cols = [re.sub(r'\s+(ASC|DESC).*$', '', c.strip())
+                for c in m.group(1).split(',')]
+        indexes[table].append((cols, m.group(2)))
+    return indexes
+
+
+def _covered(indexes, columns, where):
+    """
+    Returns true if one of `indexes` (as returned by
+    `nfldb.advisor._existing_indexes`) can already be used in place of
+    an index on `columns` with the partial predicate `where`. A partial
+    index can only be used if its predicate is the same as `where`.
+    """
+    wanted = set(columns)
+    for cols, iwhere in indexes:
+        if iwhere is not None and _conjuncts(iwhere) != _conjuncts(where):
+            continue
+        if set(cols[0:len(columns)]) == wanted:
+            return True
+    return False
+
+
+def _conjuncts(where):
+    """
+    Returns the set of conditions that are combined with `AND` in the
+    partial index predicate `where`, without the parentheses and type
+    casts that PostgreSQL adds to the predicates of existing indexes.
+    Returns `None` if `where` is `None`.
+    """
+    if where is None:
+        return None
+    where = re.sub(r'::[\w ]+(?=\)|$)', '', where)
+    where = where.replace('(', '').replace(')', '')
+    return set(re.sub(r'\s+', ' ', c).strip()
+               for c in re.split(r'\s+AND\s+', where))
@@ -0,0 +1,312 @@
+"""
+A non-blocking interface for running `nfldb.Query` searches, for use
+in event driven applications (e.g., a web server built on an event
+loop) where tying up a thread for every query is too costly.
+
+It uses psycopg2's asynchronous connections, so it works with any
+event loop that can watch a file descriptor. Queries are built with
+`nfldb.aio.AsyncQuery`, which is a `nfldb.Query` with additional
+`as_*_async` methods. Each of them starts a query and immediately
+returns a `nfldb.aio.Pending` object that completes when the results
+are ready:
+
+    #!python
+    import nfldb.aio
+
+    conns = [nfldb.aio.connect() for _ in range(4)]
+    pending = []
+    for week, conn in zip([1, 2, 3, 4], conns):
+        q = nfldb.aio.AsyncQuery(conn).game(season_year=2013, week=week)
+        pending.append(q.as_games_async())
+    for games in nfldb.aio.wait(pending):
+        print len(games)
+
+A connection can only run one query at a time, so the number of
+queries in flight is the number of connections. An event loop should
+register `nfldb.aio.Pending.fileno` for reading or writing (as given
+by `nfldb.aio.Pending.writing`) and call `nfldb.aio.Pending.poll`
+whenever it is ready.
+
+Note that asynchronous connections are always in autocommit mode, so
+they cannot be used with `nfldb.Tx` or with the blocking methods of
+`nfldb.Query`. Query hooks (see `nfldb.add_query_hook`) are not run
+for asynchronous queries.
+
+For the same reason, the objects returned can only load related data
+lazily (e.g., `nfldb.Game.drives` or `nfldb.PlayPlayer.player`) if a
+separate blocking connection is given to `nfldb.aio.AsyncQuery` with
+its `db` argument. Lazy loads block on that connection. Without one,
+accessing data that wasn't loaded raises an assertion error.
+"""
+from __future__ import absolute_import, division, print_function
+import select
+
+import psycopg2
+from psycopg2.extensions import POLL_OK, POLL_READ, POLL_WRITE
+from psycopg2.extensions import cursor as tuple_cursor
+from psycopg2.extras import RealDictCursor
+
+from nfldb.db import _bootstrap, _connect_params
+from nfldb.query import AggPP, Query, _sql_by_keys
+import nfldb.types as types
+
+
+_bootstrapped = set()
+"""
+The connection parameters of every database that has had its schema
+checked and its types registered by `nfldb.aio.connect`.
+"""
+
+
+def connect(database=None, user=None, password=None, host=None, port=None,
+            timezone=None, config_path=''):
+    """
+    Returns a new asynchronous `psycopg2._psycopg.connection` object.
+    The parameters are exactly the same as the ones for
+    `nfldb.connect`.
+
+    The first time a database is connected to, its schema is checked
+    and the SQL types used by `nfldb` are registered using a normal
+    (blocking) connection. Opening the asynchronous connection itself
+    also blocks until it is ready, so connections should be opened
+    when an application starts.
+    """
+    params, timezone = _connect_params(database, user, password, host, port,
+                                       timezone, config_path)
+    key = tuple(sorted(params.items()))
+    if key not in _bootstrapped:
+        conn = psycopg2.connect(**params)
+        try:
+            _bootstrap(conn, None)
+        finally:
+            conn.close()
+        _bootstrapped.add(key)
+
+    if timezone is not None:
+        params['options'] = '-c timezone=%s' % timezone.replace(' ', '\\ ')
+    conn = psycopg2.connect(async=True, **params)
+    _wait_conn(conn)
+    return conn
+
+
+def _wait_conn(conn):
+    """Blocks until the asynchronous connection `conn` is idle."""
+    while True:
+        state = conn.poll()
+        if state == POLL_OK:
+            return
+        elif state == POLL_READ:
+            select.select([conn.fileno()], [], [])
+        elif state == POLL_WRITE:
+            select.select([], [conn.fileno()], [])
+
+
+def wait(pending, timeout=None):
+    """
+    Blocks until every `nfldb.aio.Pending` object in the list
+    `pending` is done and returns a list of their results in the same
+    order. The queries make progress concurrently.
+
+    If `timeout` is not `None`, then a `nfldb.aio.Timeout` exception is
+    raised if no query makes progress within `timeout` seconds.
+    """
+    running = [p for p in pending if not p.done]
+    while len(running) > 0:
+        rs = [p for p in running if not p.writing]
+        ws = [p for p in running if p.writing]
+        rs, ws, _ = select.select(rs, ws, [], timeout)
+        if len(rs) == 0 and len(ws) == 0:
+            raise Timeout()
+        for p in rs + ws:
+            p.poll()
+        running = [p for p in running if not p.done]
+    return [p.result() for p in pending]
+
+
+class Timeout (Exception):
+    """Raised by `nfldb.aio.wait` when no query makes progress."""
+    pass
+
+
+class _Return (object):
+    """Yielded by a query task to finish with `value`."""
+    __slots__ = ['value']
+
+    def __init__(self, value):
+        self.value = value
+
+
+class Pending (object):
+    """
+    A query that is running on an asynchronous connection. It is
+    driven by calling `nfldb.aio.Pending.poll` whenever its file
+    descriptor is ready, either by an event loop or by
+    `nfldb.aio.wait`.
+
+    Some queries need more than one SQL statement (e.g., filling plays
+    with play players), which are run one after another on the same
+    connection.
+    """
+    def __init__(self, conn, task, factory=tuple_cursor):
+        """
+        Starts a query on `conn`. `task` is a function that is given
+        a cursor and returns a generator. The generator yields SQL
+        statements to execute and is sent the rows of each one. It
+        finishes by yielding a `nfldb.aio._Return` value.
+        """
+        self.connection = conn
+        """The connection that the query is running on."""
+
+        self.done = False
+        """Whether the query has finished."""
+
+        self.writing = False
+        """
+        Whether the query is waiting for the connection to be ready
+        for writing, as opposed to reading.
+        """
+
+        self.__cursor = conn.cursor(cursor_factory=factory)
+        self.__task = task(self.__cursor)
+        self.__value = None
+        self.__error = None
+        self.__step(None)
+
+    def fileno(self):
+        """Returns the file descriptor of the connection."""
+        return self.connection.fileno()
+
+    def poll(self):
+        """
+        Makes as much progress on the query as possible without
+        blocking, and returns whether it is done.
+        """
+        if self.done:
+            return True
+        try:
+            state = self.connection.poll()
+        except Exception as e:
+            self.__finish(error=e)
+            return True
+        if state == POLL_OK:
+            if self.__cursor.description is None:
+                rows = None
+            else:
+                rows = self.__cursor.fetchall()
+            self.__step(rows)
+        else:
+            self.writing = state == POLL_WRITE
+        return self.done
+
+    def result(self):
+        """
+        Returns the results of the query, blocking until it is done.
+        If the query failed, then its exception is raised.
+        """
+        if not self.done:
+            wait([self])
+        if self.__error is not None:
+            raise self.__error
+        return self.__value
+
+    def __step(self, rows):
+        try:
+            step = self.__task.send(rows)
+            if isinstance(step, _Return):
+                self.__finish(value=step.value)
+            else:
+                self.writing = False
+                self.__cursor.execute(step)
+        except Exception as e:
+            self.__finish(error=e)
+
+    def __finish(self, value=None, error=None):
+        self.done = True
+        self.__value, self.__error = value, error
+        self.__task.close()
+        self.__cursor.close()
+
+
+class AsyncQuery (Query):
+    """
+    A `nfldb.Query` whose results can be retrieved without blocking.
+    It must be given a connection from `nfldb.aio.connect`, and only
+    the `as_*_async` methods may be used to retrieve results.
+
+    Each `as_*_async` method returns a `nfldb.aio.Pending` object whose
+    result is the same as the corresponding `as_*` method of
+    `nfldb.Query`.
+    """
+    def __init__(self, conn, orelse=False, db=None):
+        """
+        Introduces a new query that runs on the asynchronous connection
+        `conn`. If `db` is a blocking connection to the same database
+        (e.g., from `nfldb.connect`), then the objects returned use it
+        to lazily load related data. Otherwise, they have no
+        connection and related data can't be loaded.
+        """
+        super(AsyncQuery, self).__init__(conn, orelse=orelse)
+
+        self._lazy_db = db
+        """The connection given to the objects returned, or `None`."""
+
+    def as_games_async(self):
+        """The asynchronous version of `nfldb.Query.as_games`."""
+        return self.__entities(types.Game)
+
+    def as_drives_async(self):
+        """The asynchronous version of `nfldb.Query.as_drives`."""
+        return self.__entities(types.Drive)
+
+    def as_plays_async(self, fill=True):
+        """
+        The asynchronous version of `nfldb.Query.as_plays`. Note that
+        if `fill` is `True`, then the play players are fetched with a
+        separate statement outside of any transaction.
+        """
+        self._assert_no_aggregate()
+
+        def task(cursor):
+            rows = yield self._make_join_query(cursor, types.Play,
+                                               sorter=self._play_sorter())
+            plays = [types.Play.from_row_tuple(self._lazy_db, r)
+                     for r in rows]
+            if fill:
+                by_pid = {}
+                for p in plays:
+                    p._play_players = []
+                    by_pid[(p.gsis_id, p.drive_id, p.play_id)] = p
+                for q in _sql_by_keys(cursor, types.PlayPlayer,
+                                      by_pid.keys()):
+                    for row in (yield q):
+                        pp = types.PlayPlayer.from_row_tuple(self._lazy_db,
+                                                             row)
+                        pid = (pp.gsis_id, pp.drive_id, pp.play_id)
+                        by_pid[pid]._play_players.append(pp)
+            yield _Return(plays)
+        return Pending(self._db, task)
+
+    def as_play_players_async(self):
+        """The asynchronous version of `nfldb.Query.as_play_players`."""
+        return self.__entities(types.PlayPlayer)
+
+    def as_players_async(self):
+        """The asynchronous version of `nfldb.Query.as_players`."""
+        return self.__entities(types.Player)
+
+    def as_aggregate_async(self, group_by=None):
+        """The asynchronous version of `nfldb.Query.as_aggregate`."""
+        def task(cursor):
+            rows = yield self._make_aggregate_query(cursor, group_by=group_by)
+            yield _Return([AggPP.from_row_dict(self._lazy_db, r)
+                           for r in rows])
+        return Pending(self._db, task, factory=RealDictCursor)
+
+    def __entities(self, entity):
+        self._assert_no_aggregate()
+
+        def task(cursor):
+            rows = yield self._make_join_query(cursor, entity)
+            yield _Return([entity.from_row_tuple(self._lazy_db, r)
+                           for r in rows])
+        return Pending(self._db, task)
@@ -0,0 +1,225 @@
+"""
+An opt-in, in-process cache of query results. Applications that run
+the same `nfldb.Query` many times between runs of `nfldb-update`
+(e.g., dashboards) can avoid most trips to the database by giving a
+`nfldb.cache.QueryCache` to their queries:
+
+    #!python
+    import nfldb
+    import nfldb.cache
+
+    db = nfldb.connect()
+    cache = nfldb.cache.QueryCache(max_bytes=128 * 1024**2)
+
+    q = nfldb.Query(db, cache=cache).game(season_year=2013, week=1)
+    for game in q.as_games():  # Runs the query.
+        print game
+    for game in q.as_games():  # Uses cached rows.
+        print game
+
+Results are cached as the rows returned by PostgreSQL, keyed on the
+SQL generated for the query, so every call still returns new
+objects. Along with its rows, each result records the games it could
+depend on, which are the games matching its criteria on `gsis_id`,
+`season_year`, `season_type` and `week` (or every game, if it has no
+such criteria). When `nfldb-update` writes data for some games, only
+the results that could depend on them are invalidated. Results for
+finished games therefore stay cached until they are evicted to make
+room for newer results. Adding new games invalidates every result,
+and changing players invalidates the results that depend on player
+data (i.e., that return, search or sort on players).
+"""
+from __future__ import absolute_import, division, print_function
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+import re
+import sys
+import threading
+import time
+
+from nfldb.db import _changed_games, _generation, _has_writes, _row_values
+
+
+_sql_whitespace = re.compile(r"('(?:[^']|'')*')|\s+")
+
+
+def normalize_sql(sql):
+    """
+    Returns `sql` with every run of white space outside of string
+    literals collapsed to a single space. This is used as the cache
+    key, so that indentation doesn't matter.
+    """
+    return _sql_whitespace.sub(lambda m: m.group(1) or ' ', sql).strip()
+
+
+class QueryCache (object):
+    """
+    A least recently used cache of query results that is bounded by
+    the approximate number of bytes used by the cached rows. It is
+    safe to share between threads and between connections (even to
+    different databases).
+
+    Give it to `nfldb.Query` with the `cache` keyword argument. Only
+    the `as_*` methods use the cache; the streaming `iter_*` methods
+    never do. Queries run inside a transaction that has written
+    anything bypass the cache, since they may see uncommitted data.
+    This is checked once for each cursor, which costs a query only if
+    the cursor's transaction was already open before its first lookup.
+
+    Note that a lookup isn't always free: whenever `check_interval`
+    seconds have passed since the last check, the data generation of
+    the database is read first (and the games that changed, if it
+    changed). A miss also runs a query for the games that the result
+    could depend on.
+    """
+    def __init__(self, max_bytes=64 * 1024**2, check_interval=5.0):
+        """
+        Introduces a new empty cache that holds at most about
+        `max_bytes` bytes of rows. A single result larger than
+        `max_bytes` is never cached.
+
+        The data generation of a database is checked at most once every
+        `check_interval` seconds, so results may be up to that many
+        seconds out of date. An interval of `0` checks it before every
+        lookup, which guarantees that cached results are never stale
+        but costs a query for every hit.
+        """
+        self.max_bytes = max_bytes
+        """The maximum size of all cached rows in bytes."""
+
+        self.check_interval = check_interval
+        """The number of seconds between data generation checks."""
+
+        self.__lock = threading.Lock()
+        self.__generations = {}
+        self.__writes = threading.local()
+        self.clear()
+
+    def clear(self):
+        """Removes every cached result and resets the statistics."""
+        with self.__lock:
+            self.__entries = OrderedDict()
+            self.__bytes = 0
+            self.__hits = 0
+            self.__misses = 0
+
+    @property
+    def size(self):
+        """The approximate number of bytes used by cached rows."""
+        return self.__bytes
+
+    @property
+    def hits(self):
+        """The number of lookups that used a cached result."""
+        return self.__hits
+
+    @property
+    def misses(self):
+        """The number of lookups that had to run a query."""
+        return self.__misses
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def fetchall(self, cursor, sql, games=None):
+        """
+        Returns the rows of the query `sql` as a list, either from the
+        cache or by executing it with `cursor`. The rows returned must
+        not be modified.
+
+        `games` is the GSIS identifiers of every game that the results
+        could depend on, either as a list or as a SQL query that
+        returns them. If it is `None`, then the results could depend on
+        any game.
+        """
+        if self._has_writes(cursor):
+            cursor.execute(sql)
+            return cursor.fetchall()
+        dsn = cursor.connection.dsn
+        self._check(cursor, dsn)
+        key = (dsn, normalize_sql(sql))
+        with self.__lock:
+            entry = self.__entries.pop(key, None)
+            if entry is not None:
+                self.__entries[key] = entry
+                self.__hits += 1
+                return entry[1]
+            self.__misses += 1
+            gen = self.__generations[dsn][0]
+
+        cursor.execute(sql)
+        rows = cursor.fetchall()
+        if isinstance(games, basestring):
+            cursor.execute(games)
+            games = [_row_values(r, 'gsis_id')[0] for r in cursor.fetchall()]
+        if games is not None:
+            games = frozenset(games)
+        size = _sizeof_rows(rows) + sys.getsizeof(key[1])
+        with self.__lock:
+            # Don't cache rows from an older generation if the cache was
+            # invalidated while the query was running.
+            if size > self.max_bytes or self.__generations[dsn][0] != gen:
+                return rows
+            old = self.__entries.pop(key, None)
+            if old is not None:
+                self.__bytes -= old[0]
+            self.__entries[key] = (size, rows, games)
+            self.__bytes += size
+            while self.__bytes > self.max_bytes:
+                _, (evicted, _, _) = self.__entries.popitem(last=False)
+                self.__bytes -= evicted
+        return rows
+
+    def _has_writes(self, cursor):
+        """
+        Returns `True` if the transaction of `cursor` has written
+        anything. Only the first lookup with a cursor checks, since
+        the queries run with it by `nfldb.Query` never write. The
+        result for the last cursor used by each thread is remembered.
+        """
+        last = self.__writes
+        if getattr(last, 'cursor', None) is not cursor:
+            last.cursor, last.writes = cursor, _has_writes(cursor)
+        return last.writes
+
+    def _check(self, cursor, dsn):
+        """
+        Drops the cached results for the database `dsn` that could
+        depend on data that changed since its data generation was last
+        checked.
+        """
+        with self.__lock:
+            gen, checked = self.__generations.get(dsn, (None, None))
+        if checked is not None \
+                and time.time() - checked < self.check_interval:
+            return
+        now, (current, flushed) = time.time(), _generation(cursor)
+        changed = None
+        if gen is not None and gen < current and flushed <= gen:
+            changed = _changed_games(cursor, gen)
+        with self.__lock:
+            if current != gen:
+                for key, (_, _, games) in self.__entries.items():
+                    if key[0] != dsn:
+                        continue
+                    if changed is None or games is None \
+                            or not games.isdisjoint(changed):
+                        self.__bytes -= self.__entries.pop(key)[0]
+            self.__generations[dsn] = (current, now)
+
+
+def _sizeof_rows(rows):
+    """
+    Returns the approximate number of bytes used by `rows`, which is a
+    list of tuples or dictionaries.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        if isinstance(row, dict):
+            row = row.values()
+        for v in row:
+            size += sys.getsizeof(v)
+    return size
@@ -1,15 +1,25 @@
 from __future__ import absolute_import, division, print_function
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
 import ConfigParser
+import contextlib
 import datetime
 import os
 import os.path as path
+import random
 import re
 import sys
+import threading
+import time
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
 from psycopg2.extensions import new_type, register_type
+from psycopg2.pool import ThreadedConnectionPool
 
 import pytz
 
@@ -17,7 +27,7 @@ import nfldb.team
 
 __pdoc__ = {}
 
-api_version = 7
+api_version = 11
 __pdoc__['api_version'] = \
     """
     The schema version that this library corresponds to. When the schema
@@ -35,6 +45,13 @@ The total number of queries executed. Only updated when _SHOW_QUERIES
 is true.
 """
 
+_query_hooks = []
+"""
+An association list of hooks registered with `nfldb.add_query_hook`
+to the fraction of statements that should be explained for them.
+This list is replaced (never mutated) when hooks are added or removed.
+"""
+
 _config_home = os.getenv('XDG_CONFIG_HOME')
 if not _config_home:
     home = os.getenv('HOME')
@@ -111,6 +128,146 @@ def connect(database=None, user=None, password=None, host=None, port=None,
     N.B. The `timezone` parameter should be set to a value that
     PostgreSQL will accept. Select from the `pg_timezone_names` view
     to get a list of valid time zones.
+
+    If many connections are needed (e.g., in a web application), then
+    `nfldb.pool` should be used instead, since it only does the schema
+    and type checking once.
+    """
+    params, timezone = _connect_params(database, user, password, host, port,
+                                       timezone, config_path)
+    conn = psycopg2.connect(**params)
+    _bootstrap(conn, timezone)
+    return conn
+
+
+def pool(minconn=1, maxconn=10, database=None, user=None, password=None,
+         host=None, port=None, timezone=None, config_path=''):
+    """
+    Returns a new `nfldb.Pool` of connections. The connection
+    parameters are exactly the same as the ones for `nfldb.connect`.
+
+    `minconn` is the number of connections opened immediately and
+    `maxconn` is the maximum number of connections that may be
+    checked out at any one time.
+    """
+    return Pool(minconn, maxconn, database=database, user=user,
+                password=password, host=host, port=port, timezone=timezone,
+                config_path=config_path)
+
+
+class Pool (object):
+    """
+    Pool is a thread safe collection of database connections. Each
+    connection has the same properties as a connection returned by
+    `nfldb.connect`, except that the schema migration check and
+    type registration is only done once for the entire pool. Each
+    connection in the pool is created with its time zone already set,
+    so no extra queries are issued when a connection is opened.
+
+    Connections can be checked out and checked in manually with
+    `nfldb.Pool.checkout` and `nfldb.Pool.checkin`, but it is usually
+    more convenient to use `nfldb.Pool.connection`:
+
+        #!python
+        pool = nfldb.pool(maxconn=20)
+        with pool.connection() as db:
+            q = nfldb.Query(db).game(season_year=2012, week=1)
+            games = q.as_games()
+
+    If every connection is checked out, then `nfldb.Pool.checkout`
+    blocks until one is checked back in.
+
+    Note that `nfldb.set_timezone` should not be used on pooled
+    connections. Use the `timezone` parameter of `nfldb.pool` instead.
+    """
+    def __init__(self, minconn=1, maxconn=10, database=None, user=None,
+                 password=None, host=None, port=None, timezone=None,
+                 config_path=''):
+        """
+        Introduces a new pool of connections. See `nfldb.pool` for
+        information on the parameters.
+        """
+        assert 0 <= minconn <= maxconn and maxconn > 0, \
+            'invalid pool size: minconn=%s, maxconn=%s' % (minconn, maxconn)
+        params, timezone = _connect_params(database, user, password, host,
+                                           port, timezone, config_path)
+
+        # Do the one time setup on a throw-away connection. Note that
+        # registering types is global, so it applies to every connection
+        # created in this process.
+        conn = psycopg2.connect(**params)
+        try:
+            _bootstrap(conn, None)
+        finally:
+            conn.close()
+
+        if timezone is not None:
+            params['options'] = '-c timezone=%s' % timezone.replace(' ', '\\ ')
+        self.__available = threading.Semaphore(maxconn)
+        self.__pool = ThreadedConnectionPool(minconn, maxconn, **params)
+
+    def checkout(self):
+        """
+        Returns a connection from the pool. If all connections are
+        checked out, then this blocks until one becomes available.
+
+        Every connection checked out must be returned to the pool
+        with `nfldb.Pool.checkin`.
+        """
+        self.__available.acquire()
+        try:
+            return self.__pool.getconn()
+        except Exception:
+            self.__available.release()
+            raise
+
+    def checkin(self, conn):
+        """
+        Returns a connection `conn` obtained from `nfldb.Pool.checkout`
+        back to the pool. If `conn` has a transaction open, then it is
+        rolled back. If that fails (e.g., because the connection died),
+        then `conn` is closed and discarded instead.
+        """
+        try:
+            idle = TRANSACTION_STATUS_IDLE
+            try:
+                if not conn.closed and conn.get_transaction_status() != idle:
+                    conn.rollback()
+            except psycopg2.Error:
+                self.__pool.putconn(conn, close=True)
+            else:
+                self.__pool.putconn(conn)
+        finally:
+            self.__available.release()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        A `with` compatible method that checks out a connection for
+        the duration of the `with` block and checks it back in when
+        the block exits (whether it exits normally or not).
+        """
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def close(self):
+        """
+        Closes every connection in the pool. The pool cannot be used
+        after it is closed.
+        """
+        self.__pool.closeall()
+
+
+def _connect_params(database, user, password, host, port, timezone,
+                    config_path):
+    """
+    Returns a tuple of the keyword arguments for `psycopg2.connect`
+    and the time zone to use. If `database` is `None`, then the
+    values are read from the configuration file found by
+    `nfldb.config`.
     """
     if database is None:
         conf, tried = config(config_path=config_path)
@@ -121,10 +278,20 @@ def connect(database=None, user=None, password=None, host=None, port=None,
         timezone, database = conf['timezone'], conf['database']
         user, password = conf['user'], conf['password']
         host, port = conf['host'], conf['port']
+    params = {
+        'database': database, 'user': user, 'password': password,
+        'host': host, 'port': port,
+    }
+    return params, timezone
 
-    conn = psycopg2.connect(database=database, user=user, password=password,
-                            host=host, port=port)
 
+def _bootstrap(conn, timezone):
+    """
+    Checks the schema version of the database connected to by
+    `conn`, migrates it if necessary and binds the SQL types used
+    by `nfldb` to their Python counterparts. If `timezone` is not
+    `None`, then it is set on `conn`.
+    """
     # Start the migration. Make sure if this is the initial setup that
     # the DB is empty.
     sversion = schema_version(conn)
@@ -150,8 +317,6 @@ def connect(database=None, user=None, password=None, host=None, port=None,
     _bind_type(conn, 'pos_period', PossessionTime._pg_cast)
     _bind_type(conn, 'field_pos', FieldPosition._pg_cast)
 
-    return conn
-
 
 def schema_version(conn):
     """
@@ -206,6 +371,320 @@ def _bind_type(conn, sql_type_name, cast):
         register_type(typ)
 
 
+def add_query_hook(hook, explain=0.0):
+    """
+    Registers `hook` to be called after every SQL statement executed
+    with a cursor from `nfldb.Tx`. (All queries issued by `nfldb`
+    are executed this way.) `hook` is called with a single
+    `nfldb.db.QueryEvent` argument describing the statement. Hooks
+    may be called from any thread that uses `nfldb`.
+
+    If `explain` is greater than `0`, then that fraction of read-only
+    statements are also run with `EXPLAIN (ANALYZE, BUFFERS)` and the
+    plan is made available in `nfldb.db.QueryEvent.plan`. Note that
+    this executes the sampled statements a second time, so `explain`
+    should be kept small under production load.
+
+    `nfldb.instrument.LatencyHistogram` is an example of a hook.
+    """
+    global _query_hooks
+    assert 0 <= explain <= 1, 'explain must be in the range [0, 1]'
+    _query_hooks = _query_hooks + [(hook, float(explain))]
+
+
+def remove_query_hook(hook):
+    """
+    Unregisters a hook previously registered with
+    `nfldb.add_query_hook`. If `hook` isn't registered, then this
+    does nothing.
+    """
+    global _query_hooks
+    _query_hooks = [(h, e) for h, e in _query_hooks if h is not hook]
+
+
+class QueryEvent (object):
+    """
+    Describes a single SQL statement executed by `nfldb`. Instances
+    are passed to hooks registered with `nfldb.add_query_hook`.
+    """
+    __slots__ = ['sql', 'params', 'statement', 'seconds', 'rows',
+                 'caller', 'query', 'plan']
+
+    def __init__(self, sql, params, statement, caller, query):
+        self.sql = sql
+        """The SQL given to `execute`, before parameter substitution."""
+
+        self.params = params
+        """The parameters given to `execute`, which may be `None`."""
+
+        self.statement = statement
+        """The SQL statement after parameter substitution."""
+
+        self.seconds = 0.0
+        """
+        The wall clock time taken to execute the statement and fetch
+        its results in seconds. For server-side cursors, this includes
+        the time spent in every fetch.
+        """
+
+        self.rows = 0
+        """
+        The number of rows returned (or affected) by the statement.
+        For server-side cursors, this is the number of rows fetched.
+        """
+
+        self.caller = caller
+        """
+        The name of the `nfldb.Query` method that executed this
+        statement, e.g., `Query.as_games` or `CompiledQuery.execute`.
+        If the statement wasn't executed by a `nfldb.Query` method,
+        then this is `None`.
+        """
+
+        self.query = query
+        """
+        The `nfldb.Query` object that executed this statement, or
+        `None` if `caller` is `None`.
+        """
+
+        self.plan = None
+        """
+        When sampled, the output of `EXPLAIN (ANALYZE, BUFFERS)` for
+        this statement as a single string. Otherwise `None`.
+        """
+
+
+def _current_caller():
+    """
+    Returns the name and object of the innermost public `nfldb.Query`
+    method on the call stack, e.g., `('Query.as_games', q)`. Methods of
+    `nfldb.query.CompiledQuery` are also found, in which case the
+    compiled `nfldb.Query` is returned. If there is no such method,
+    then `(None, None)` is returned.
+
+    Note that this also finds methods that are generators, since a
+    generator's frame links back to the frame that resumed it.
+    """
+    from nfldb.query import CompiledQuery, Query
+
+    f = sys._getframe(1)
+    while f is not None:
+        name = f.f_code.co_name
+        if not name.startswith('_'):
+            obj = f.f_locals.get('self')
+            if isinstance(obj, Query):
+                return 'Query.%s' % name, obj
+            elif isinstance(obj, CompiledQuery):
+                return 'CompiledQuery.%s' % name, obj._query
+        f = f.f_back
+    return None, None
+
+
+def _show_query(event):
+    global _NUM_QUERIES
+
+    _NUM_QUERIES += 1
+    print(event.statement, file=sys.stderr, end='\n\n')
+
+
+class _HookedCursor (object):
+    """
+    Wraps a psycopg2 cursor and calls query hooks for every statement
+    executed with it. For server-side cursors, the hooks are called
+    when the next statement is executed or when the cursor is closed,
+    so that fetch times and row counts can be included.
+    """
+    def __init__(self, cursor, hooks):
+        self.__c = cursor
+        self.__hooks = hooks
+        self.__pending = None
+
+    def execute(self, sql, params=None):
+        self._finish()
+        caller, query = _current_caller()
+        start = time.time()
+        self.__c.execute(sql, params)
+        elapsed = time.time() - start
+        if self.__c.name is None:
+            event = QueryEvent(sql, params, self.__c.query, caller, query)
+            event.seconds, event.rows = elapsed, max(0, self.__c.rowcount)
+            self.__fire(event)
+        else:
+            statement = self.__c.mogrify(sql, params)
+            self.__pending = QueryEvent(sql, params, statement, caller, query)
+            self.__pending.seconds = elapsed
+
+    def copy_expert(self, sql, f, *args, **kwargs):
+        self._finish()
+        caller, query = _current_caller()
+        start = time.time()
+        self.__c.copy_expert(sql, f, *args, **kwargs)
+        event = QueryEvent(sql, None, sql, caller, query)
+        event.seconds = time.time() - start
+        event.rows = max(0, self.__c.rowcount)
+        self.__fire(event)
+
+    def fetchone(self):
+        row = self.__fetch(self.__c.fetchone)
+        if self.__pending is not None and row is not None:
+            self.__pending.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self.__fetch(self.__c.fetchmany, *args, **kwargs)
+        if self.__pending is not None:
+            self.__pending.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self.__fetch(self.__c.fetchall)
+        if self.__pending is not None:
+            self.__pending.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self.__c.itersize)
+            if len(rows) == 0:
+                break
+            for row in rows:
+                yield row
+
+    def close(self):
+        self._finish()
+        self.__c.close()
+
+    def __getattr__(self, k):
+        return getattr(self.__c, k)
+
+    def __fetch(self, fetch, *args, **kwargs):
+        if self.__pending is None:
+            return fetch(*args, **kwargs)
+        start = time.time()
+        try:
+            return fetch(*args, **kwargs)
+        finally:
+            self.__pending.seconds += time.time() - start
+
+    def _finish(self):
+        """Calls hooks for a pending server-side cursor statement."""
+        if self.__pending is not None:
+            event, self.__pending = self.__pending, None
+            self.__fire(event)
+
+    def __fire(self, event):
+        rate = max(e for _, e in self.__hooks)
+        if rate > 0 and random.random() < rate:
+            event.plan = self.__explain(event.statement)
+        for hook, _ in self.__hooks:
+            hook(event)
+
+    def __explain(self, statement):
+        """
+        Returns the output of `EXPLAIN (ANALYZE, BUFFERS)` for
+        `statement` if it is read-only. Otherwise returns `None`.
+
+        The statement is explained inside a savepoint so that a failure
+        doesn't abort the caller's transaction.
+        """
+        if not re.match(r'\s*(SELECT|WITH)\b', statement, re.I):
+            return None
+        conn = self.__c.connection
+        if conn.get_transaction_status() != TRANSACTION_STATUS_INTRANS:
+            return None
+        c = conn.cursor()
+        try:
+            c.execute('SAVEPOINT nfldb_explain')
+            try:
+                c.execute('EXPLAIN (ANALYZE, BUFFERS) ' + statement)
+                plan = '\n'.join(row[0] for row in c.fetchall())
+            except psycopg2.Error:
+                c.execute('ROLLBACK TO SAVEPOINT nfldb_explain')
+                plan = None
+            c.execute('RELEASE SAVEPOINT nfldb_explain')
+            return plan
+        finally:
+            c.close()
+
+
+def _row_values(row, *keys):
+    """
+    Returns a tuple of the values of the columns named `keys` in
+    `row`, which may come from either a tuple or a dictionary cursor.
+    For a tuple, `keys` must name its first columns in order.
+    """
+    if isinstance(row, dict):
+        return tuple(row[k] for k in keys)
+    return tuple(row[0:len(keys)])
+
+
+def _generation(cursor):
+    """
+    Returns a pair of the data generation and the flush generation
+    stored in the `meta` table. The data generation is incremented by
+    `nfldb.db._bump_generation` whenever game, drive, play or player
+    data changes, so that cached query results can be invalidated. The
+    flush generation is the data generation of the last change that
+    invalidates every cached result.
+    """
+    cursor.execute('SELECT generation, flush_generation FROM meta')
+    return _row_values(cursor.fetchone(), 'generation', 'flush_generation')
+
+
+def _has_writes(cursor):
+    """
+    Returns `True` if the transaction that `cursor` is in has written
+    anything. A transaction holds a lock on its own transaction id
+    from its first write until it finishes.
+    """
+    status = cursor.connection.get_transaction_status()
+    if status != TRANSACTION_STATUS_INTRANS:
+        return False
+    cursor.execute('''
+        SELECT COUNT(*) AS locks FROM pg_locks
+        WHERE pid = pg_backend_pid() AND locktype = 'transactionid'
+    ''')
+    return _row_values(cursor.fetchone(), 'locks')[0] > 0
+
+
+def _changed_games(cursor, generation):
+    """
+    Returns a set of the GSIS identifiers of every game whose data
+    changed after the data generation `generation`.
+    """
+    cursor.execute('SELECT gsis_id FROM game WHERE generation > %s',
+                   (generation,))
+    return set(_row_values(r, 'gsis_id')[0] for r in cursor.fetchall())
+
+
+def _bump_generation(cursor, gsis_ids=None):
+    """
+    Sets the data generation in the `meta` table to the next value of
+    the `generation_seq` sequence. This should be called in the same
+    transaction that changes data. Since sequences never hand out the
+    same value twice, a rolled back change never shares a generation
+    with a later one.
+
+    If `gsis_ids` is `None`, then every cached result is invalidated.
+    Otherwise, only the data of the games with those GSIS identifiers
+    changed, and only cached results that could depend on them are
+    invalidated. Every one of those games must have existed before
+    the change (i.e., inserting a game must invalidate everything),
+    since a cached result can't depend on a game it didn't know of.
+    If `gsis_ids` is empty, then only cached results that could depend
+    on any game are invalidated, which includes every result that
+    depends on player data.
+    """
+    cursor.execute("UPDATE meta SET generation = nextval('generation_seq')")
+    if gsis_ids is None:
+        cursor.execute('UPDATE meta SET flush_generation = generation')
+    elif len(gsis_ids) > 0:
+        cursor.execute('''
+            UPDATE game SET generation = (SELECT generation FROM meta)
+            WHERE gsis_id IN %s
+        ''', (tuple(gsis_ids),))
+
+
 def _db_name(conn):
     m = re.search('dbname=(\S+)', conn.dsn)
     return m.group(1)
@@ -278,6 +757,8 @@ class Tx (object):
         `psycopg2.extensions.cursor` (the default tuple cursor) can be
         much more efficient when fetching large result sets.
         """
+        assert psycho_conn is not None, \
+            'Cannot load data without a database connection.'
         tstatus = psycho_conn.get_transaction_status()
         self.__name = name
         self.__nested = tstatus == TRANSACTION_STATUS_INTRANS
@@ -297,20 +778,12 @@ class Tx (object):
             self.__cursor = self.__conn.cursor(self.__name, self.__factory)
         c = self.__cursor
 
+        hooks = _query_hooks
         if _SHOW_QUERIES:
-            class _ (object):
-                def execute(self, *args, **kwargs):
-                    global _NUM_QUERIES
-
-                    _NUM_QUERIES += 1
-                    c.execute(*args, **kwargs)
-                    print(c.query, file=sys.stderr, end='\n\n')
-
-                def __getattr__(self, k):
-                    return getattr(c, k)
-            return _()
-        else:
-            return c
+            hooks = hooks + [(_show_query, 0.0)]
+        if len(hooks) > 0:
+            self.__cursor = _HookedCursor(c, hooks)
+        return self.__cursor
 
     def __exit__(self, typ, value, traceback):
         if not self.__cursor.closed:
@@ -356,6 +829,174 @@ def _big_insert(cursor, table, datas):
                    % (table, insert_fields, values))
 
 
+def _big_copy(cursor, table, datas):
+    """
+    Given a database cursor, table name and an iterable of association
+    lists of data (column name and value), insert every row into
+    `table` with PostgreSQL's `COPY ... FROM STDIN`.
+
+    This is like `nfldb.db._big_insert`, except the rows are encoded
+    and streamed to the server lazily. Namely, `datas` may be a
+    generator and the full set of rows is never converted to one large
+    string in memory.
+
+    Each association list must have exactly the same number of columns
+    in exactly the same order.
+    """
+    datas = iter(datas)
+    try:
+        first = next(datas)
+    except StopIteration:
+        return
+
+    stamped = table in ('game', 'drive', 'play')
+    insert_fields = [k for k, _ in first]
+    stamps = []
+    if stamped:
+        insert_fields.append('time_inserted')
+        insert_fields.append('time_updated')
+
+        # This is the same value that `NOW()` has in `_big_insert`, since
+        # it's fixed for the duration of the transaction.
+        stamps = [_now(cursor)] * 2
+
+    def rows():
+        yield [v for _, v in first] + stamps
+        for data in datas:
+            yield [v for _, v in data] + stamps
+    encoding = psycopg2.extensions.encodings[cursor.connection.encoding]
+    cursor.copy_expert('COPY %s (%s) FROM STDIN'
+                       % (table, ', '.join(insert_fields)),
+                       _CopyStream(rows(), encoding))
+
+
+def _now(cursor):
+    """
+    Returns the value of `NOW()` in the current transaction.
+    """
+    cursor.execute('SELECT NOW() AS now')
+    return _row_values(cursor.fetchone(), 'now')[0]
+
+
+class _CopyStream (object):
+    """
+    A read-only file-like object that lazily encodes an iterable of
+    rows in PostgreSQL's `COPY` text format. Only as many rows as are
+    needed to satisfy each call to `read` are encoded.
+    """
+    def __init__(self, rows, encoding):
+        self.__rows = iter(rows)
+        self.__encoding = encoding
+        self.__buf = ''
+
+    def read(self, size=-1):
+        chunks, length = [self.__buf], len(self.__buf)
+        while size < 0 or length < size:
+            try:
+                line = self.__line(next(self.__rows))
+            except StopIteration:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = ''.join(chunks)
+        if size < 0:
+            self.__buf = ''
+            return data
+        self.__buf = data[size:]
+        return data[:size]
+
+    def __line(self, row):
+        return '\t'.join(self.__value(v) for v in row) + '\n'
+
+    def __value(self, v):
+        if hasattr(v, '_pg_text'):
+            v = v._pg_text()
+        if v is None:
+            return '\\N'
+        elif isinstance(v, bool):
+            return 't' if v else 'f'
+        elif isinstance(v, float):
+            return repr(v)
+        elif isinstance(v, (datetime.datetime, datetime.date)):
+            v = v.isoformat()
+        elif isinstance(v, unicode):
+            v = v.encode(self.__encoding)
+        else:
+            v = str(v)
+        return v.replace('\\', '\\\\').replace('\t', '\\t') \
+                .replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _big_upsert(cursor, table, datas, pk):
+    """
+    Performs an "upsert" of many rows at once given a table, a list of
+    association lists mapping key to value (one for each row) and a
+    list of primary key column names. The primary key columns must be
+    included in every association list.
+
+    The rows are first loaded into a temporary staging table with
+    `nfldb.db._big_copy`. Then every existing row is updated with a
+    single `UPDATE ... FROM` and every new row is inserted with a
+    single `INSERT ... SELECT`. So the number of round trips to the
+    database is constant regardless of the number of rows.
+
+    If more than one association list has the same primary key, then
+    the last one wins.
+
+    As with `nfldb.db._upsert`, this is **not** free of race
+    conditions. It is the caller's responsibility to avoid race
+    conditions. (e.g., By using a table or row lock.)
+
+    Each association list must have exactly the same number of columns
+    in exactly the same order.
+    """
+    rows = OrderedDict()
+    for data in datas:
+        d = dict(data)
+        rows[tuple(d[k] for k in pk)] = data
+    if len(rows) == 0:
+        return
+    elif len(rows) == 1:
+        # Not worth the overhead of a staging table.
+        data = rows.values()[0]
+        d = dict(data)
+        _upsert(cursor, table, data, [(k, d[k]) for k in pk])
+        return
+
+    stamped = table in ('game', 'drive', 'play')
+    stage = '_nfldb_upsert_%s' % table
+    fields = [k for k, _ in rows.values()[0]]
+    cursor.execute('''
+        CREATE TEMPORARY TABLE %s ON COMMIT DROP AS
+        SELECT %s FROM %s WITH NO DATA
+    ''' % (stage, ', '.join(fields), table))
+    _big_copy(cursor, stage, rows.itervalues())
+
+    update_set = ['%s = s.%s' % (k, k) for k in fields if k not in pk]
+    if stamped:
+        update_set.append('time_updated = NOW()')
+    insert_fields = fields[:]
+    insert_vals = ['s.%s' % k for k in fields]
+    if stamped:
+        insert_fields += ['time_inserted', 'time_updated']
+        insert_vals += ['NOW()', 'NOW()']
+    pk_cond = ' AND '.join('%s.%s = s.%s' % (table, k, k) for k in pk)
+
+    q = ''
+    if len(update_set) > 0:
+        q += '''
+            UPDATE %s SET %s FROM %s AS s WHERE %s;
+        ''' % (table, ', '.join(update_set), stage, pk_cond)
+    q += '''
+        INSERT INTO %s (%s)
+        SELECT %s FROM %s AS s
+        WHERE NOT EXISTS (SELECT 1 FROM %s WHERE %s);
+    ''' % (table, ', '.join(insert_fields), ', '.join(insert_vals),
+           stage, table, pk_cond)
+    q += 'DROP TABLE %s' % stage
+    cursor.execute(q)
+
+
 def _upsert(cursor, table, data, pk):
     """
     Performs an arbitrary "upsert" given a table, an association list
@@ -403,6 +1044,170 @@ def _upsert(cursor, table, data, pk):
         raise e
 
 
+@contextlib.contextmanager
+def bulk_load(cursor):
+    """
+    A context manager that makes loading a large amount of game data
+    with `cursor` much faster. When the context is entered, the
+    triggers that keep the `agg_play` table in sync are disabled and
+    every index on a statistical category (in the `play`,
+    `play_player` and `agg_play` tables) is dropped. When the context
+    exits, `agg_play` and `player_game` are rebuilt from scratch with a
+    single query each, the indexes are recreated and the statistics
+    used by the query planner are refreshed with `ANALYZE`.
+
+    For example:
+
+        #!python
+        with nfldb.Tx(db) as cursor:
+            with nfldb.bulk_load(cursor):
+                ...
+
+    Everything must happen inside a single transaction. If an
+    exception is raised inside the context, then the transaction must
+    be rolled back (which `nfldb.Tx` does automatically), otherwise
+    the triggers and indexes will stay disabled. Note that disabling
+    the triggers locks the `play` and `play_player` tables, so other
+    clients will be blocked until the transaction finishes.
+
+    Since the finishing steps do work proportional to the size of the
+    entire database, bulk loading is only worth it when a large amount
+    of data is being added (e.g., when building the database from
+    scratch).
+    """
+    cursor.execute('''
+        ALTER TABLE play DISABLE TRIGGER agg_play_sync_insert;
+        ALTER TABLE play_player DISABLE TRIGGER agg_play_sync_update;
+    ''')
+    indexes = _drop_bulk_indexes(cursor)
+
+    yield cursor
+
+    _fill_agg_play(cursor)
+    _refresh_player_game(cursor)
+    for indexdef in indexes:
+        cursor.execute(indexdef)
+    cursor.execute('''
+        ALTER TABLE play ENABLE TRIGGER agg_play_sync_insert;
+        ALTER TABLE play_player ENABLE TRIGGER agg_play_sync_update;
+    ''')
+    cursor.execute('''
+        ANALYZE game; ANALYZE drive; ANALYZE play;
+        ANALYZE play_player; ANALYZE agg_play; ANALYZE player_game;
+    ''')
+
+
+def _bulk_index_names():
+    """
+    Returns the names of the indexes that are dropped by
+    `nfldb.bulk_load`.
+    """
+    from nfldb.types import _play_categories, _player_categories
+
+    names = []
+    for cat in _player_categories.keys() + _derived_exprs('').keys():
+        names.append('play_player_in_%s' % cat)
+        names.append('agg_play_in_%s' % cat)
+    for cat in _play_categories.values():
+        names.append('play_in_%s' % cat)
+    return names
+
+
+def _drop_bulk_indexes(c):
+    """
+    Drops every index named by `nfldb.db._bulk_index_names` that
+    exists and returns a list of their definitions, which can be
+    executed to recreate them.
+    """
+    c.execute('''
+        SELECT indexname, indexdef FROM pg_indexes
+        WHERE schemaname = current_schema() AND indexname = ANY (%s)
+    ''', (_bulk_index_names(),))
+    indexes = [_row_values(row, 'indexname', 'indexdef')
+               for row in c.fetchall()]
+    if len(indexes) > 0:
+        c.execute('DROP INDEX %s' % ', '.join(name for name, _ in indexes))
+    return [indexdef for _, indexdef in indexes]
+
+
+def _fill_agg_play(c):
+    """
+    Rebuilds the entire `agg_play` table from the `play` and
+    `play_player` tables.
+    """
+    from nfldb.types import _player_categories
+
+    columns = ['gsis_id', 'drive_id', 'play_id'] + _player_categories.keys()
+    select = ['play.%s' % k for k in columns[0:3]] \
+        + ['COALESCE(SUM(play_player.%s), 0)' % cat for cat in columns[3:]]
+    c.execute('''
+        TRUNCATE agg_play;
+        INSERT INTO agg_play ({columns})
+        SELECT {select}
+        FROM play
+        LEFT JOIN play_player
+        ON (play.gsis_id, play.drive_id, play.play_id)
+           = (play_player.gsis_id, play_player.drive_id, play_player.play_id)
+        GROUP BY play.gsis_id, play.drive_id, play.play_id
+    '''.format(columns=', '.join(columns), select=', '.join(select)))
+
+
+def _refresh_player_game(c, gsis_ids=None):
+    """
+    Recomputes the rows of the `player_game` table for the games with
+    the GSIS identifiers in `gsis_ids` by summing their rows in the
+    `play_player` table. If `gsis_ids` is `None`, then the entire
+    table is rebuilt.
+
+    Unlike `agg_play`, `player_game` is not kept in sync by triggers,
+    since that would make every live update of a play player re-sum
+    the statistics of a player's entire game. Instead, this must be
+    called whenever the play players of a game change. Saving a game
+    with its drives (`nfldb.Game._save_all`) and `nfldb.bulk_load` do
+    this, and `nfldb-update` does it for the games it bulk inserts.
+    Any other change to `play_player` leaves `player_game` stale.
+    """
+    from nfldb.types import _player_categories
+
+    columns = ['gsis_id', 'player_id', 'team'] + _player_categories.keys()
+    select = columns[0:3] + ['SUM(%s)' % cat for cat in columns[3:]]
+    if gsis_ids is None:
+        where, params = '', None
+        c.execute('TRUNCATE player_game')
+    elif len(gsis_ids) == 0:
+        return
+    else:
+        where, params = 'WHERE gsis_id IN %s', (tuple(gsis_ids),)
+        c.execute('DELETE FROM player_game ' + where, params)
+    c.execute('''
+        INSERT INTO player_game ({columns})
+        SELECT {select}
+        FROM play_player
+        {where}
+        GROUP BY gsis_id, player_id, team
+    '''.format(columns=', '.join(columns), select=', '.join(select),
+               where=where), params)
+
+
+def _derived_exprs(prefix):
+    """
+    Returns an ordered dictionary mapping each derived statistic of
+    `nfldb.PlayPlayer` (e.g., `offense_yds`) to the SQL expression that
+    computes it from the statistical columns of `play_player` (or
+    `agg_play`). Every column is prefixed with `prefix`, e.g., `NEW.`.
+    """
+    from nfldb.types import PlayPlayer
+
+    exprs = OrderedDict()
+    for field, fields in sorted(PlayPlayer._derived_combined.items()):
+        exprs[field] = 'GREATEST(%s)' \
+            % ', '.join(prefix + f for f in fields)
+    exprs['points'] = 'GREATEST(%s)' \
+        % ', '.join('(%s%s * %d)' % (prefix, f, pval)
+                    for f, pval in PlayPlayer._point_values)
+    return exprs
+
+
 def _drop_stat_indexes(c):
     from nfldb.types import _play_categories, _player_categories
 
@@ -422,6 +1227,107 @@ def _create_stat_indexes(c):
         c.execute('CREATE INDEX play_in_%s ON play (%s ASC)' % (cat, cat))
 
 
+def _agg_play_update_resum(c):
+    """
+    Installs the original `agg_play_sync_update` trigger, which
+    recomputes the sums of every statistic in a play whenever a row
+    in `play_player` is inserted or updated. It has been replaced by
+    `nfldb.db._agg_play_update_delta`, but is kept for benchmarking.
+    """
+    from nfldb.types import _player_categories
+
+    c.execute('''
+        DROP TRIGGER IF EXISTS agg_play_sync_update ON play_player;
+        DROP FUNCTION IF EXISTS agg_play_update();
+    ''')
+
+    def make_sum(field):
+        return 'COALESCE(SUM(play_player.{f}), 0) AS {f}'.format(f=field)
+    select = [make_sum(f.category_id) for f in _player_categories.values()]
+    set_columns = ['{f} = s.{f}'.format(f=f.category_id)
+                   for f in _player_categories.values()]
+    c.execute('''
+        CREATE FUNCTION agg_play_update() RETURNS trigger AS $$
+            BEGIN
+                UPDATE agg_play SET {set_columns}
+                FROM (
+                    SELECT {select}
+                    FROM play
+                    LEFT JOIN play_player
+                    ON (play.gsis_id, play.drive_id, play.play_id)
+                       = (play_player.gsis_id, play_player.drive_id,
+                          play_player.play_id)
+                    WHERE (play.gsis_id, play.drive_id, play.play_id)
+                          = (NEW.gsis_id, NEW.drive_id, NEW.play_id)
+                ) s
+                WHERE (agg_play.gsis_id, agg_play.drive_id, agg_play.play_id)
+                      = (NEW.gsis_id, NEW.drive_id, NEW.play_id);
+                RETURN NULL;
+            END;
+        $$ LANGUAGE 'plpgsql';
+    '''.format(set_columns=', '.join(set_columns), select=', '.join(select)))
+    c.execute('''
+        CREATE TRIGGER agg_play_sync_update
+        AFTER INSERT OR UPDATE ON play_player
+        FOR EACH ROW EXECUTE PROCEDURE agg_play_update();
+    ''')
+
+
+def _agg_play_update_delta(c):
+    """
+    Installs the `agg_play_sync_update` trigger, which keeps `agg_play`
+    in sync with `play_player` by applying the difference between the
+    old and new rows of each insert, update or delete. (Statistics are
+    always summed with real or integer values that are exact, so the
+    sums cannot drift.)
+    """
+    from nfldb.types import _player_categories
+
+    cats = [cat.category_id for cat in _player_categories.values()]
+    delta = ['{f} = {f} + (NEW.{f} - OLD.{f})'.format(f=f) for f in cats]
+    add = ['{f} = {f} + NEW.{f}'.format(f=f) for f in cats]
+    sub = ['{f} = {f} - OLD.{f}'.format(f=f) for f in cats]
+    c.execute('''
+        DROP TRIGGER IF EXISTS agg_play_sync_update ON play_player;
+        DROP FUNCTION IF EXISTS agg_play_update();
+    ''')
+    c.execute('''
+        CREATE FUNCTION agg_play_update() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' THEN
+                    IF ROW(OLD.*) IS NOT DISTINCT FROM ROW(NEW.*) THEN
+                        RETURN NULL;
+                    END IF;
+                    IF (OLD.gsis_id, OLD.drive_id, OLD.play_id)
+                       = (NEW.gsis_id, NEW.drive_id, NEW.play_id) THEN
+                        UPDATE agg_play SET {delta}
+                        WHERE (gsis_id, drive_id, play_id)
+                              = (NEW.gsis_id, NEW.drive_id, NEW.play_id);
+                        RETURN NULL;
+                    END IF;
+                END IF;
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    UPDATE agg_play SET {sub}
+                    WHERE (gsis_id, drive_id, play_id)
+                          = (OLD.gsis_id, OLD.drive_id, OLD.play_id);
+                END IF;
+                IF TG_OP IN ('UPDATE', 'INSERT') THEN
+                    UPDATE agg_play SET {add}
+                    WHERE (gsis_id, drive_id, play_id)
+                          = (NEW.gsis_id, NEW.drive_id, NEW.play_id);
+                END IF;
+                RETURN NULL;
+            END;
+        $$ LANGUAGE 'plpgsql';
+    '''.format(delta=', '.join(delta), add=', '.join(add),
+               sub=', '.join(sub)))
+    c.execute('''
+        CREATE TRIGGER agg_play_sync_update
+        AFTER INSERT OR UPDATE OR DELETE ON play_player
+        FOR EACH ROW EXECUTE PROCEDURE agg_play_update();
+    ''')
+
+
 # What follows are the migration functions. They follow the naming
 # convention "_migrate_{VERSION}" where VERSION is an integer that
 # corresponds to the version that the schema will be after the
@@ -873,33 +1779,135 @@ changed.
         FOR EACH ROW EXECUTE PROCEDURE agg_play_insert();
     ''')
 
-    def make_sum(field):
-        return 'COALESCE(SUM(play_player.{f}), 0) AS {f}'.format(f=field)
-    select = [make_sum(f.category_id) for f in _player_categories.values()]
-    set_columns = ['{f} = s.{f}'.format(f=f.category_id)
-                   for f in _player_categories.values()]
+    _agg_play_update_resum(c)
+
+
+def _migrate_8(c):
+    print('''
+MIGRATING DATABASE... PLEASE WAIT
+
+THIS WILL ONLY HAPPEN ONCE.
+
+This is replacing the trigger that keeps the play aggregation table in sync
+with a faster one, and then rebuilding the play aggregation table.
+''', file=sys.stderr)
+    _agg_play_update_delta(c)
+
+    # The old trigger didn't fire on deletes, so stale play players that
+    # were removed may have left incorrect sums behind.
+    _fill_agg_play(c)
+
+
+def _migrate_9(c):
     c.execute('''
-        CREATE FUNCTION agg_play_update() RETURNS trigger AS $$
+        ALTER TABLE meta ADD generation bigint NOT NULL DEFAULT 0;
+        ALTER TABLE meta ADD flush_generation bigint NOT NULL DEFAULT 0;
+        ALTER TABLE game ADD generation bigint NOT NULL DEFAULT 0;
+        CREATE INDEX game_in_generation ON game (generation ASC);
+        CREATE SEQUENCE generation_seq;
+    ''')
+
+
+def _migrate_10(c):
+    print('''
+MIGRATING DATABASE... PLEASE WAIT
+
+THIS WILL ONLY HAPPEN ONCE.
+
+This is storing the derived statistics (like offense_yds and points) of every
+play and play player in their own indexed columns, so that searching and
+sorting on them is fast. This may take a few minutes.
+''', file=sys.stderr)
+    derived = _derived_exprs('')
+    for table in ('play_player', 'agg_play'):
+        c.execute('ALTER TABLE %s %s' % (table, ', '.join(
+            'ADD %s smallint NOT NULL DEFAULT 0' % f for f in derived)))
+    c.execute('''
+        ALTER TABLE play ADD game_date character varying (8) NULL
+    ''')
+
+    # The new columns don't change any statistics, so `agg_play` doesn't
+    # need to be updated while `play_player` is filled in.
+    sets = ', '.join('%s = %s' % (f, e) for f, e in derived.items())
+    c.execute('''
+        ALTER TABLE play_player DISABLE TRIGGER agg_play_sync_update;
+        UPDATE play_player SET {sets};
+        ALTER TABLE play_player ENABLE TRIGGER agg_play_sync_update;
+        UPDATE agg_play SET {sets};
+        UPDATE play SET game_date = SUBSTRING(gsis_id from 1 for 8);
+        ALTER TABLE play ALTER game_date SET NOT NULL;
+    '''.format(sets=sets))
+
+    print('Adding triggers and indexes...', file=sys.stderr)
+    assigns = ' '.join('NEW.%s := %s;' % (f, e)
+                       for f, e in _derived_exprs('NEW.').items())
+    c.execute('''
+        CREATE FUNCTION derived_stats() RETURNS trigger AS $$
             BEGIN
-                UPDATE agg_play SET {set_columns}
-                FROM (
-                    SELECT {select}
-                    FROM play
-                    LEFT JOIN play_player
-                    ON (play.gsis_id, play.drive_id, play.play_id)
-                       = (play_player.gsis_id, play_player.drive_id,
-                          play_player.play_id)
-                    WHERE (play.gsis_id, play.drive_id, play.play_id)
-                          = (NEW.gsis_id, NEW.drive_id, NEW.play_id)
-                ) s
-                WHERE (agg_play.gsis_id, agg_play.drive_id, agg_play.play_id)
-                      = (NEW.gsis_id, NEW.drive_id, NEW.play_id);
-                RETURN NULL;
+                {assigns}
+                RETURN NEW;
             END;
         $$ LANGUAGE 'plpgsql';
-    '''.format(set_columns=', '.join(set_columns), select=', '.join(select)))
+    '''.format(assigns=assigns))
     c.execute('''
-        CREATE TRIGGER agg_play_sync_update
-        AFTER INSERT OR UPDATE ON play_player
-        FOR EACH ROW EXECUTE PROCEDURE agg_play_update();
+        CREATE FUNCTION play_game_date() RETURNS trigger AS $$
+            BEGIN
+                NEW.game_date := SUBSTRING(NEW.gsis_id from 1 for 8);
+                RETURN NEW;
+            END;
+        $$ LANGUAGE 'plpgsql';
+    ''')
+    c.execute('''
+        CREATE TRIGGER play_player_derived
+        BEFORE INSERT OR UPDATE ON play_player
+        FOR EACH ROW EXECUTE PROCEDURE derived_stats();
+        CREATE TRIGGER agg_play_derived
+        BEFORE INSERT OR UPDATE ON agg_play
+        FOR EACH ROW EXECUTE PROCEDURE derived_stats();
+        CREATE TRIGGER play_derived
+        BEFORE INSERT OR UPDATE ON play
+        FOR EACH ROW EXECUTE PROCEDURE play_game_date();
+    ''')
+    for f in derived:
+        c.execute('CREATE INDEX play_player_in_%s ON play_player (%s ASC)'
+                  % (f, f))
+        c.execute('CREATE INDEX agg_play_in_%s ON agg_play (%s ASC)' % (f, f))
+    c.execute('CREATE INDEX play_in_game_date ON play (game_date ASC)')
+
+
+def _migrate_11(c):
+    from nfldb.types import _player_categories
+
+    print('''
+MIGRATING DATABASE... PLEASE WAIT
+
+THIS WILL ONLY HAPPEN ONCE.
+
+This is adding a table with the statistics of every player in every game,
+summed from the `play_player` table. Aggregate queries over whole seasons use
+it instead of summing every play. This may take a few minutes.
+''', file=sys.stderr)
+    c.execute('''
+        CREATE TABLE player_game (
+            gsis_id gameid NOT NULL,
+            player_id character varying (10) NOT NULL,
+            team character varying (3) NOT NULL,
+            %s,
+            PRIMARY KEY (gsis_id, player_id, team),
+            FOREIGN KEY (gsis_id)
+                REFERENCES game (gsis_id)
+                ON DELETE CASCADE,
+            FOREIGN KEY (player_id)
+                REFERENCES player (player_id)
+                ON DELETE RESTRICT,
+            FOREIGN KEY (team)
+                REFERENCES team (team_id)
+                ON DELETE RESTRICT
+                ON UPDATE CASCADE
+        )
+    ''' % ', '.join(cat._sql_field for cat in _player_categories.values()))
+    _refresh_player_game(c)
+    c.execute('''
+        CREATE INDEX player_game_in_player_id ON player_game (player_id ASC);
+        ANALYZE player_game;
     ''')
@@ -0,0 +1,182 @@
+"""
+Tools for measuring the performance of queries executed by `nfldb`.
+Everything here is built on top of `nfldb.add_query_hook`.
+
+For example, to find out which queries are slow in a running
+application, register a `nfldb.instrument.LatencyHistogram` and
+print its report every so often:
+
+    #!python
+    import nfldb.instrument
+
+    hist = nfldb.instrument.LatencyHistogram()
+    nfldb.add_query_hook(hist, explain=0.01)
+
+    # ... run queries ...
+    print hist.report()
+"""
+from __future__ import absolute_import, division, print_function
+import bisect
+from collections import defaultdict
+import re
+import threading
+
+
+_shape_subs = [
+    (re.compile(r"E?'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\b(?:true|false|null)\b', re.I), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?)'),
+    (re.compile(r'\(\?\)(?:\s*,\s*\(\?\))+'), '(?)'),
+    (re.compile(r'ARRAY\[[^\]]*\]', re.I), 'ARRAY[?]'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def query_shape(statement):
+    """
+    Returns a normalized version of the SQL `statement` where every
+    literal value is replaced with `?`. Lists of values (e.g., in an
+    `IN` or `VALUES` expression) are collapsed to a single `(?)`, so
+    that statements that differ only in their parameters have the
+    same shape.
+    """
+    for regex, repl in _shape_subs:
+        statement = regex.sub(repl, statement)
+    return statement.strip()
+
+
+class LatencyHistogram (object):
+    """
+    A query hook that records a histogram of statement latencies
+    for each query shape (see `nfldb.instrument.query_shape`). It is
+    safe to use from multiple threads.
+
+    Use it with `nfldb.add_query_hook`. If statements are sampled with
+    `EXPLAIN`, then the plan of the slowest sampled statement of each
+    shape is kept.
+    """
+    def __init__(self, bounds=None):
+        """
+        Introduces a new empty histogram. `bounds` is a sorted list
+        of bucket upper bounds in seconds. By default, buckets double
+        in size starting at 1 millisecond and ending at about one
+        minute. (There is always a final bucket for statements that
+        take longer than the last bound.)
+        """
+        if bounds is None:
+            bounds = [0.001 * 2**i for i in xrange(17)]
+        self.bounds = list(bounds)
+        """The upper bound of each bucket in seconds."""
+
+        self.__lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forgets every statement recorded so far."""
+        with self.__lock:
+            self.__counts = defaultdict(lambda: [0] * (len(self.bounds) + 1))
+            self.__totals = defaultdict(float)
+            self.__rows = defaultdict(int)
+            self.__callers = defaultdict(set)
+            self.__plans = {}
+
+    def __call__(self, event):
+        shape = query_shape(event.statement)
+        i = bisect.bisect_left(self.bounds, event.seconds)
+        with self.__lock:
+            self.__counts[shape][i] += 1
+            self.__totals[shape] += event.seconds
+            self.__rows[shape] += event.rows
+            if event.caller is not None:
+                self.__callers[shape].add(event.caller)
+            if event.plan is not None:
+                slowest = self.__plans.get(shape, (0, None))[0]
+                if event.seconds >= slowest:
+                    self.__plans[shape] = (event.seconds, event.plan)
+
+    def shapes(self):
+        """
+        Returns a list of every query shape recorded, sorted by the
+        total time spent executing it in descending order.
+        """
+        with self.__lock:
+            return sorted(self.__totals, key=self.__totals.get, reverse=True)
+
+    def count(self, shape):
+        """Returns the number of statements recorded for `shape`."""
+        with self.__lock:
+            return sum(self.__counts.get(shape, []))
+
+    def total(self, shape):
+        """Returns the total seconds spent executing `shape`."""
+        with self.__lock:
+            return self.__totals.get(shape, 0.0)
+
+    def rows(self, shape):
+        """Returns the total number of rows returned by `shape`."""
+        with self.__lock:
+            return self.__rows.get(shape, 0)
+
+    def callers(self, shape):
+        """
+        Returns a sorted list of the `nfldb.Query` methods that
+        executed `shape`, e.g., `['Query.as_plays']`.
+        """
+        with self.__lock:
+            return sorted(self.__callers.get(shape, []))
+
+    def plan(self, shape):
+        """
+        Returns the `EXPLAIN (ANALYZE, BUFFERS)` output of the slowest
+        sampled statement for `shape`, or `None` if no statement with
+        that shape was sampled.
+        """
+        with self.__lock:
+            return self.__plans.get(shape, (0, None))[1]
+
+    def percentile(self, shape, p):
+        """
+        Returns an upper bound in seconds on the `p`th percentile
+        latency of `shape`, where `p` is in the range `[0, 100]`.
+        The bound is the upper bound of the bucket containing the
+        percentile, or infinity for the last bucket. If there are no
+        statements recorded for `shape`, then `None` is returned.
+        """
+        with self.__lock:
+            counts = self.__counts.get(shape)
+            if counts is None:
+                return None
+            need, seen = sum(counts) * p / 100, 0
+            for i, n in enumerate(counts):
+                seen += n
+                if n > 0 and seen >= need:
+                    break
+        return self.bounds[i] if i < len(self.bounds) else float('inf')
+
+    def report(self, limit=10):
+        """
+        Returns a human readable report of the `limit` query shapes
+        with the largest total time as a string.
+        """
+        lines = []
+        for shape in self.shapes()[0:limit]:
+            n, total = self.count(shape), self.total(shape)
+            lines.append(
+                '%8.3fs total, %6d calls, %8.1fms avg, p50 <= %s, '
+                'p95 <= %s, %d rows'
+                % (total, n, 1000 * total / n,
+                   _fmt_secs(self.percentile(shape, 50)),
+                   _fmt_secs(self.percentile(shape, 95)),
+                   self.rows(shape)))
+            callers = self.callers(shape)
+            if len(callers) > 0:
+                lines.append('    from: %s' % ', '.join(callers))
+            lines.append('    %s' % shape)
+        return '\n'.join(lines)
+
+
+def _fmt_secs(secs):
+    if secs == float('inf'):
+        return 'inf'
+    return '%gms' % (secs * 1000)
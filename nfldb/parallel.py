@@ -0,0 +1,259 @@
+"""
+Runs big `nfldb.Query` searches (e.g., career statistics over many
+seasons) in parallel on several connections from a `nfldb.Pool`, so
+that PostgreSQL can use more than one core to answer them.
+
+A query is split into pieces that each cover a single season (or a
+single week) of games, the pieces are run concurrently by a pool of
+threads and their results are merged. For example, to find every
+player with at least 100 career touchdowns:
+
+    #!python
+    import nfldb
+    import nfldb.parallel
+
+    db = nfldb.connect()
+    pool = nfldb.pool(maxconn=8)
+    q = nfldb.Query(db).game(season_type='Regular')
+    q.aggregate(offense_tds__ge=100).sort('offense_tds')
+    for pp in nfldb.parallel.as_aggregate(pool, q, workers=8, db=db):
+        print pp.player, pp.offense_tds
+
+The connection used to build the query is never used to run it. The
+pooled connections that run the pieces go back to the pool before
+the results are returned, so the results use the connection `db`
+given to each function to lazily load related data (e.g.,
+`nfldb.PlayPlayer.player`). If `db` is `None`, then related data
+can't be loaded.
+"""
+from __future__ import absolute_import, division, print_function
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+from multiprocessing.pool import ThreadPool
+import operator
+
+from nfldb.db import Tx
+from nfldb.query import AggPP, Comparison, Param, Query, Sorter
+import nfldb.types as types
+
+
+_ops = {
+    '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+}
+
+
+def as_aggregate(pool, q, by='season', workers=4, db=None):
+    """
+    Returns the same results as `nfldb.Query.as_aggregate` on `q`,
+    except the query is split into pieces according to `by` (either
+    `season` or `week`) that are run concurrently on at most `workers`
+    connections from the `nfldb.Pool` `pool`.
+
+    Each piece sums the statistics of every player in its games
+    without applying any aggregate criteria, sorting or limit. The
+    partial sums are then added together, and the aggregate criteria,
+    sorting and limit of `q` are applied to the totals. Like
+    `nfldb.Query.as_aggregate`, aggregate criteria on derived fields
+    (e.g., `offense_yds`) are compared with the sums of the values
+    stored for each play player.
+
+    The results use the connection `db` to lazily load related data.
+    """
+    stored = _stored_fields(q)
+    pieces = _run(pool, q, by, workers, lambda p: _aggregate(p, stored))
+    totals, stored_totals = OrderedDict(), {}
+    for pps in pieces:
+        for pp, sums in pps:
+            if pp.player_id not in totals:
+                totals[pp.player_id] = pp
+                stored_totals[pp.player_id] = sums
+            else:
+                totals[pp.player_id]._add(pp)
+                for f, v in sums.iteritems():
+                    stored_totals[pp.player_id][f] += v
+    results = []
+    for pp in totals.itervalues():
+        _sum_derived(pp)
+        if _having(pp, q, stored_totals[pp.player_id]):
+            results.append(pp)
+    return _with_db(_sort(results, q), db)
+
+
+def as_play_players(pool, q, by='season', workers=4, db=None):
+    """
+    Returns the same results as `nfldb.Query.as_play_players` on `q`,
+    except the query is split into pieces according to `by` (either
+    `season` or `week`) that are run concurrently on at most `workers`
+    connections from the `nfldb.Pool` `pool`.
+
+    Each piece is sorted and limited like `q`, and the sort and limit
+    are applied again to the combined results.
+
+    The results use the connection `db` to lazily load related data.
+    """
+    q._assert_no_aggregate()
+
+    def run(p):
+        p._sort_exprs, p._limit = q._sort_exprs, q._limit
+        return p.as_play_players()
+    pieces = _run(pool, q, by, workers, run)
+    return _with_db(_sort([pp for pps in pieces for pp in pps], q), db)
+
+
+def _run(pool, q, by, workers, run):
+    """
+    Splits `q` into pieces according to `by` and returns a list of the
+    results of calling `run` on each piece. Each piece is a new
+    `nfldb.Query` with the criteria of `q` (but no aggregate criteria,
+    sorting or limit) and a connection checked out from `pool`.
+    """
+    with pool.connection() as db:
+        with Tx(db) as cursor:
+            parts = _partitions(cursor, by)
+
+    def piece(part):
+        lo, hi, game = part
+        with pool.connection() as db:
+            p = Query(db).andalso(_criteria(q, db))
+            p.play_player(gsis_id__ge=lo, gsis_id__le=hi)
+            if len(game) > 0:
+                p.game(**game)
+            return run(p)
+
+    threads = ThreadPool(max(1, min(workers, len(parts))))
+    try:
+        return threads.map(piece, parts)
+    finally:
+        threads.close()
+
+
+def _partitions(cursor, by):
+    """
+    Returns a list of triples `(lo, hi, game)` where `lo` and `hi` are
+    the smallest and largest GSIS identifiers of a season or week of
+    games and `game` is a dictionary of extra `nfldb.Query.game`
+    criteria that restrict the piece to that week.
+
+    GSIS identifiers start with the date of the game, so restricting a
+    piece to a range of them lets PostgreSQL use the primary key of
+    the `play_player` table (or of the `player_game` table, which
+    `nfldb.Query.as_aggregate` uses when it can).
+    """
+    assert by in ('season', 'week'), 'Cannot split a query by "%s".' % by
+    if by == 'season':
+        cursor.execute('''
+            SELECT MIN(gsis_id) AS lo, MAX(gsis_id) AS hi
+            FROM game GROUP BY season_year ORDER BY season_year
+        ''')
+        return [(r['lo'], r['hi'], {}) for r in cursor.fetchall()]
+    else:
+        cursor.execute('''
+            SELECT season_year, season_type, week,
+                   MIN(gsis_id) AS lo, MAX(gsis_id) AS hi
+            FROM game GROUP BY season_year, season_type, week
+            ORDER BY season_year, season_type, week
+        ''')
+        return [(r['lo'], r['hi'], {'season_year': r['season_year'],
+                                    'season_type': r['season_type'],
+                                    'week': r['week']})
+                for r in cursor.fetchall()]
+
+
+def _criteria(q, db):
+    """
+    Returns a new `nfldb.Query` with only the regular criteria in `q`.
+    """
+    c = Query(db)
+    c._andalso, c._orelse = list(q._andalso), list(q._orelse)
+    return c
+
+
+def _stored_fields(q):
+    """
+    Returns a list of the derived fields used in the aggregate criteria
+    of `q`.
+    """
+    derived = types.PlayPlayer._sql_tables['derived']
+    return sorted(set(c.column for c in q._agg_andalso + q._agg_orelse
+                      if c.column in derived))
+
+
+def _aggregate(p, stored):
+    """
+    Runs the aggregate query `p` and returns a list of pairs of an
+    aggregated `nfldb.PlayPlayer` and a dictionary mapping each
+    derived field in `stored` to the sum of its stored values.
+    """
+    results = []
+    with Tx(p._db) as cur:
+        q = p._make_aggregate_query(cur, stored=stored)
+        for row in p._fetchall(cur, q):
+            sums = dict((f, row['stored_%s' % f]) for f in stored)
+            results.append((AggPP.from_row_dict(p._db, row), sums))
+    return results
+
+
+def _sum_derived(pp):
+    """
+    Recomputes the derived fields of the aggregated `pp` from its
+    statistical categories, the same way `nfldb.query.AggPP` does.
+    """
+    for field, fields in types.PlayPlayer._derived_combined.items():
+        setattr(pp, field, sum(getattr(pp, f) for f in fields))
+    pp.points = sum(getattr(pp, f) * pval
+                    for f, pval in types.PlayPlayer._point_values)
+
+
+def _having(pp, q, stored):
+    """
+    Returns `True` if the aggregated `pp` satisfies the aggregate
+    criteria in `q`. Criteria on the derived fields in the dictionary
+    `stored` are compared with its values instead of those of `pp`.
+    """
+    def test(c):
+        if isinstance(c, Query):
+            return _having(pp, c, stored)
+        assert isinstance(c, Comparison)
+        assert not isinstance(c.value, Param), \
+            'Placeholders cannot be used in parallel queries.'
+        if c.column in stored:
+            v = stored[c.column]
+        else:
+            v = getattr(pp, c.column)
+        if isinstance(c.value, (list, tuple)):
+            return v in c.value
+        return _ops[c.operator](v, c.value)
+
+    groups = [[c] for c in q._agg_orelse]
+    if len(q._agg_andalso) > 0:
+        groups.append(q._agg_andalso)
+    if len(groups) == 0:
+        return True
+    return any(all(test(c) for c in g) for g in groups)
+
+
+def _with_db(pps, db):
+    """
+    Gives every object in `pps` the connection `db` in place of the
+    pooled connection that it was built with, and returns `pps`.
+    """
+    for pp in pps:
+        pp._db = db
+    return pps
+
+
+def _sort(pps, q):
+    """
+    Sorts and limits the list `pps` according to the criteria in `q`.
+    """
+    sorter = Sorter(types.PlayPlayer, q._sort_exprs, q._limit)
+    assert len(sorter.foreign_exprs()) == 0, \
+        'parallel queries can only be sorted by play player fields'
+    for _, field, order in reversed(sorter.exprs):
+        pps.sort(key=lambda pp: getattr(pp, field), reverse=order == 'DESC')
+    if sorter.limit > 0:
+        pps = pps[0:sorter.limit]
+    return pps
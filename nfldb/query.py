@@ -4,11 +4,15 @@ try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
+import itertools
+import json
 import re
+import threading
+import weakref
 
 from psycopg2.extensions import cursor as tuple_cursor
 
-from nfldb.db import Tx
+from nfldb.db import _mogrify, Tx
 import nfldb.sql as sql
 import nfldb.types as types
 
@@ -79,29 +83,125 @@ def current(db):
     return tuple([None] * 3)
 
 
-def _entities_by_ids(db, entity, *ids):
+def _entities_by_ids(db, entity, *ids, **kwargs):
     """
     Given an `nfldb` `entity` like `nfldb.Play` and a list of tuples
     `ids` where each tuple is the primary key (or a subset of the
     primary key) for `entity`, return a list of instances of `entity`
     corresponding to the `ids` given.
 
-    The order of the returned entities is undefined.
+    The order of the returned entities is undefined. Plays are
+    returned with their `play_players` attribute filled, unless the
+    keyword argument `fill` is `False`.
     """
-    funs = {
-        types.Game: {'query': Query.game, 'results': Query.as_games},
-        types.Drive: {'query': Query.drive, 'results': Query.as_drives},
-        types.Play: {'query': Query.play, 'results': Query.as_plays},
-        types.PlayPlayer: {'query': Query.play_player,
-                           'results': Query.as_play_players},
-        types.Player: {'query': Query.player, 'results': Query.as_players},
-    }[entity]
-    q = Query(db)
-    entq = funs['query']
+    fill = kwargs.pop('fill', True)
+    assert len(kwargs) == 0, 'unexpected arguments: %s' % kwargs.keys()
+
+    by_len = defaultdict(set)
     for pkey in ids:
-        named = dict(zip(entity._sql_tables['primary'], pkey))
-        q.orelse(entq(Query(db), **named))
-    return funs['results'](q)
+        by_len[len(pkey)].add(tuple(pkey))
+
+    results = []
+    init = entity.from_row_tuple
+    with Tx(db, factory=tuple_cursor) as cursor:
+        for keys in by_len.values():
+            for q in _sql_by_keys(cursor, entity, list(keys)):
+                cursor.execute(q)
+                for row in cursor.fetchall():
+                    results.append(init(db, row))
+    if fill and entity is types.Play:
+        _fill_play_players(db, results)
+    return results
+
+
+_stream_ids = itertools.count()
+"""A source of unique names for server-side cursors."""
+
+
+def _stream_name():
+    """Returns a new unique name for a server-side cursor."""
+    return 'nfldb_stream_%d' % next(_stream_ids)
+
+
+def _fetch_chunks(cursor, size):
+    """
+    A generator that yields lists of at most `size` rows from
+    `cursor` until it is exhausted.
+    """
+    while True:
+        rows = cursor.fetchmany(size)
+        if len(rows) == 0:
+            break
+        yield rows
+
+
+_FILL_CHUNK = 5000
+"""
+The maximum number of keys looked up in a single query by
+`nfldb.query._sql_by_keys`.
+"""
+
+
+def _sql_by_keys(cursor, entity, keys, aliases=None):
+    """
+    Generates `SELECT` statements that together return every row of
+    `entity` whose primary key is in `keys`. Each key is a tuple with
+    either the full primary key of `entity` or a prefix of it, and all
+    keys must have the same length.
+
+    The keys are joined with a `VALUES` list, so that PostgreSQL can
+    use the primary key index no matter how many keys there are. At
+    most `nfldb.query._FILL_CHUNK` keys are used in each statement.
+    """
+    if len(keys) == 0:
+        return
+    prim = entity._sql_tables['primary'][0:len(keys[0])]
+    key = ', '.join(entity._sql_field(k, aliases=aliases) for k in prim)
+    columns = entity._sql_select_fields(fields=entity.sql_fields(),
+                                        aliases=aliases)
+    from_tables = entity._sql_from(aliases=aliases)
+    for i in xrange(0, len(keys), _FILL_CHUNK):
+        chunk = keys[i:i+_FILL_CHUNK]
+        yield '''
+            SELECT {columns} {from_tables}
+            WHERE ({key}) IN (VALUES {ids})
+        '''.format(columns=', '.join(columns), from_tables=from_tables,
+                   key=key, ids=', '.join(_mogrify(cursor, k) for k in chunk))
+
+
+def _fill_play_players(db, plays, cache=None, cursor=None):
+    """
+    Sets the `play_players` attribute of every play in `plays` by
+    looking up play players with the primary keys of the plays. (See
+    `nfldb.query._sql_by_keys`.)
+
+    If `cache` is a `nfldb.cache.QueryCache`, then it is used to look
+    up the play players. If `cursor` is a tuple cursor, then it is used
+    instead of a new transaction.
+    """
+    if cursor is None:
+        with Tx(db, factory=tuple_cursor) as cursor:
+            return _fill_play_players(db, plays, cache=cache, cursor=cursor)
+
+    by_pid = OrderedDict()
+    for play in plays:
+        play._play_players = []
+        by_pid[(play.gsis_id, play.drive_id, play.play_id)] = play
+
+    aliases = {'play_player': 'pp'}
+    init_pp = types.PlayPlayer.from_row_tuple
+    for q in _sql_by_keys(cursor, types.PlayPlayer, by_pid.keys(),
+                          aliases=aliases):
+        if cache is not None:
+            rows = cache.fetchall(cursor, q, games=set(
+                p.gsis_id for p in plays))
+        else:
+            cursor.execute(q)
+            rows = cursor.fetchall()
+        for row in rows:
+            pp = init_pp(db, row)
+            by_pid[(pp.gsis_id, pp.drive_id, pp.play_id)] \
+                ._play_players.append(pp)
 
 
 def player_search(db, full_name, team=None, position=None,
@@ -233,20 +333,6 @@ def _no_comp_suffix(s):
     return re.sub('__(eq|ne|gt|lt|ge|le)$', '', s)
 
 
-def _comp_suffix(s):
-    """
-    Returns the comparison operator suffix given a search field.
-    This does not include the `__` (double underscore).
-
-    If no suffix is present, then `eq` is returned.
-    """
-    suffixes = ['eq', 'ne', 'lt', 'le', 'gt', 'ge']
-    for suffix in suffixes:
-        if s.endswith(suffix):
-            return suffix
-    return 'eq'
-
-
 class Condition (object):
     """
     An abstract class that describes the interface of components
@@ -350,20 +436,70 @@ class Comparison (Condition):
         if isinstance(self.value, tuple) or isinstance(self.value, list):
             assert self.operator == '=', \
                 'Disjunctions must use "=" for column "%s"' % field
-            vals = [cursor.mogrify('%s', (v,)) for v in self.value]
+            vals = [_sql_value(cursor, v) for v in self.value]
             return '%s IN (%s)' % (field, ', '.join(vals))
         else:
-            paramed = '%s %s %s' % (field, self.operator, '%s')
-            return cursor.mogrify(paramed, (self.value,))
+            return '%s %s %s' \
+                   % (field, self.operator, _sql_value(cursor, self.value))
+
 
+_compiling = threading.local()
+"""
+Its `active` attribute is `True` while `nfldb.Query.compile` is
+building SQL in the current thread, which is the only time that a
+`nfldb.Param` has a value.
+"""
 
-def QueryOR(db):
+
+def _sql_value(cursor, v):
+    """
+    Returns `v` escaped as a SQL literal, or the placeholder of `v` if
+    it is a `nfldb.Param`. An assertion error is raised for a
+    `nfldb.Param` outside of `nfldb.Query.compile`.
+    """
+    if isinstance(v, Param):
+        assert getattr(_compiling, 'active', False), \
+            'Param "%s" can only be used with Query.compile.' % v.name
+        return str(v)
+    return cursor.mogrify('%s', (v,))
+
+
+class Param (object):
+    """
+    A named placeholder that can be used in place of any value given
+    as search criteria to a `nfldb.Query`. Values are bound to it when
+    the query is executed with `nfldb.query.CompiledQuery.execute`.
+    For example:
+
+        #!python
+        q = Query(db).game(season_year=2013, week=Param('week'))
+        compiled = q.compile(nfldb.Game)
+        for week in xrange(1, 18):
+            print len(compiled.execute(week=week))
+
+    The same placeholder may be used in more than one criterion.
+    """
+    def __init__(self, name):
+        """
+        Introduces a new placeholder called `name`, which must be a
+        valid Python identifier.
+        """
+        assert re.match('^[A-Za-z_][A-Za-z0-9_]*$', name), \
+            'Parameter name "%s" is not an identifier.' % name
+        self.name = name
+        """The name used to bind a value to this placeholder."""
+
+    def __str__(self):
+        return '$(%s)' % self.name
+
+
+def QueryOR(db, cache=None):
     """
     Creates a disjunctive `nfldb.Query` object, where every
     condition is combined disjunctively. Namely, it is an alias for
-    `nfldb.Query(db, orelse=True)`.
+    `nfldb.Query(db, orelse=True, cache=cache)`.
     """
-    return Query(db, orelse=True)
+    return Query(db, orelse=True, cache=cache)
 
 
 class Query (Condition):
@@ -447,7 +583,7 @@ class Query (Condition):
     [nfldb's wiki](https://github.com/BurntSushi/nfldb/wiki).
     """
 
-    def __init__(self, db, orelse=False):
+    def __init__(self, db, orelse=False, cache=None):
         """
         Introduces a new `nfldb.Query` object. Criteria can be
         added with any combination of the `nfldb.Query.game`,
@@ -457,22 +593,39 @@ class Query (Condition):
         `nfldb.Query.as_games`, `nfldb.Query.as_drives`,
         `nfldb.Query.as_plays`, `nfldb.Query.as_play_players`,
         `nfldb.Query.as_players` and `nfldb.Query.as_aggregate`.
+        Large result sets can be streamed with the corresponding
+        `iter_*` methods, e.g., `nfldb.Query.iter_play_players`.
+        Queries that are run many times with different values can be
+        compiled with `nfldb.Query.compile`.
 
         Note that if aggregate criteria are specified with
         `nfldb.Query.aggregate`, then the **only** way to retrieve
         results is with the `nfldb.Query.as_aggregate` method. Invoking
         any of the other `as_*` methods will raise an assertion error.
+
+        If `cache` is a `nfldb.cache.QueryCache`, then the `as_*`
+        methods look up the rows of their queries in it before running
+        them.
         """
 
         self._db = db
         """A psycopg2 database connection object."""
 
+        self._cache = cache
+        """A `nfldb.cache.QueryCache` or `None`."""
+
         self._sort_exprs = None
         """Expressions used to sort the results."""
 
         self._limit = None
         """The number of results to limit the search to."""
 
+        self._paged = False
+        """Whether results are returned a page at a time."""
+
+        self._after = None
+        """The last result of the previous page, if there is one."""
+
         self._andalso = []
         """A list of conjunctive conditions."""
 
@@ -495,6 +648,44 @@ class Query (Condition):
         else:
             self._agg_default_cond = self._agg_andalso
 
+    def _fetchall(self, cursor, q, entity=None):
+        """
+        Executes the SQL query `q` and returns all of its rows, using
+        the query cache if there is one. `entity` is the entity that
+        the rows are fields of, if it could be `nfldb.Player`.
+        """
+        if self._cache is not None:
+            games = self._game_scope(cursor, entity)
+            return self._cache.fetchall(cursor, q, games=games)
+        cursor.execute(q)
+        return cursor.fetchall()
+
+    def _game_scope(self, cursor, entity=None):
+        """
+        Returns a SQL query for the GSIS identifiers of every game that
+        the results of `self` could depend on, or `None` if they could
+        depend on any game. This lets `nfldb.cache.QueryCache` keep
+        results when other games change.
+
+        Only criteria on fields of `nfldb.Game` that never change once
+        a game is scheduled are used, and only when every criterion
+        must hold. Results that depend on player data (i.e., players
+        are returned, searched or sorted on) could change whenever
+        players are updated, so they can depend on any game.
+        """
+        entities = self._entities()
+        entities.update(Sorter(types.Game, self._sort_exprs).entities)
+        if entity is types.Player or types.Player in entities:
+            return None
+        if len(self._orelse) > 0:
+            return None
+        conds = [c._sql_where(cursor) for c in self._andalso
+                 if isinstance(c, Comparison) and c.entity is types.Game
+                 and c.column in _stable_game_fields]
+        if len(conds) == 0:
+            return None
+        return 'SELECT game.gsis_id FROM game WHERE %s' % sql.ands(*conds)
+
     def sort(self, exprs):
         """
         Specify sorting criteria for the result set returned by
@@ -508,12 +699,28 @@ class Query (Condition):
         number of passing yards in the play, with the biggest coming
         first.
 
-        Remember that a sort field must be an attribute of the
-        results being returned. For example, you can't sort plays by
-        `home_score`, which is an attribute of a `nfldb.Game` object.
-        If you require this behavior, you will need to do it in Python
-        with its `sorted` built in function. (Or alternatively, use
-        two separate queries if the result set is large.)
+        A sort field is usually an attribute of the results being
+        returned, but it may also be a field of a less specific entity
+        when prefixed with its table name. For example, plays can be
+        sorted by `game.start_time` or `drive.start_time`, and play
+        players can be sorted by `player.full_name`. This is done by
+        PostgreSQL, so combining it with `nfldb.Query.limit` stays
+        fast. To get the 20 most recent plays from any game:
+
+            #!python
+            q = Query(db).sort([('game.start_time', 'desc'),
+                                ('time', 'desc')]).limit(20)
+            for p in q.as_plays():
+                print p
+
+        A sort expression may also be a tuple of three elements: a
+        table name, a field and the order. e.g., `('game', 'start_time',
+        'desc')` is the same as `('game.start_time', 'desc')`.
+
+        Results cannot be sorted by fields of a more specific entity,
+        since there may be many of them for each result. (e.g., games
+        cannot be sorted by `play.down`.) Aggregate results can only be
+        sorted by their own fields.
 
         You may provide multiple sort expressions. For example,
         `[('gsis_id', 'asc'), ('time', 'asc'), ('play_id', 'asc')]`
@@ -569,13 +776,103 @@ class Query (Condition):
         self._limit = count
         return self
 
+    def page(self, size, after=None):
+        """
+        Limits the results to a page of `size` results that come after
+        the result `after`, which should be the last result of the
+        previous page. If `after` is `None`, then the first page is
+        returned. For example, this returns every play of a game, 100
+        plays at a time:
+
+            #!python
+            q = nfldb.Query(db).game(gsis_id='2013090800')
+            plays = q.page(100).as_plays()
+            while len(plays) > 0:
+                for p in plays:
+                    print p
+                plays = q.page(100, after=plays[-1]).as_plays()
+
+        Results are sorted by the sorting criteria given with
+        `nfldb.Query.sort` (if any) and then by the primary key of
+        the results, so that every result is on exactly one page.
+        Pages are found with a `WHERE` condition on the sort fields
+        instead of an `OFFSET`, so the last page costs about the same
+        as the first page. (As long as PostgreSQL can use an index for
+        the sort, e.g., the primary key.) Consequently, fields used for
+        sorting should never be `NULL`.
+
+        Instead of a result object, `after` may be a tuple of the
+        values of the sort fields of the last result, followed by the
+        values of its primary key. (This is useful when a page must be
+        requested later, e.g., in a web application.)
+
+        Pages cannot be used with `nfldb.Query.as_aggregate` or
+        `nfldb.Query.as_team_aggregate`.
+        """
+        self._limit = size
+        self._paged = True
+        self._after = after
+        return self
+
     def _sorter(self, default_entity):
-        return Sorter(default_entity, self._sort_exprs, self._limit)
+        sorter = Sorter(default_entity, self._sort_exprs, self._limit,
+                        after=self._after)
+        if self._paged:
+            sorter.add_unique_exprs(
+                *[(c, 'asc') for c in default_entity._sql_tables['primary']])
+        return sorter
 
     def _assert_no_aggregate(self):
         assert len(self._agg_andalso) == 0 and len(self._agg_orelse) == 0, \
             'aggregate criteria are only compatible with as_aggregate'
 
+    def _assert_no_page(self):
+        assert not self._paged, \
+            'pages cannot be used with aggregate statistics'
+
+    def compile(self, entity, fill=True):
+        """
+        Compiles the query into a `nfldb.query.CompiledQuery` that
+        returns results as a list of `entity` objects, where `entity`
+        is one of `nfldb.Game`, `nfldb.Drive`, `nfldb.Play`,
+        `nfldb.PlayPlayer` or `nfldb.Player`. Any criteria given as a
+        `nfldb.Param` are bound each time the compiled query is
+        executed. If `fill` is `True` and `entity` is `nfldb.Play`,
+        then the `play_players` attribute of every play is filled, as
+        with `nfldb.Query.as_plays`.
+
+        If aggregate criteria were given with `nfldb.Query.aggregate`,
+        then `entity` must be `nfldb.PlayPlayer` and the results are
+        the same as `nfldb.Query.as_aggregate`.
+
+        The compiled query is run as a server-side prepared statement,
+        so PostgreSQL only plans it once per connection. This is much
+        faster than building a new query when the same search is
+        repeated many times with different values. Criteria added to
+        this query after it is compiled have no effect on the compiled
+        query.
+        """
+        aggregate = len(self._agg_andalso) > 0 or len(self._agg_orelse) > 0
+        _compiling.active = True
+        try:
+            with Tx(self._db) as cursor:
+                if aggregate:
+                    assert entity is types.PlayPlayer, \
+                        'aggregate criteria can only be compiled for ' \
+                        'PlayPlayer'
+                    entity, q = AggPP, self._make_aggregate_query(cursor)
+                else:
+                    assert entity in _ENTITIES.values(), \
+                        'Cannot compile a query for "%s".' % entity
+                    sorter = None
+                    if entity is types.Play:
+                        sorter = self._play_sorter()
+                    q = self._make_join_query(cursor, entity, sorter=sorter)
+        finally:
+            _compiling.active = False
+        return CompiledQuery(self, entity, q,
+                             fill=fill and entity is types.Play)
+
     def andalso(self, *conds):
         """
         Adds the list of `nfldb.Query` objects in `conds` to this
@@ -661,24 +958,6 @@ class Query (Condition):
         particular, there are *zero or more* player statistics for
         every play.
         """
-        # Technically, it isn't necessary to handle derived fields manually
-        # since their SQL can be generated automatically, but it can be
-        # much faster to express them in terms of boolean logic with other
-        # fields rather than generate them.
-        for field, value in kw.items():
-            nosuff = _no_comp_suffix(field)
-            suff = _comp_suffix(field)
-
-            def replace_or(*fields):
-                q = Query(self._db, orelse=True)
-                ors = dict([('%s__%s' % (f, suff), value) for f in fields])
-                self.andalso(q.play_player(**ors))
-
-            if nosuff in types.PlayPlayer._derived_combined:
-                replace_or(*types.PlayPlayer._derived_combined[nosuff])
-                kw.pop(field)
-
-        # Now add the rest of the query.
         _append_conds(self._default_cond, types.PlayPlayer, kw)
         return self
 
@@ -727,27 +1006,16 @@ class Query (Condition):
         return self
 
     def _make_join_query(self, cursor, entity, only_prim=False, sorter=None,
-                         ent_fillers=None):
+                         ent_fillers=None, select=None):
         if sorter is None:
             sorter = self._sorter(entity)
+        sorter.assert_joinable()
+        entities = self._join_entities(entity, sorter, ent_fillers)
+        where = [self._sql_where(cursor), sorter.sql_after(cursor)]
 
-        entities = self._entities()
-        entities.update(sorter.entities)
-        for ent in ent_fillers or []:
-            entities.add(ent)
-        entities.discard(entity)
-
-        # If we're joining the `player` table with any other table except
-        # `play_player`, then we MUST add `play_player` as a joining table.
-        # It is the only way to bridge players and games/drives/plays.
-        #
-        # TODO: This could probably be automatically deduced in general case,
-        # but we only have one case so just check for it manually.
-        if (entity is not types.PlayPlayer and types.Player in entities) \
-                or (entity is types.Player and len(entities) > 0):
-            entities.add(types.PlayPlayer)
-
-        if only_prim:
+        if select is not None:
+            fields = select
+        elif only_prim:
             columns = entity._sql_tables['primary']
             fields = entity._sql_select_fields(fields=columns)
         else:
@@ -759,7 +1027,7 @@ class Query (Condition):
             'columns': ', '.join(fields),
             'from': entity._sql_from(),
             'joins': entity._sql_join_all(entities),
-            'where': sql.ands(self._sql_where(cursor)),
+            'where': sql.ands(*where),
             'groupby': '',
             'sortby': sorter.sql(),
         }
@@ -767,10 +1035,14 @@ class Query (Condition):
         # We need a GROUP BY if we're joining with a table that has more
         # specific information. e.g., selecting from game with criteria
         # for plays.
-        if any(entity._sql_relation_distance(to) > 0 for to in entities):
+        if _fans_out(entity, entities):
             fields = []
             for table, _ in entity._sql_tables['tables']:
                 fields += entity._sql_primary_key(table)
+            # Fields of less specific entities that are sorted on have
+            # one value in each group, but PostgreSQL can't know that.
+            for ent, field, _ in sorter.foreign_exprs():
+                fields.append(ent._sql_field(field))
             args['groupby'] = 'GROUP BY ' + ', '.join(fields)
 
         q = '''
@@ -781,50 +1053,195 @@ class Query (Condition):
         '''.format(**args)
         return q
 
-    def as_games(self):
+    def _join_entities(self, entity, sorter, ent_fillers=None):
+        """
+        Returns the set of entities that must be joined with `entity`
+        to apply the criteria in `self` and the sort criteria in
+        `sorter`.
+        """
+        entities = self._entities()
+        entities.update(sorter.entities)
+        for ent in ent_fillers or []:
+            entities.add(ent)
+        entities.discard(entity)
+
+        # If we're joining the `player` table with any other table except
+        # `play_player`, then we MUST add `play_player` as a joining table.
+        # It is the only way to bridge players and games/drives/plays.
+        #
+        # TODO: This could probably be automatically deduced in general case,
+        # but we only have one case so just check for it manually.
+        if (entity is not types.PlayPlayer and types.Player in entities) \
+                or (entity is types.Player and len(entities) > 0):
+            entities.add(types.PlayPlayer)
+        return entities
+
+    def explain(self, entity, analyze=False, aggregate=False, group_by=None,
+                per_game=False):
+        """
+        Returns a `nfldb.query.Explanation` of how PostgreSQL runs
+        the query that returns `entity` objects (as with `as_games`,
+        `as_plays`, etc.).
+
+        If `aggregate` is `True`, aggregate criteria were given or
+        `group_by` isn't `None`, then the query explained is the one
+        run by `nfldb.Query.as_aggregate` with `group_by` when
+        `entity` is `nfldb.PlayPlayer`, or the one run by
+        `nfldb.Query.as_team_aggregate` with `per_game` when `entity`
+        is `nfldb.Team`. This shows, for example, whether the
+        statistics are summed from the `player_game` table.
+
+        If `analyze` is `True`, then the query is actually run, and the
+        plan includes real row counts, timings and buffer usage. (The
+        results are thrown away.)
+
+        This is useful for finding out why a query is slow:
+
+            #!python
+            q = nfldb.Query(db).game(season_year=2013).play(down=4)
+            print q.explain(nfldb.Game, analyze=True)
+        """
+        aggregate = aggregate or group_by is not None \
+            or len(self._agg_andalso) > 0 or len(self._agg_orelse) > 0
+        with Tx(self._db) as cursor:
+            if aggregate and entity is types.Team:
+                q = self._make_team_aggregate_query(cursor, per_game=per_game)
+                fanout = _fans_out(types.Play, self._join_entities(
+                    types.Play, Sorter(types.Play)))
+            elif aggregate:
+                assert entity is types.PlayPlayer, \
+                    'aggregates can only be explained for PlayPlayer or Team'
+                q = self._make_aggregate_query(cursor, group_by=group_by)
+                fanout = _fans_out(types.PlayPlayer, self._entities())
+            else:
+                assert entity in _ENTITIES.values(), \
+                    'Cannot explain a query for "%s".' % entity
+                sorter = self._sorter(entity)
+                if entity is types.Play:
+                    sorter = self._play_sorter()
+                q = self._make_join_query(cursor, entity, sorter=sorter)
+                fanout = _fans_out(
+                    entity, self._join_entities(entity, sorter))
+
+            options = 'FORMAT JSON'
+            if analyze:
+                options += ', ANALYZE, BUFFERS'
+            cursor.execute('EXPLAIN (%s) %s' % (options, q))
+            plan = cursor.fetchone().values()[0]
+        if isinstance(plan, basestring):
+            plan = json.loads(plan)
+        return Explanation(q, plan[0], fanout, analyze)
+
+    def count(self, entity):
+        """
+        Returns the number of `entity` objects (e.g., `nfldb.Play`)
+        that match the criteria, without fetching any of them. Sorting
+        criteria and limits are ignored.
+        """
+        self._assert_no_aggregate()
+        with Tx(self._db, factory=tuple_cursor) as cursor:
+            q = self._make_count_query(cursor, entity)
+            return self._fetchall(cursor, q)[0][0]
+
+    def exists(self, entity):
+        """
+        Returns `True` if and only if at least one `entity` object
+        (e.g., `nfldb.Play`) matches the criteria. PostgreSQL stops
+        searching as soon as it finds one.
+        """
+        self._assert_no_aggregate()
+        with Tx(self._db, factory=tuple_cursor) as cursor:
+            q = self._make_join_query(cursor, entity, only_prim=True,
+                                      sorter=Sorter(entity))
+            return self._fetchall(cursor, 'SELECT EXISTS (%s)' % q)[0][0]
+
+    def _make_count_query(self, cursor, entity):
+        sorter = Sorter(entity)
+        if _fans_out(entity, self._join_entities(entity, sorter)):
+            # The join has many rows for each entity, so count the
+            # groups on its primary key instead.
+            q = self._make_join_query(cursor, entity, only_prim=True,
+                                      sorter=sorter)
+            return 'SELECT COUNT(*) FROM (%s) AS matches' % q
+        return self._make_join_query(cursor, entity, sorter=sorter,
+                                     select=['COUNT(*)'])
+
+    def as_games(self, fields=None):
         """
         Executes the query and returns the results as a list of
         `nfldb.Game` objects.
+
+        If `fields` is a list of fields of `nfldb.Game`, then only
+        those fields (and the primary key) are fetched. Any other
+        field is fetched (along with all of the other missing fields)
+        the first time it is used, for every object in the results at
+        once. This is much faster when only a few fields of many results are
+        needed, e.g., `fields=['description']` for plays. The same
+        applies to the `fields` argument of the other `as_*` methods.
         """
         self._assert_no_aggregate()
 
         results = []
         with Tx(self._db, factory=tuple_cursor) as cursor:
-            q = self._make_join_query(cursor, types.Game)
-            cursor.execute(q)
-            for row in cursor.fetchall():
-                results.append(types.Game.from_row_tuple(self._db, row))
+            init, select = _projection(types.Game, fields)
+            q = self._make_join_query(cursor, types.Game, select=select)
+            for row in self._fetchall(cursor, q):
+                results.append(init(self._db, row))
         return results
 
-    def as_drives(self):
+    def as_drives(self, fields=None):
         """
         Executes the query and returns the results as a list of
         `nfldb.Drive` objects.
+
+        If `fields` is a list of fields of `nfldb.Drive`, then only
+        those fields (and the primary key) are fetched. See
+        `nfldb.Query.as_games` for more details.
         """
         self._assert_no_aggregate()
 
         results = []
         with Tx(self._db, factory=tuple_cursor) as cursor:
-            q = self._make_join_query(cursor, types.Drive)
-            cursor.execute(q)
-            for row in cursor.fetchall():
-                results.append(types.Drive.from_row_tuple(self._db, row))
+            init, select = _projection(types.Drive, fields)
+            q = self._make_join_query(cursor, types.Drive, select=select)
+            for row in self._fetchall(cursor, q):
+                results.append(init(self._db, row))
         return results
 
-    def as_plays(self, fill=True):
+    def as_plays(self, fill=True, fields=None):
         """
-        Executes the query and returns the results as a dictionary
-        of `nlfdb.Play` objects that don't have the `play_player`
-        attribute filled. The keys of the dictionary are play id
-        tuples with the spec `(gsis_id, drive_id, play_id)`.
+        Executes the query and returns the results as a list of
+        `nlfdb.Play` objects.
 
-        The primary key membership SQL expression is also returned.
-        """
-        def make_pid(play):
-            return (play.gsis_id, play.drive_id, play.play_id)
+        If `fill` is `True`, then the `play_players` attribute of every
+        play is filled by looking up play players with the primary keys
+        of the plays returned. The query itself is only run once.
 
+        If `fields` is a list of fields of `nfldb.Play`, then only
+        those fields (and the primary key) are fetched. See
+        `nfldb.Query.as_games` for more details.
+        """
         self._assert_no_aggregate()
+        sorter = self._play_sorter()
+
+        results = []
+        with Tx(self._db, factory=tuple_cursor) as cursor:
+            init, select = _projection(types.Play, fields)
+            q = self._make_join_query(cursor, types.Play, sorter=sorter,
+                                      select=select)
+            for row in self._fetchall(cursor, q):
+                results.append(init(self._db, row))
+
+            # Fetch play players by the primary keys of the plays we just
+            # got, rather than running the (possibly expensive) join above
+            # again. This is done in the same transaction so that the
+            # plays and play players are consistent.
+            if fill:
+                _fill_play_players(self._db, results, cache=self._cache,
+                                   cursor=cursor)
+        return results
 
+    def _play_sorter(self):
         # This is pretty terrifying.
         # Apparently PostgreSQL can change the order of rows returned
         # depending on the columns selected. So e.g., if you sort by `down`
@@ -841,52 +1258,15 @@ class Query (Condition):
         # That was a lie. We override the user settings if the user asks
         # to sort by `gsis_id`, `drive_id` or `play_id`.
         consistent = [(c, 'asc') for c in ['gsis_id', 'drive_id', 'play_id']]
-        sorter = Sorter(types.Play, self._sort_exprs, self._limit)
-        sorter.add_exprs(*consistent)
-
-        if not fill:
-            results = []
-            with Tx(self._db, factory=tuple_cursor) as cursor:
-                init = types.Play.from_row_tuple
-                q = self._make_join_query(cursor, types.Play, sorter=sorter)
-                cursor.execute(q)
-                for row in cursor.fetchall():
-                    results.append(init(self._db, row))
-            return results
+        sorter = Sorter(types.Play, self._sort_exprs, self._limit,
+                        after=self._after)
+        if self._paged:
+            sorter.add_unique_exprs(*consistent)
         else:
-            plays = OrderedDict()
-            with Tx(self._db, factory=tuple_cursor) as cursor:
-                init_play = types.Play.from_row_tuple
-                q = self._make_join_query(cursor, types.Play, sorter=sorter)
-                cursor.execute(q)
-                for row in cursor.fetchall():
-                    play = init_play(self._db, row)
-                    play._play_players = []
-                    plays[make_pid(play)] = play
-
-                # Run the above query *again* as a subquery.
-                # This time, only fetch the primary key, and use that to
-                # fetch all the `play_player` records in one swoop.
-                aliases = {'play_player': 'pp'}
-                ids = self._make_join_query(cursor, types.Play,
-                                            only_prim=True, sorter=sorter)
-                from_tables = types.PlayPlayer._sql_from(aliases=aliases)
-                columns = types.PlayPlayer._sql_select_fields(
-                    fields=types.PlayPlayer.sql_fields(), aliases=aliases)
-                q = '''
-                    SELECT {columns} {from_tables}
-                    WHERE (pp.gsis_id, pp.drive_id, pp.play_id) IN ({ids})
-                '''.format(columns=', '.join(columns),
-                           from_tables=from_tables, ids=ids)
-
-                init_pp = types.PlayPlayer.from_row_tuple
-                cursor.execute(q)
-                for row in cursor.fetchall():
-                    pp = init_pp(self._db, row)
-                    plays[make_pid(pp)]._play_players.append(pp)
-            return plays.values()
+            sorter.add_exprs(*consistent)
+        return sorter
 
-    def as_play_players(self):
+    def as_play_players(self, fields=None):
         """
         Executes the query and returns the results as a list of
         `nlfdb.PlayPlayer` objects.
@@ -897,35 +1277,41 @@ class Query (Condition):
         `nfldb.Query.aggregate` and `nfldb.Query.as_aggregate` when
         possible, since it is significantly faster to sum statistics in
         the database as opposed to Python.
+
+        If `fields` is a list of fields of `nfldb.PlayPlayer`, then only
+        those fields (and the primary key) are fetched. See
+        `nfldb.Query.as_games` for more details.
         """
         self._assert_no_aggregate()
 
         results = []
         with Tx(self._db, factory=tuple_cursor) as cursor:
-            init = types.PlayPlayer.from_row_tuple
-            q = self._make_join_query(cursor, types.PlayPlayer)
-            cursor.execute(q)
-            for row in cursor.fetchall():
+            init, select = _projection(types.PlayPlayer, fields)
+            q = self._make_join_query(cursor, types.PlayPlayer, select=select)
+            for row in self._fetchall(cursor, q):
                 results.append(init(self._db, row))
         return results
 
-    def as_players(self):
+    def as_players(self, fields=None):
         """
         Executes the query and returns the results as a list of
         `nfldb.Player` objects.
+
+        If `fields` is a list of fields of `nfldb.Player`, then only
+        those fields (and the primary key) are fetched. See
+        `nfldb.Query.as_games` for more details.
         """
         self._assert_no_aggregate()
 
         results = []
-        with Tx(self._db) as cursor:
-            q = self._make_join_query(cursor, types.Player)
-            cursor.execute(q)
-
-            for row in cursor.fetchall():
-                results.append(types.Player.from_row_dict(self._db, row))
+        with Tx(self._db, factory=tuple_cursor) as cursor:
+            init, select = _projection(types.Player, fields)
+            q = self._make_join_query(cursor, types.Player, select=select)
+            for row in self._fetchall(cursor, q, entity=types.Player):
+                results.append(init(self._db, row))
         return results
 
-    def as_aggregate(self):
+    def as_aggregate(self, group_by=None):
         """
         Executes the query and returns the results as aggregated
         `nfldb.PlayPlayer` objects. This method is meant to be a more
@@ -936,58 +1322,359 @@ class Query (Condition):
 
         If any sorting criteria is specified, it is applied to the
         aggregate *player* values only.
+
+        By default, statistics are summed for each player. If
+        `group_by` is a list of keys, then statistics are summed for
+        each player *and* each distinct combination of values of those
+        keys, and each result has an attribute for every key with its
+        value. A key may be `gsis_id`, `drive_id`, `play_id` or `team`
+        of `nfldb.PlayPlayer`, `opponent` (the team the player played
+        against), or any other field of `nfldb.Game`. For example,
+        this returns the game log of a player:
+
+            #!python
+            q = nfldb.Query(db).game(season_year=2013)
+            q.player(full_name='Tom Brady')
+            for pp in q.as_aggregate(group_by=['week', 'opponent']):
+                print pp.week, pp.opponent, pp.passing_yds
+
+        Aggregate criteria, sorting and limits apply to the grouped
+        results (i.e., a limit of `10` returns `10` groups in total).
+        Results are always ordered by the keys last, so results without
+        any other sorting criteria are ordered by group.
+
+        When every criterion is on a game or a player (or on the
+        `gsis_id`, `player_id` or `team` of a play player) and the
+        results aren't grouped by drive or play, the statistics are
+        summed from the `player_game` table, which has one row for
+        each player in each game. This is much faster for queries
+        that span whole seasons. Otherwise, they are summed from
+        every play player. The results are the same either way as
+        long as `player_game` is up to date: it is refreshed for every
+        game that `nfldb-update` writes (and by `nfldb.bulk_load`),
+        but not when the `play_player` table is changed in any other
+        way (e.g., with SQL). In that case, `player_game` may be
+        rebuilt with `nfldb.db._refresh_player_game`.
         """
-        class AggPP (types.PlayPlayer):
-            @classmethod
-            def _sql_field(cls, name, aliases=None):
-
-                if name in cls._derived_combined:
-                    fields = cls._derived_combined[name]
-                    fields = [cls._sql_field(f, aliases=aliases) for f in fields]
-                    return ' + '.join(fields)
-                elif name == 'points':
-                    fields = ['(%s * %d)' % (cls._sql_field(f, aliases=aliases), pval)
-                              for f, pval in cls._point_values]
-                    return ' + '.join(fields)
-                else:
-                    sql = super(AggPP, cls)._sql_field(name, aliases=aliases)
-                    return 'SUM(%s)' % sql
+        results = []
+        with Tx(self._db) as cur:
+            init = AggPP.from_row_dict
+            q = self._make_aggregate_query(cur, group_by=group_by)
+            for row in self._fetchall(cur, q):
+                results.append(init(self._db, row))
+        return results
 
-        joins = ''
+    def as_team_aggregate(self, per_game=False):
+        """
+        Executes the query and returns the results as a list of
+        `nfldb.query.AggTeam` objects, which hold the statistics of
+        each team summed by PostgreSQL. If `per_game` is `True`, then
+        statistics are summed for each team in each game instead.
+
+        Player statistics are summed from every play player of the
+        team that matches the criteria, and play statistics (e.g.,
+        `third_down_att`) are summed from every play that matches the
+        criteria where the team has possession. For example, this
+        returns the offensive yards of every team in the 2013 regular
+        season, starting with the most:
+
+            #!python
+            q = nfldb.Query(db).game(season_year=2013, season_type='Regular')
+            for t in q.sort('offense_yds').as_team_aggregate():
+                print t.team, t.offense_yds, t.third_down_conv
+
+        Aggregate criteria (see `nfldb.Query.aggregate`) apply to the
+        summed player statistics of each team, and sorting criteria
+        may use any field of `nfldb.query.AggTeam`.
+        """
         results = []
         with Tx(self._db) as cur:
-            for ent in self._entities():
-                if ent is types.PlayPlayer:
-                    continue
-                joins += types.PlayPlayer._sql_join_to_all(ent)
-
-            sum_fields = types._player_categories.keys() \
-                + AggPP._sql_tables['derived']
-            select_sum_fields = AggPP._sql_select_fields(sum_fields)
-            where = self._sql_where(cur)
-            having = self._sql_where(cur, aggregate=True)
-            q = '''
-                SELECT
-                    play_player.player_id AS play_player_player_id, {sum_fields}
+            q = self._make_team_aggregate_query(cur, per_game=per_game)
+            for row in self._fetchall(cur, q):
+                results.append(AggTeam._from_row_dict(self._db, row))
+        return results
+
+    def _make_team_aggregate_query(self, cur, per_game=False):
+        self._assert_no_page()
+        keys = ['team'] + (['gsis_id'] if per_game else [])
+        joins = ''
+        for ent in self._entities():
+            if ent is types.PlayPlayer:
+                continue
+            joins += types.PlayPlayer._sql_join_to_all(ent)
+
+        pp_fields = types._player_categories.keys() \
+            + AggPP._sql_tables['derived']
+        play_fields = types._play_categories.keys()
+        play_keys = {'team': 'play.pos_team', 'gsis_id': 'play.gsis_id'}
+
+        # Plays are found with the primary keys of plays matching the
+        # criteria, so that joining with play players doesn't count a
+        # play more than once.
+        play_ids = self._make_join_query(cur, types.Play, only_prim=True,
+                                         sorter=Sorter(types.Play))
+
+        # Aggregate criteria are applied to the team sums, so that they
+        # agree with the derived fields of `nfldb.query.AggTeam`.
+        agg_where = Condition._disjunctions(
+            cur, [self._agg_andalso] + [[c] for c in self._agg_orelse],
+            aliases={'play_player': 'pp'})
+
+        sorter = AggTeam._sorter(self._sort_exprs, self._limit, keys)
+        return '''
+            SELECT {columns}
+            FROM (
+                SELECT {pp_keys}, {pp_sums}
                 FROM play_player
                 {joins}
                 WHERE {where}
-                GROUP BY play_player.player_id
-                HAVING {having}
-                {order}
-            '''.format(
-                sum_fields=', '.join(select_sum_fields),
-                joins=joins,
-                where=sql.ands(where),
-                having=sql.ands(having),
-                order=self._sorter(AggPP).sql(),
-            )
+                GROUP BY {pp_group}
+            ) AS pp
+            LEFT JOIN (
+                SELECT {play_keys}, {play_sums}
+                FROM play
+                WHERE (play.gsis_id, play.drive_id, play.play_id)
+                      IN ({play_ids})
+                GROUP BY {play_group}
+            ) AS pl ON {on}
+            WHERE {agg_where}
+            {order}
+        '''.format(
+            columns=', '.join(
+                ['pp.%s' % k for k in keys]
+                + ['pp.%s' % f for f in pp_fields]
+                + ['COALESCE(pl.%s, 0) AS %s' % (f, f) for f in play_fields]),
+            pp_keys=', '.join('play_player.%s AS %s' % (k, k) for k in keys),
+            pp_sums=', '.join('%s AS %s' % (AggTeam._sql_sum(f), f)
+                              for f in pp_fields),
+            joins=joins,
+            where=sql.ands(self._sql_where(cur)),
+            pp_group=', '.join('play_player.%s' % k for k in keys),
+            agg_where=sql.ands(agg_where),
+            play_keys=', '.join('%s AS %s' % (play_keys[k], k) for k in keys),
+            play_sums=', '.join('SUM(play.%s) AS %s' % (f, f)
+                                for f in play_fields),
+            play_ids=play_ids,
+            play_group=', '.join(play_keys[k] for k in keys),
+            on=' AND '.join('pl.%s = pp.%s' % (k, k) for k in keys),
+            order=sorter,
+        )
+
+    def as_arrays(self, entity, fields=None):
+        """
+        Executes the query and returns the results as columns instead
+        of objects. The return value is an ordered dictionary mapping
+        each field of `entity` (e.g., `nfldb.PlayPlayer`) in `fields`
+        to a NumPy array with one element per result. If `fields` is
+        `None`, then every field in `entity.sql_fields()` is returned.
+
+        No `entity` objects are created, which makes this much faster
+        than the other `as_*` methods for large results that are only
+        going to be turned into arrays anyway. Values are stored as
+        follows:
+
+        * Statistical categories are `int16` (or `float32` when
+          `nfldb.Category.is_real` is `True`).
+        * Enumerations are `int16` codes corresponding to the `value`
+          of the enumeration member (e.g., `nfldb.Enums.game_phase`),
+          where `0` is used for `NULL`.
+        * `nfldb.FieldPosition` is the `int16` offset from midfield
+          and `nfldb.PossessionTime` is the `int16` number of seconds.
+        * `nfldb.Clock` is the `int32` value `phase * 901 + elapsed`,
+          where `phase` is the value of its game phase. This sorts
+          the same way as `nfldb.Clock`.
+        * Timestamps are `datetime64[us]` in UTC.
+        * Other numbers and booleans get the NumPy type inferred from
+          their values, and anything else (like strings) is stored in
+          an `object` array.
+
+        Numeric columns that contain a `NULL` are promoted to
+        `float64` with `NaN` in place of `NULL`.
+
+        NumPy is only imported when this method is called, so it is
+        not otherwise a dependency of `nfldb`.
+        """
+        import numpy
+
+        self._assert_no_aggregate()
+        if fields is None:
+            fields = entity.sql_fields()
+        for f in fields:
+            assert f in entity.sql_fields(), \
+                '"%s" is not a field of %s.' % (f, entity.__name__)
+
+        prefix = entity._sql_primary_table()
+        select = ['%s AS %s_%s' % (_array_field(entity, f)[0], prefix, f)
+                  for f in fields]
+        with Tx(self._db, factory=tuple_cursor) as cursor:
+            q = self._make_join_query(cursor, entity, select=select)
+            rows = self._fetchall(cursor, q, entity=entity)
+
+        columns = zip(*rows) if len(rows) > 0 else [()] * len(fields)
+        arrays = OrderedDict()
+        for f, values in zip(fields, columns):
+            dtype = _array_field(entity, f)[1] or _infer_dtype(values)
+            arrays[f] = _to_array(numpy, values, dtype)
+        return arrays
+
+    def _make_aggregate_query(self, cur, group_by=None, stored=()):
+        """
+        Returns the SQL of `nfldb.Query.as_aggregate`. For each derived
+        field in `stored`, the sum of its stored column is also
+        selected as `stored_{field}`, which is what aggregate criteria
+        on the derived field are compared with.
+        """
+        self._assert_no_page()
+        entities = self._entities()
+        groups = [(k, _agg_group_key(k)) for k in group_by or []]
+        rollup = len(stored) == 0 and _uses_player_game(self, group_by or [])
+        if any(k not in types.PlayPlayer.sql_fields() for k, _ in groups):
+            entities.add(types.Game)
+
+        joins = ''
+        for ent in entities:
+            if ent is types.PlayPlayer:
+                continue
+            joins += types.PlayPlayer._sql_join_to_all(ent)
+
+        sum_fields = types._player_categories.keys() \
+            + AggPP._sql_tables['derived']
+        select_sum_fields = AggPP._sql_select_fields(sum_fields)
+        where = self._sql_where(cur)
+        having = self._sql_where(cur, aggregate=True)
+
+        sorter = self._sorter(AggPP)
+        assert len(sorter.foreign_exprs()) == 0, \
+            'aggregate results can only be sorted by their own fields'
+        if len(groups) == 0:
+            order = sorter.sql()
+        else:
+            limit, sorter.limit = sorter.limit, 0
+            keys = [expr for _, expr in groups] + ['play_player.player_id']
+            order = sorter.sql().strip()
+            order += ', ' if len(order) > 0 else 'ORDER BY '
+            order += ', '.join(keys)
+            if limit > 0:
+                order += ' LIMIT %d' % limit
+        return '''
+            SELECT
+                play_player.player_id AS play_player_player_id, {sum_fields}
+            FROM {from_table}
+            {joins}
+            WHERE {where}
+            GROUP BY {group_by}
+            HAVING {having}
+            {order}
+        '''.format(
+            sum_fields=', '.join(
+                ['%s AS play_player_%s' % (expr, k) for k, expr in groups]
+                + select_sum_fields
+                + ['SUM(%s) AS stored_%s' % (types.PlayPlayer._sql_field(f), f)
+                   for f in stored]),
+            # The alias lets every expression refer to `play_player`.
+            from_table='player_game AS play_player' if rollup
+                       else 'play_player',
+            joins=joins,
+            where=sql.ands(where),
+            group_by=', '.join(['play_player.player_id']
+                               + [expr for _, expr in groups]),
+            having=sql.ands(having),
+            order=order,
+        )
+
+    def iter_games(self, itersize=2000):
+        """
+        Like `nfldb.Query.as_games`, except a generator of
+        `nfldb.Game` objects is returned. Results are fetched from a
+        server-side cursor `itersize` rows at a time, so that memory
+        use is bounded regardless of the size of the result set.
+
+        The same applies to all of the `iter_*` methods. Note that the
+        query runs inside a transaction that stays open until the
+        generator is exhausted or closed. Since the query isn't run
+        until the first result is requested, errors (like using
+        aggregate criteria) are also raised at that point.
+        """
+        self._assert_no_aggregate()
+        for game in self._stream(types.Game, itersize):
+            yield game
+
+    def iter_drives(self, itersize=2000):
+        """
+        Like `nfldb.Query.as_drives`, except a generator of
+        `nfldb.Drive` objects is returned. See
+        `nfldb.Query.iter_games` for more details.
+        """
+        self._assert_no_aggregate()
+        for drive in self._stream(types.Drive, itersize):
+            yield drive
+
+    def iter_plays(self, fill=True, itersize=2000):
+        """
+        Like `nfldb.Query.as_plays`, except a generator of
+        `nfldb.Play` objects is returned. See
+        `nfldb.Query.iter_games` for more details.
+
+        If `fill` is `True`, then the `play_players` attribute of
+        each chunk of `itersize` plays is filled with one additional
+        query before any play in the chunk is yielded.
+        """
+        self._assert_no_aggregate()
+        sorter = self._play_sorter()
+        for plays in self._stream_chunks(types.Play, itersize, sorter=sorter):
+            if fill:
+                _fill_play_players(self._db, plays)
+            for play in plays:
+                yield play
+
+    def iter_play_players(self, itersize=2000):
+        """
+        Like `nfldb.Query.as_play_players`, except a generator of
+        `nfldb.PlayPlayer` objects is returned. See
+        `nfldb.Query.iter_games` for more details.
+        """
+        self._assert_no_aggregate()
+        for pp in self._stream(types.PlayPlayer, itersize):
+            yield pp
 
+    def iter_players(self, itersize=2000):
+        """
+        Like `nfldb.Query.as_players`, except a generator of
+        `nfldb.Player` objects is returned. See
+        `nfldb.Query.iter_games` for more details.
+        """
+        self._assert_no_aggregate()
+        for player in self._stream(types.Player, itersize):
+            yield player
+
+    def iter_aggregate(self, itersize=2000, group_by=None):
+        """
+        Like `nfldb.Query.as_aggregate`, except a generator of
+        aggregated `nfldb.PlayPlayer` objects is returned. See
+        `nfldb.Query.iter_games` for more details.
+        """
+        with Tx(self._db, name=_stream_name()) as cur:
             init = AggPP.from_row_dict
-            cur.execute(q)
-            for row in cur.fetchall():
-                results.append(init(self._db, row))
-        return results
+            cur.execute(self._make_aggregate_query(cur, group_by=group_by))
+            for rows in _fetch_chunks(cur, itersize):
+                for row in rows:
+                    yield init(self._db, row)
+
+    def _stream(self, entity, itersize, sorter=None):
+        for objs in self._stream_chunks(entity, itersize, sorter=sorter):
+            for obj in objs:
+                yield obj
+
+    def _stream_chunks(self, entity, itersize, sorter=None):
+        """
+        A generator that yields lists of at most `itersize` `entity`
+        objects, which are fetched from a server-side cursor.
+        """
+        init = entity.from_row_tuple
+        with Tx(self._db, name=_stream_name(), factory=tuple_cursor) as cur:
+            cur.execute(self._make_join_query(cur, entity, sorter=sorter))
+            for rows in _fetch_chunks(cur, itersize):
+                yield [init(self._db, row) for row in rows]
 
     def _entities(self):
         """
@@ -1031,6 +1718,530 @@ class Query (Condition):
                 aliases=aliases, aggregate=aggregate)
 
 
+def _projection(entity, fields):
+    """
+    Returns a function that creates `entity` objects from row tuples
+    and the list of SQL expressions to select for the `fields`
+    argument of an `as_*` method. If `fields` is `None`, then every
+    field is selected and the list is `None`. Otherwise, the objects
+    created by the function load the rest of their fields together.
+    """
+    if fields is None:
+        return entity.from_row_tuple, None
+    for f in fields:
+        assert f in entity.sql_fields(), \
+            '"%s" is not a field of %s.' % (f, entity.__name__)
+    pkey = entity._sql_tables['primary']
+    fields = pkey + [f for f in fields if f not in pkey]
+    partial = sql._Partial(fields)
+
+    def init(db, row):
+        return entity._from_partial_row(db, fields, row, partial=partial)
+    return init, entity._sql_select_fields(fields=fields)
+
+
+def _fans_out(entity, entities):
+    """
+    Returns `True` if joining `entity` with the set of `entities`
+    results in more than one row per `entity`, which means that the
+    query needs a `GROUP BY` on the primary key of `entity`.
+    """
+    return any(entity._sql_relation_distance(to) > 0 for to in entities)
+
+
+def _agg_group_key(key):
+    """
+    Returns the SQL expression for a `group_by` key of
+    `nfldb.Query.as_aggregate`. An assertion error is raised if `key`
+    is not a valid key.
+    """
+    if key in ('gsis_id', 'drive_id', 'play_id', 'team'):
+        return types.PlayPlayer._sql_field(key)
+    elif key == 'opponent':
+        return '''
+            CASE WHEN play_player.team = game.home_team
+                 THEN game.away_team ELSE game.home_team END
+        '''.strip()
+    assert key in types.Game.sql_fields(), \
+        "The key '%s' cannot be used to group aggregate statistics." % key
+    return types.Game._sql_field(key)
+
+
+_stable_game_fields = ('gsis_id', 'season_year', 'season_type', 'week')
+"""
+The fields of `nfldb.Game` that never change once a game is scheduled.
+(See `nfldb.Query._game_scope`.)
+"""
+
+
+_player_game_fields = ('gsis_id', 'player_id', 'team')
+"""
+The fields of `nfldb.PlayPlayer` that are columns of the `player_game`
+table, other than the statistical categories.
+"""
+
+
+def _uses_player_game(query, group_by):
+    """
+    Returns `True` if the aggregate statistics of `query` grouped by
+    the keys in `group_by` can be summed from the `player_game` table
+    instead of the `play_player` table. This is only possible when
+    every criterion is on a column that `player_game` has (or can be
+    joined with) and the results aren't grouped by drive or play.
+
+    Aggregate criteria are summed from the columns they name, so they
+    can't name a derived field like `offense_yds`, which is stored in
+    `play_player` but not in `player_game`.
+    """
+    def covered(cond):
+        if isinstance(cond, Query):
+            return all(covered(c) for c in cond._andalso + cond._orelse)
+        elif cond.entity in (types.Game, types.Player):
+            return True
+        return cond.entity is types.PlayPlayer \
+            and cond.column in _player_game_fields
+
+    derived = types.PlayPlayer._sql_tables['derived']
+    if any(k in ('drive_id', 'play_id') for k in group_by):
+        return False
+    if any(c.column in derived
+           for c in query._agg_andalso + query._agg_orelse):
+        return False
+    return covered(query)
+
+
+def _array_field(entity, field):
+    """
+    Returns a SQL expression for `field` of `entity` whose values can
+    be put in a NumPy array without creating any Python objects other
+    than numbers, along with the NumPy dtype of the array. The dtype
+    is `None` when it should be inferred from the values.
+
+    This is used by `nfldb.Query.as_arrays`.
+    """
+    sql = entity._sql_field(field)
+    kind = _array_kinds.get((entity, field))
+    if kind is None:
+        cat = types._player_categories.get(field) \
+            or types._play_categories.get(field)
+        if cat is not None:
+            return sql, 'float32' if cat.is_real else 'int16'
+        if field in types.PlayPlayer._sql_tables['derived']:
+            return sql, 'int16'
+        return sql, None
+    elif kind == 'clock':
+        phase = _sql_enum_code(types.Enums.game_phase, '(%s).phase' % sql)
+        return ('CAST(%s * %d + (%s).elapsed AS integer)'
+                % (phase, types.Clock._phase_max + 1, sql), 'int32')
+    elif kind == 'field':
+        return '(%s).pos' % sql, 'int16'
+    elif kind == 'period':
+        return '(%s).elapsed' % sql, 'int16'
+    elif kind == 'time':
+        return ('CAST(EXTRACT(EPOCH FROM %s) * 1000000 AS bigint)' % sql,
+                'datetime64[us]')
+    else:
+        return _sql_enum_code(kind, sql), 'int16'
+
+
+def _sql_enum_code(enum, sql):
+    """
+    Returns a SQL expression that evaluates to the `value` of the
+    member of `enum` that the SQL expression `sql` evaluates to, or
+    `0` if it is `NULL`.
+    """
+    whens = ' '.join("WHEN '%s' THEN %d" % (e.name, e.value) for e in enum)
+    return 'CAST(CASE %s %s ELSE 0 END AS smallint)' % (sql, whens)
+
+
+_array_kinds = {
+    (types.Game, 'start_time'): 'time',
+    (types.Game, 'day_of_week'): types.Enums.game_day,
+    (types.Game, 'season_type'): types.Enums.season_phase,
+    (types.Game, 'time_inserted'): 'time',
+    (types.Game, 'time_updated'): 'time',
+    (types.Drive, 'start_field'): 'field',
+    (types.Drive, 'start_time'): 'clock',
+    (types.Drive, 'end_field'): 'field',
+    (types.Drive, 'end_time'): 'clock',
+    (types.Drive, 'pos_time'): 'period',
+    (types.Drive, 'time_inserted'): 'time',
+    (types.Drive, 'time_updated'): 'time',
+    (types.Play, 'time'): 'clock',
+    (types.Play, 'yardline'): 'field',
+    (types.Play, 'time_inserted'): 'time',
+    (types.Play, 'time_updated'): 'time',
+    (types.Player, 'position'): types.Enums.player_pos,
+    (types.Player, 'status'): types.Enums.player_status,
+}
+"""
+Maps entity fields whose SQL types have no direct NumPy counterpart
+to how they are converted by `nfldb.query._array_field`.
+"""
+
+
+def _infer_dtype(values):
+    """
+    Returns the NumPy dtype for a column of Python `values` whose SQL
+    type isn't known ahead of time.
+    """
+    kinds = set(type(v) for v in values if v is not None)
+    if len(kinds) == 0:
+        return object
+    elif kinds == set([bool]):
+        return 'bool'
+    elif kinds.issubset(set([int, long])):
+        return 'int64'
+    elif kinds.issubset(set([int, long, float])):
+        return 'float64'
+    return object
+
+
+def _to_array(numpy, values, dtype):
+    """
+    Returns a NumPy array of `dtype` with `values`. Numeric columns
+    with `NULL` values are promoted to `float64` (or `NaT` is used for
+    timestamps).
+    """
+    if dtype is object:
+        a = numpy.empty(len(values), dtype=object)
+        a[:] = values
+        return a
+    if dtype.startswith('datetime64'):
+        return numpy.array([-2**63 if v is None else v for v in values],
+                           dtype='int64').view(dtype)
+    if None in values:
+        return numpy.array([numpy.nan if v is None else v for v in values],
+                           dtype='float64')
+    return numpy.array(values, dtype=dtype)
+
+
+_stmt_ids = itertools.count(1)
+"""Generates unique names for prepared statements."""
+
+_sql_params = re.compile(r"('(?:[^']|'')*')|\$\(([A-Za-z_][A-Za-z0-9_]*)\)")
+
+
+class CompiledQuery (object):
+    """
+    A query compiled by `nfldb.Query.compile` that can be executed many
+    times with different values bound to its `nfldb.Param`
+    placeholders. It is safe to use from multiple threads.
+
+    The query is prepared with PostgreSQL's `PREPARE` the first time it
+    is executed on each connection. Prepared statements last as long as
+    the connection, so this will not work with a connection pooler that
+    shares server connections between clients (e.g., PgBouncer in
+    transaction mode).
+    """
+    def __init__(self, query, entity, q, fill=False):
+        self._query = query
+        """The `nfldb.Query` that was compiled."""
+
+        self.entity = entity
+        """The type of the objects returned."""
+
+        self.name = 'nfldb_stmt_%d' % next(_stmt_ids)
+        """The name of the prepared statement."""
+
+        self.params = []
+        """
+        The names of the placeholders in this query, in the order of
+        the corresponding positional parameters in `sql`.
+        """
+
+        self.sql = _sql_params.sub(self.__number_param, q)
+        """The SQL of the prepared statement."""
+
+        assert 'db' not in self.params, \
+            '"db" cannot be used as the name of a parameter.'
+        self.__fill = fill
+        self.__lock = threading.Lock()
+        self.__prepared = weakref.WeakKeyDictionary()
+
+    def __number_param(self, m):
+        if m.group(1) is not None:
+            return m.group(1)
+        if m.group(2) not in self.params:
+            self.params.append(m.group(2))
+        return '$%d' % (self.params.index(m.group(2)) + 1)
+
+    def execute(self, db=None, **bindings):
+        """
+        Executes the query with a value for every placeholder given as
+        a keyword argument, and returns the results as a list.
+
+        By default, the query is executed on the connection of the
+        `nfldb.Query` that was compiled. A different connection to the
+        same database may be given with `db`.
+        """
+        if db is None:
+            db = self._query._db
+        missing = set(self.params).difference(bindings)
+        unknown = set(bindings).difference(self.params)
+        assert len(missing) == 0, \
+            'No values given for parameters: %s' % ', '.join(missing)
+        assert len(unknown) == 0, \
+            'Unknown parameters: %s' % ', '.join(unknown)
+
+        by_dict = self.entity in (types.Player, AggPP)
+        if by_dict:
+            factory, init = None, self.entity.from_row_dict
+        else:
+            factory, init = tuple_cursor, self.entity.from_row_tuple
+
+        args = ''
+        if len(self.params) > 0:
+            args = ' (%s)' % ', '.join(['%s'] * len(self.params))
+        results = []
+        with Tx(db, factory=factory) as cursor:
+            self._prepare(cursor)
+            cursor.execute('EXECUTE %s%s' % (self.name, args),
+                           [bindings[name] for name in self.params])
+            for row in cursor.fetchall():
+                results.append(init(db, row))
+            if self.__fill:
+                _fill_play_players(db, results)
+        return results
+
+    def deallocate(self, db=None):
+        """
+        Frees the prepared statement on the connection `db`, which
+        defaults to the connection of the `nfldb.Query` that was
+        compiled. It will be prepared again if it is executed on
+        `db` later.
+        """
+        if db is None:
+            db = self._query._db
+        with self.__lock:
+            if self.__prepared.pop(db, None) is not None:
+                with Tx(db) as cursor:
+                    cursor.execute('DEALLOCATE %s' % self.name)
+
+    def _prepare(self, cursor):
+        """
+        Prepares the statement on the connection of `cursor`, unless
+        it has already been prepared there.
+        """
+        conn = cursor.connection
+        with self.__lock:
+            if conn not in self.__prepared:
+                cursor.execute('PREPARE %s AS %s' % (self.name, self.sql))
+                self.__prepared[conn] = True
+
+
+class Explanation (object):
+    """
+    How PostgreSQL runs a query, as returned by `nfldb.Query.explain`.
+    Printing it shows the SQL and a summary of the plan.
+    """
+    def __init__(self, sql, plan, fanout, analyzed):
+        self.sql = sql
+        """The exact SQL that is run for the query."""
+
+        self.plan = plan
+        """
+        The plan chosen by PostgreSQL, as a dictionary decoded from
+        the JSON output of `EXPLAIN`. The root node of the plan is in
+        the `Plan` key.
+        """
+
+        self.fanout = fanout
+        """
+        Whether criteria on more specific entities (e.g., plays when
+        searching for games) required a `GROUP BY` on the primary key
+        of the entity, since the join returns many rows per entity.
+        """
+
+        self.analyzed = analyzed
+        """
+        Whether the query was run, in which case `plan` includes
+        timings, row counts and buffer usage.
+        """
+
+    @property
+    def nodes(self):
+        """A list of every node in the plan, from the root down."""
+        nodes, stack = [], [self.plan['Plan']]
+        while len(stack) > 0:
+            node = stack.pop()
+            nodes.append(node)
+            stack.extend(reversed(node.get('Plans', [])))
+        return nodes
+
+    @property
+    def indexes(self):
+        """A sorted list of the names of the indexes used by the plan."""
+        return sorted(set(n['Index Name'] for n in self.nodes
+                          if 'Index Name' in n))
+
+    @property
+    def seq_scans(self):
+        """A sorted list of the tables that are scanned sequentially."""
+        return sorted(set(n['Relation Name'] for n in self.nodes
+                          if n['Node Type'] == 'Seq Scan'))
+
+    @property
+    def cost(self):
+        """The total cost estimated by the planner."""
+        return self.plan['Plan']['Total Cost']
+
+    @property
+    def time(self):
+        """
+        The time it took to run the query in milliseconds, or `None` if
+        the query was not analyzed.
+        """
+        # PostgreSQL 9.4 renamed "Total Runtime" to "Execution Time".
+        return self.plan.get('Execution Time', self.plan.get('Total Runtime'))
+
+    def __str__(self):
+        lines = [self.sql.strip(), '']
+        lines.append('Estimated cost: %s' % self.cost)
+        if self.time is not None:
+            lines.append('Execution time: %s ms' % self.time)
+        lines.append('Indexes: %s' % (', '.join(self.indexes) or 'none'))
+        lines.append('Sequential scans: %s'
+                     % (', '.join(self.seq_scans) or 'none'))
+        lines.append('GROUP BY fan-out: %s' % ('yes' if self.fanout else 'no'))
+        for node in self.nodes:
+            lines.append(_explain_node(node))
+        return '\n'.join(lines)
+
+
+def _explain_node(node):
+    """Returns a one line summary of a node in a JSON query plan."""
+    s = node['Node Type']
+    for key in ('Relation Name', 'Index Name'):
+        if key in node:
+            s += ' %s=%s' % (key.split()[0].lower(), node[key])
+    s += ' (cost=%s rows=%s' % (node['Total Cost'], node['Plan Rows'])
+    if 'Actual Rows' in node:
+        s += ' actual_rows=%s actual_time=%s' \
+             % (node['Actual Rows'], node['Actual Total Time'])
+    return s + ')'
+
+
+class AggTeam (object):
+    """
+    The statistics of a team summed over the play players and plays
+    matching a `nfldb.Query`. These are returned by
+    `nfldb.Query.as_team_aggregate`.
+
+    Every statistical category (both player and play categories) and
+    derived field of `nfldb.PlayPlayer` is an attribute. Derived fields
+    are computed for the team as a whole, so that a completed pass
+    counts once: `offense_yds`, `offense_tds` and `points` don't
+    include receiving statistics, which duplicate the passing
+    statistics of the same play.
+    """
+    __slots__ = ['_db', 'team', 'gsis_id'] \
+        + types._player_categories.keys() \
+        + types.PlayPlayer._sql_tables['derived'] \
+        + types._play_categories.keys()
+
+    _derived_combined = dict(
+        (k, [f for f in fields if not f.startswith('receiving_')])
+        for k, fields in types.PlayPlayer._derived_combined.items())
+
+    _point_values = [(f, pval) for f, pval in types.PlayPlayer._point_values
+                     if not f.startswith('receiving_')]
+
+    @classmethod
+    def _sql_sum(cls, name):
+        """
+        Returns the SQL expression that sums the player statistic
+        `name` over every play player of a team.
+        """
+        if name in cls._derived_combined:
+            fields = cls._derived_combined[name]
+            return ' + '.join(AggPP._sql_field(f) for f in fields)
+        elif name == 'points':
+            return ' + '.join('(%s * %d)' % (AggPP._sql_field(f), pval)
+                              for f, pval in cls._point_values)
+        else:
+            return AggPP._sql_field(name)
+
+    @classmethod
+    def _sql_field(cls, name, aliases=None):
+        # Results are sorted by the columns of the outer query, which
+        # are named after the fields.
+        if name.startswith('_') or name not in cls.__slots__:
+            raise KeyError(name)
+        return name
+
+    @classmethod
+    def _sorter(cls, exprs, limit, keys):
+        """
+        Returns the SQL `ORDER BY ... LIMIT` clause for team results,
+        where `keys` are always sorted on last.
+        """
+        sorter = Sorter(cls, exprs)
+        assert len(sorter.foreign_exprs()) == 0, \
+            'team results can only be sorted by their own fields'
+        order = sorter.sql().strip()
+        order += ', ' if len(order) > 0 else 'ORDER BY '
+        order += ', '.join(keys)
+        if limit:
+            order += ' LIMIT %d' % int(limit)
+        return order
+
+    @classmethod
+    def _from_row_dict(cls, db, row):
+        obj = cls(db)
+        for k, v in row.iteritems():
+            setattr(obj, k, v)
+        return obj
+
+    def __init__(self, db):
+        self._db = db
+        self.gsis_id = None
+        """
+        The game of these statistics, or `None` if they are not
+        summed per game.
+        """
+
+        self.team = None
+        """The team abbreviation of these statistics."""
+
+    @property
+    def game(self):
+        """
+        The `nfldb.Game` of these statistics, or `None` if they are
+        not summed per game.
+        """
+        if self.gsis_id is None:
+            return None
+        return types.Game.from_id(self._db, self.gsis_id)
+
+    def __str__(self):
+        if self.gsis_id is None:
+            return self.team
+        return '%s (%s)' % (self.team, self.gsis_id)
+
+
+class AggPP (types.PlayPlayer):
+    """
+    A `nfldb.PlayPlayer` whose statistical fields are summed in SQL.
+    This is used to build and read the results of
+    `nfldb.Query.as_aggregate`.
+    """
+    @classmethod
+    def _sql_field(cls, name, aliases=None):
+
+        if name in cls._derived_combined:
+            fields = cls._derived_combined[name]
+            fields = [cls._sql_field(f, aliases=aliases) for f in fields]
+            return ' + '.join(fields)
+        elif name == 'points':
+            fields = ['(%s * %d)' % (cls._sql_field(f, aliases=aliases), pval)
+                      for f, pval in cls._point_values]
+            return ' + '.join(fields)
+        else:
+            sql = super(AggPP, cls)._sql_field(name, aliases=aliases)
+            return 'SUM(%s)' % sql
+
+
 class Sorter (object):
     """
     A representation of sort, order and limit criteria that can
@@ -1042,10 +2253,11 @@ class Sorter (object):
         assert order in ('ASC', 'DESC'), 'order must be "asc" or "desc"'
         return order
 
-    def __init__(self, default_entity, exprs=None, limit=None):
+    def __init__(self, default_entity, exprs=None, limit=None, after=None):
         self.default_entity = default_entity
         self.entities = set([default_entity])
         self.limit = int(limit or 0)
+        self.after = after
         self.exprs = []
         if isinstance(exprs, strtype) or isinstance(exprs, tuple):
             self.add_exprs(exprs)
@@ -1058,22 +2270,65 @@ class Sorter (object):
             self.entities.add(e[0])
             self.exprs.append(e)
 
+    def add_unique_exprs(self, *exprs):
+        """
+        Like `add_exprs`, except expressions for fields that are
+        already sorted on are skipped.
+        """
+        for e in exprs:
+            e = self.normal_expr(e)
+            if not any(e[0:2] == x[0:2] for x in self.exprs):
+                self.add_exprs(e)
+
     def normal_expr(self, e):
         if isinstance(e, strtype):
-            return (self.default_entity, e, 'DESC')
+            return self._field_expr(e, 'DESC')
         elif isinstance(e, tuple):
-            assert len(e) == 2, 'invalid sort expression'
-            return (self.default_entity, e[0], self._normalize_order(e[1]))
-            # elif len(e) == 3:
-                # assert e[0] in _ENTITIES, 'invalid entity: %s' % e[0]
-                # self.entities.add(_ENTITIES[e[0]])
-                # return (_ENTITIES[e[0]], e[1], self._normalize_order(e[2]))
+            if len(e) == 2:
+                return self._field_expr(e[0], self._normalize_order(e[1]))
+            elif len(e) == 3:
+                assert e[0] in _ENTITIES, 'invalid entity: %s' % e[0]
+                return (_ENTITIES[e[0]], e[1], self._normalize_order(e[2]))
+            else:
+                raise ValueError('invalid sort expression: %s' % (e,))
         else:
             raise ValueError(
                 "Sortby expressions must be strings "
-                "or two-element tuples like (column, order). "
+                "or tuples like (column, order) or (table, column, order). "
                 "Got value '%s' with type '%s'." % (e, type(e)))
 
+    def _field_expr(self, field, order):
+        """
+        Returns a normalized sort expression for `field`, which may be
+        prefixed with the name of the table of another entity (e.g.,
+        `game.start_time`).
+        """
+        if '.' in field:
+            table, field = field.split('.', 1)
+            assert table in _ENTITIES, 'invalid entity: %s' % table
+            return (_ENTITIES[table], field, order)
+        return (self.default_entity, field, order)
+
+    def foreign_exprs(self):
+        """
+        Returns the sort expressions for fields of entities other than
+        the default entity.
+        """
+        return [e for e in self.exprs if e[0] is not self.default_entity]
+
+    def assert_joinable(self):
+        """
+        Raises a `ValueError` if any sort expression is for a field of
+        an entity that has more than one row for each row of the
+        default entity (or is unrelated to it).
+        """
+        for ent, field, _ in self.foreign_exprs():
+            dist = self.default_entity._sql_relation_distance(ent)
+            if dist is None or dist > 0:
+                raise ValueError(
+                    'Cannot sort %s by %s, which is a field of %s.'
+                    % (self.default_entity.__name__, field, ent.__name__))
+
     def sql(self, aliases=None):
         """
         Return a SQL `ORDER BY ... LIMIT` expression corresponding to
@@ -1100,3 +2355,41 @@ class Sorter (object):
         if self.limit > 0:
             s += ' LIMIT %d' % self.limit
         return ' ' + s + ' '
+
+    def sql_after(self, cursor, aliases=None):
+        """
+        Returns a SQL condition that is true for rows that are sorted
+        after `self.after`, which is either a result object or a tuple
+        of values for each sort expression. If `self.after` is `None`,
+        then `None` is returned.
+        """
+        if self.after is None:
+            return None
+        vals = self.after
+        if not isinstance(vals, tuple):
+            assert len(self.foreign_exprs()) == 0, \
+                'a tuple of values must be used to page after results ' \
+                'sorted by fields of other entities'
+            vals = tuple(getattr(vals, field) for _, field, _ in self.exprs)
+        assert len(vals) == len(self.exprs), \
+            'expected %d values to page after, but got %d' \
+            % (len(self.exprs), len(vals))
+
+        fields = [ent._sql_field(field, aliases=aliases)
+                  for ent, field, _ in self.exprs]
+        vals = [_sql_value(cursor, v) for v in vals]
+        orders = set(order for _, _, order in self.exprs)
+        if len(orders) == 1:
+            # A row comparison can be answered with a single index scan.
+            op = '>' if 'ASC' in orders else '<'
+            return '(%s) %s (%s)' % (', '.join(fields), op, ', '.join(vals))
+
+        # Otherwise, a row is after if it is equal on a prefix of the
+        # sort fields and after on the next one.
+        disjuncts = []
+        for i, (_, _, order) in enumerate(self.exprs):
+            conj = ['%s = %s' % (f, v) for f, v in zip(fields[:i], vals[:i])]
+            op = '>' if order == 'ASC' else '<'
+            conj.append('%s %s %s' % (fields[i], op, vals[i]))
+            disjuncts.append('(%s)' % ' AND '.join(conj))
+        return '(%s)' % ' OR '.join(disjuncts)
@@ -1,6 +1,28 @@
 from __future__ import absolute_import, division, print_function
 
-from nfldb.db import _upsert
+from nfldb.db import _big_upsert, _mogrify
+
+
+def _is_set(obj, slot):
+    """Returns `True` if the slot `slot` of `obj` has a value."""
+    try:
+        object.__getattribute__(obj, slot)
+        return True
+    except AttributeError:
+        return False
+
+
+class _Partial (object):
+    """
+    The fields selected for a list of entities that only have some of
+    their fields (see `nfldb.Entity._from_partial_row`), along with
+    the entities themselves, so that they can all be loaded at once.
+    """
+    __slots__ = ['fields', 'objs']
+
+    def __init__(self, fields):
+        self.fields = frozenset(fields)
+        self.objs = []
 
 
 class Entity (object):
@@ -117,6 +139,81 @@ class Entity (object):
             seta(obj, field, t[i])
         return obj
 
+    @classmethod
+    def _from_partial_row(cls, db, fields, t, partial=None):
+        """
+        Like `nfldb.Entity.from_row_tuple`, except the tuple `t` only
+        has values for the list of `fields`, which must include the
+        primary key. The remaining fields are fetched from the database
+        the first time one of them is used.
+
+        Entities created with the same `nfldb.sql._Partial` object
+        `partial` are all fetched together, with a single query.
+        """
+        if not hasattr(cls, '_cached_init_fields'):
+            # Fields that the constructor sets must be unset again so
+            # that using them is noticed.
+            empty = cls(None)
+            cls._cached_init_fields = [f for f in cls.sql_fields()
+                                       if _is_set(empty, f)]
+        obj = cls(db)
+        for f in cls._cached_init_fields:
+            if f not in fields:
+                delattr(obj, f)
+        seta = setattr
+        for i, field in enumerate(fields):
+            seta(obj, field, t[i])
+        if partial is None:
+            partial = _Partial(fields)
+        obj._partial = partial
+        partial.objs.append(obj)
+        return obj
+
+    def __getattr__(self, k):
+        if self._load_partial(k):
+            return getattr(self, k)
+        raise AttributeError(k)
+
+    def _load_partial(self, k):
+        """
+        If `self` has only some of its fields (see
+        `nfldb.Entity._from_partial_row`) and `k` is one of the others,
+        then every other field of `self` and of every entity created
+        along with it is fetched from the database and `True` is
+        returned. Otherwise, `False` is returned.
+
+        This is meant to be called from `__getattr__`, so it returns
+        right away for entities that have all of their fields.
+        """
+        # An unset `_partial` would call `__getattr__` again.
+        try:
+            partial = object.__getattribute__(self, '_partial')
+        except AttributeError:
+            return False
+        if partial is None or k in partial.fields \
+                or k not in self.sql_fields():
+            return False
+
+        from nfldb.query import _entities_by_ids
+        pkey = self._sql_tables['primary']
+
+        def key(obj):
+            return tuple(getattr(obj, f) for f in pkey)
+        objs = [obj for obj in partial.objs if obj._partial is partial]
+        del partial.objs[:]
+        found = _entities_by_ids(self._db, self.__class__,
+                                 *[key(obj) for obj in objs], fill=False)
+        found = dict((key(obj), obj) for obj in found)
+        rest = [f for f in self.sql_fields() if f not in partial.fields]
+        for obj in objs:
+            full = found.get(key(obj))
+            if full is None:
+                continue
+            obj._partial = None
+            for f in rest:
+                setattr(obj, f, getattr(full, f))
+        return self._partial is None
+
     @classmethod
     def _sql_from(cls, aliases=None):
         """
@@ -155,9 +252,9 @@ class Entity (object):
         opaque to the resulting query, but this also disallows
         selecting columns of the same name from multiple tables.
         """
-        if wrap is None:
-            wrap = lambda x: x
-        sql = lambda f: wrap(cls._sql_field(f, aliases=aliases))
+        def sql(f):
+            expr = cls._sql_field(f, aliases=aliases)
+            return expr if wrap is None else wrap(expr)
         entity_prefix = cls._sql_primary_table()
         return ['%s AS %s_%s' % (sql(f), entity_prefix, f) for f in fields]
 
@@ -352,8 +449,25 @@ class Entity (object):
         `nfldb.Entity._sql_tables`. The data is drawn from
         `self`.
         """
-        for table, prim, vals in self._rows:
-            _upsert(cursor, table, vals, prim)
+        self._save_all(cursor, [self])
+
+    @classmethod
+    def _save_all(cls, cursor, objs):
+        """
+        Like `nfldb.Entity._save`, except every entity in `objs` is
+        saved with one batched upsert per managed table. Subclasses
+        that need to save related entities should override this
+        method (rather than `nfldb.Entity._save`) so that the related
+        entities are batched too.
+        """
+        prim = cls._sql_tables['primary']
+        rows = {}
+        for obj in objs:
+            for table, _, vals in obj._rows:
+                rows.setdefault(table, []).append(vals)
+        for table, _ in cls._sql_tables['tables']:
+            if table in rows:
+                _big_upsert(cursor, table, rows[table], prim)
 
     @property
     def _rows(self):
@@ -377,6 +491,29 @@ def _as_row(fields, obj):
     return [(f, getattr(obj, f, None)) for f in fields if f not in exclude]
 
 
+def _delete_stale(cursor, table, parent_fields, child_field,
+                  parents, children):
+    """
+    Deletes every row in `table` that belongs to one of `parents` but
+    isn't one of `children`, in a single query.
+
+    `parents` should be a list of tuples of values corresponding to
+    the columns in `parent_fields`. `children` should be a list of
+    tuples of values corresponding to the columns in `parent_fields`
+    followed by `child_field`.
+    """
+    if len(parents) == 0:
+        return
+    parent_cols = ', '.join(parent_fields)
+    q = 'DELETE FROM %s WHERE (%s) IN (VALUES %s)' \
+        % (table, parent_cols, ', '.join(_mogrify(cursor, p) for p in parents))
+    if len(children) > 0:
+        q += ' AND (%s, %s) NOT IN (VALUES %s)' \
+             % (parent_cols, child_field,
+                ', '.join(_mogrify(cursor, c) for c in children))
+    cursor.execute(q)
+
+
 def ands(*exprs):
     anded = ' AND '.join('(%s)' % e for e in exprs if e)
     return 'true' if len(anded) == 0 else anded
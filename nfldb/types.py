@@ -15,7 +15,7 @@ from psycopg2.extensions import AsIs, ISQLQuote
 import pytz
 
 import nfldb.category
-from nfldb.db import now, Tx
+from nfldb.db import _refresh_player_game, now, Tx
 import nfldb.sql as sql
 import nfldb.team
 
@@ -146,6 +146,7 @@ def _fill(db, fill_with, to_fill, attr):
     to the `attr` of `to_fill`.
     """
     pk = fill_with._sql_tables['primary']
+
     def pkval(entobj):
         return tuple(getattr(entobj, k) for k in pk)
 
@@ -220,6 +221,13 @@ class _Enum (enum.Enum):
             return AsIs("'%s'" % self.name)
         return None
 
+    def _pg_text(self):
+        """
+        Returns the PostgreSQL text representation of this enum value.
+        This is used when sending data with `COPY`.
+        """
+        return self.name
+
     def __str__(self):
         return self.name
 
@@ -502,6 +510,9 @@ class Team (object):
             return AsIs("'%s'" % self.team_id)
         return None
 
+    def _pg_text(self):
+        return self.team_id
+
 
 @_total_ordering
 class FieldPosition (object):
@@ -625,6 +636,15 @@ class FieldPosition (object):
                 return AsIs("ROW(%d)::field_pos" % self._offset)
         return None
 
+    def _pg_text(self):
+        """
+        Returns the PostgreSQL text representation of this field
+        position. This is the inverse of `nfldb.FieldPosition._pg_cast`.
+        """
+        if not self.valid:
+            return None
+        return '(%d)' % self._offset
+
 
 @_total_ordering
 class PossessionTime (object):
@@ -723,6 +743,15 @@ class PossessionTime (object):
                 return AsIs("ROW(%d)::pos_period" % self._seconds)
         return None
 
+    def _pg_text(self):
+        """
+        Returns the PostgreSQL text representation of this possession
+        time. This is the inverse of `nfldb.PossessionTime._pg_cast`.
+        """
+        if not self.valid:
+            return None
+        return '(%d)' % self._seconds
+
 
 @_total_ordering
 class Clock (object):
@@ -880,6 +909,13 @@ class Clock (object):
                         % (self.phase.name, self.elapsed))
         return None
 
+    def _pg_text(self):
+        """
+        Returns the PostgreSQL text representation of this clock. This
+        is the inverse of `nfldb.Clock._pg_cast`.
+        """
+        return '(%s,%d)' % (self.phase.name, self.elapsed)
+
 
 class SQLPlayer (sql.Entity):
     __slots__ = []
@@ -910,7 +946,7 @@ class Player (SQLPlayer):
     data is scraped from NFL.com's team roster pages (which invites
     infrequent uncertainty).
     """
-    __slots__ = SQLPlayer.sql_fields() + ['_db']
+    __slots__ = SQLPlayer.sql_fields() + ['_db', '_partial']
 
     _existing = None
     """
@@ -1001,6 +1037,7 @@ class Player (SQLPlayer):
         you're writing your own SQL queries.)
         """
         self._db = db
+        self._partial = None
 
         self.player_id = None
         """
@@ -1055,15 +1092,19 @@ class Player (SQLPlayer):
         self.status = None
         """The current status of this player as a free-form string."""
 
-    def _save(self, cursor):
+    @classmethod
+    def _save_all(cls, cursor, players):
         if Player._existing is None:
             Player._existing = set()
             cursor.execute('SELECT player_id FROM player')
             for row in cursor.fetchall():
                 Player._existing.add(row['player_id'])
-        if self.player_id not in Player._existing:
-            super(Player, self)._save(cursor)
-            Player._existing.add(self.player_id)
+        new = []
+        for p in players:
+            if p.player_id not in Player._existing:
+                new.append(p)
+                Player._existing.add(p.player_id)
+        super(Player, cls)._save_all(cursor, new)
 
     def __str__(self):
         name = self.full_name if self.full_name else self.gsis_name
@@ -1094,7 +1135,9 @@ class SQLPlayPlayer (sql.Entity):
         'derived': ['offense_yds', 'offense_tds', 'defense_tds', 'points'],
     }
 
-    # These fields are combined using `GREATEST`.
+    # These fields are combined using `GREATEST`. Since schema version 10,
+    # they are stored in `play_player` and `agg_play` by a trigger (see
+    # `nfldb.db._derived_exprs`), so that they can be indexed.
     _derived_combined = {
         'offense_yds': ['passing_yds', 'rushing_yds', 'receiving_yds',
                         'fumbles_rec_yds'],
@@ -1125,14 +1168,9 @@ class SQLPlayPlayer (sql.Entity):
 
     @classmethod
     def _sql_field(cls, name, aliases=None):
-        if name in cls._derived_combined:
-            fields = cls._derived_combined[name]
-            fields = [cls._sql_field(f, aliases=aliases) for f in fields]
-            return 'GREATEST(%s)' % ', '.join(fields)
-        elif name == 'points':
-            fields = ['(%s * %d)' % (cls._sql_field(f, aliases=aliases), pval)
-                      for f, pval in cls._point_values]
-            return 'GREATEST(%s)' % ', '.join(fields)
+        if name in cls._sql_tables['derived']:
+            table = cls._sql_table_alias('play_player', aliases)
+            return sql.qualified_field(table, name)
         else:
             return super(SQLPlayPlayer, cls)._sql_field(name, aliases=aliases)
 
@@ -1159,7 +1197,7 @@ class PlayPlayer (SQLPlayPlayer):
     this class.
     """
     __slots__ = SQLPlayPlayer.sql_fields() \
-        + ['_db', '_play', '_player', '_fields']
+        + ['_db', '_play', '_player', '_fields', '_partial']
 
     # Document instance variables for derived SQL fields.
     # We hide them from the public interface, but make the doco
@@ -1251,6 +1289,7 @@ class PlayPlayer (SQLPlayPlayer):
         you're writing your own SQL queries.)
         """
         self._db = db
+        self._partial = None
         self._play = None
         self._player = None
         self._fields = None
@@ -1353,10 +1392,11 @@ class PlayPlayer (SQLPlayPlayer):
                 return Enums.player_pos[pos]
         return Enums.player_pos.UNK
 
-    def _save(self, cursor):
-        if self._player is not None:
-            self._player._save(cursor)
-        super(PlayPlayer, self)._save(cursor)
+    @classmethod
+    def _save_all(cls, cursor, play_players):
+        Player._save_all(cursor, [pp._player for pp in play_players
+                                  if pp._player is not None])
+        super(PlayPlayer, cls)._save_all(cursor, play_players)
 
     def _add(self, b):
         """
@@ -1420,6 +1460,8 @@ class PlayPlayer (SQLPlayPlayer):
         return repr(d)
 
     def __getattr__(self, k):
+        if self._load_partial(k):
+            return getattr(self, k)
         if k in PlayPlayer.__slots__:
             return 0
         raise AttributeError(k)
@@ -1443,17 +1485,13 @@ class SQLPlay (sql.Entity):
 
     @classmethod
     def _sql_field(cls, name, aliases=None):
-        if name in PlayPlayer._derived_combined:
-            fields = [cls._sql_field(f, aliases=aliases)
-                      for f in PlayPlayer._derived_combined[name]]
-            return 'GREATEST(%s)' % ', '.join(fields)
-        elif name == 'points':
-            fields = ['(%s * %d)' % (cls._sql_field(f, aliases=aliases), pval)
-                      for f, pval in PlayPlayer._point_values]
-            return 'GREATEST(%s)' % ', '.join(fields)
+        # Derived fields are stored by triggers since schema version 10.
+        if name in PlayPlayer._sql_tables['derived']:
+            table = cls._sql_table_alias('agg_play', aliases)
+            return sql.qualified_field(table, name)
         elif name == 'game_date':
-            gsis_id = cls._sql_field('gsis_id', aliases=aliases)
-            return 'SUBSTRING(%s from 1 for 8)' % gsis_id
+            table = cls._sql_table_alias('play', aliases)
+            return sql.qualified_field(table, name)
         else:
             return super(SQLPlay, cls)._sql_field(name, aliases=aliases)
 
@@ -1493,7 +1531,8 @@ class Play (SQLPlay):
     wiki page. Each statistical field is an instance attribute in
     this class.
     """
-    __slots__ = SQLPlay.sql_fields() + ['_db', '_drive', '_play_players']
+    __slots__ = SQLPlay.sql_fields() \
+        + ['_db', '_drive', '_play_players', '_partial']
 
     # Document instance variables for derived SQL fields.
     # We hide them from the public interface, but make the doco
@@ -1610,6 +1649,7 @@ class Play (SQLPlay):
         writing your own SQL queries.)
         """
         self._db = db
+        self._partial = None
         self._drive = None
         self._play_players = None
 
@@ -1744,18 +1784,19 @@ class Play (SQLPlay):
             return (s[0], s[1] - 1)
         return s
 
-    def _save(self, cursor):
-        super(Play, self)._save(cursor)
+    @classmethod
+    def _save_all(cls, cursor, plays):
+        super(Play, cls)._save_all(cursor, plays)
 
         # Remove any "play players" that are stale.
-        cursor.execute('''
-            DELETE FROM play_player
-            WHERE gsis_id = %s AND drive_id = %s AND play_id = %s
-                  AND NOT (player_id = ANY (%s))
-        ''', (self.gsis_id, self.drive_id, self.play_id,
-              [p.player_id for p in (self._play_players or [])]))
-        for pp in (self._play_players or []):
-            pp._save(cursor)
+        pps = [pp for p in plays for pp in (p._play_players or [])]
+        sql._delete_stale(
+            cursor, 'play_player', ['gsis_id', 'drive_id', 'play_id'],
+            'player_id',
+            [(p.gsis_id, p.drive_id, p.play_id) for p in plays],
+            [(pp.gsis_id, pp.drive_id, pp.play_id, pp.player_id)
+             for pp in pps])
+        PlayPlayer._save_all(cursor, pps)
 
     def __str__(self):
         if self.down:
@@ -1770,6 +1811,8 @@ class Play (SQLPlay):
             return '(%s) %s' % (self.time.phase, self.description)
 
     def __getattr__(self, k):
+        if self._load_partial(k):
+            return getattr(self, k)
         if k in Play.__slots__:
             return 0
         raise AttributeError(k)
@@ -1803,7 +1846,7 @@ class Drive (SQLDrive):
     corresponds to at least one play, but if the game is active, there
     exist valid ephemeral states where a drive has no plays.
     """
-    __slots__ = SQLDrive.sql_fields() + ['_db', '_game', '_plays']
+    __slots__ = SQLDrive.sql_fields() + ['_db', '_game', '_plays', '_partial']
 
     @staticmethod
     def _from_nflgame(db, g, d):
@@ -1884,6 +1927,7 @@ class Drive (SQLDrive):
         writing your own SQL queries.)
         """
         self._db = db
+        self._partial = None
         self._game = None
         self._plays = None
 
@@ -2010,18 +2054,18 @@ class Drive (SQLDrive):
                 pps.append(pp)
         return pps
 
-    def _save(self, cursor):
-        super(Drive, self)._save(cursor)
-        if not self._plays:
-            return
+    @classmethod
+    def _save_all(cls, cursor, drives):
+        super(Drive, cls)._save_all(cursor, drives)
+        drives = [d for d in drives if d._plays]
 
         # Remove any plays that are stale.
-        cursor.execute('''
-            DELETE FROM play
-            WHERE gsis_id = %s AND drive_id = %s AND NOT (play_id = ANY (%s))
-        ''', (self.gsis_id, self.drive_id, [p.play_id for p in self._plays]))
-        for play in (self._plays or []):
-            play._save(cursor)
+        plays = [p for d in drives for p in d._plays]
+        sql._delete_stale(
+            cursor, 'play', ['gsis_id', 'drive_id'], 'play_id',
+            [(d.gsis_id, d.drive_id) for d in drives],
+            [(p.gsis_id, p.drive_id, p.play_id) for p in plays])
+        Play._save_all(cursor, plays)
 
     def __str__(self):
         s = '[%-12s] %-3s from %-6s to %-6s '
@@ -2079,7 +2123,7 @@ class Game (SQLGame):
     corresponds to at least one drive, but if the game is active, there
     exist valid ephemeral states where a game has no drives.
     """
-    __slots__ = SQLGame.sql_fields() + ['_db', '_drives', '_plays']
+    __slots__ = SQLGame.sql_fields() + ['_db', '_drives', '_plays', '_partial']
 
     # Document instance variables for derived SQL fields.
     __pdoc__['Game.winner'] = '''The winner of this game.'''
@@ -2101,7 +2145,8 @@ class Game (SQLGame):
         dbg.week = g.schedule['week']
         dbg.day_of_week = Enums._nflgame_game_day[g.schedule['wday']]
         dbg.season_year = g.schedule['year']
-        dbg.season_type = Enums._nflgame_season_phase[g.schedule['season_type']]
+        season_type = g.schedule['season_type']
+        dbg.season_type = Enums._nflgame_season_phase[season_type]
         dbg.finished = g.game_over()
         dbg.home_team = nfldb.team.standard_team(g.home)
         dbg.home_score = g.score_home
@@ -2170,6 +2215,68 @@ class Game (SQLGame):
             return None
         return games[0]
 
+    @staticmethod
+    def load_full(db, gsis_id):
+        """
+        Given a GSIS identifier (e.g., `2012090500`) as a string,
+        returns a `nfldb.Game` object corresponding to `gsis_id` with
+        all of its drives, plays, play players and players already
+        loaded. Namely, accessing `nfldb.Game.drives`,
+        `nfldb.Drive.plays`, `nfldb.Play.play_players` or
+        `nfldb.PlayPlayer.player` (or any of the back references, like
+        `nfldb.Play.drive`) will never query the database.
+
+        If no corresponding game is found, `None` is returned.
+        """
+        games = Game.load_full_many(db, [gsis_id])
+        if len(games) == 0:
+            return None
+        return games[0]
+
+    @staticmethod
+    def load_full_many(db, gsis_ids):
+        """
+        Like `nfldb.Game.load_full`, except every game in the list of
+        GSIS identifiers `gsis_ids` is loaded. The number of queries
+        used is the same regardless of the number of games.
+
+        Games are returned in the same order as `gsis_ids`. Identifiers
+        without a corresponding game are skipped.
+        """
+        import nfldb.query
+        Query = nfldb.query.Query
+
+        gsis_ids = list(gsis_ids)
+        if len(gsis_ids) == 0:
+            return []
+        games = Query(db).game(gsis_id=gsis_ids).as_games()
+        drives = Query(db).drive(gsis_id=gsis_ids).as_drives()
+        plays = Query(db).play(gsis_id=gsis_ids).as_plays(fill=True)
+        PlayPlayer.fill_players(
+            db, [pp for p in plays for pp in p._play_players])
+
+        by_game = dict((g.gsis_id, g) for g in games)
+        for g in games:
+            g._drives, g._plays = [], []
+        by_drive = {}
+        for d in sorted(drives, key=lambda d: d.drive_id):
+            g = by_game[d.gsis_id]
+            d._game, d._plays = g, []
+            g._drives.append(d)
+            by_drive[(d.gsis_id, d.drive_id)] = d
+        for p in sorted(plays, key=lambda p: (p.time, p.play_id)):
+            # A play may be missing its drive if the game was updated
+            # while it was being loaded.
+            d = by_drive.get((p.gsis_id, p.drive_id))
+            if d is None:
+                continue
+            p._drive = d
+            d._plays.append(p)
+            d._game._plays.append(p)
+            for pp in p._play_players:
+                pp._play = p
+        return [by_game[gid] for gid in gsis_ids if gid in by_game]
+
     def __init__(self, db):
         """
         Creates a new and empty `nfldb.Game` object with the given
@@ -2185,6 +2292,7 @@ class Game (SQLGame):
         """
         The psycopg2 database connection.
         """
+        self._partial = None
         self._drives = None
         self._plays = None
 
@@ -2442,18 +2550,19 @@ class Game (SQLGame):
                 pset.add(pp.player_id)
         return sorted(players)
 
-    def _save(self, cursor):
-        super(Game, self)._save(cursor)
-        if not self._drives:
-            return
+    @classmethod
+    def _save_all(cls, cursor, games):
+        super(Game, cls)._save_all(cursor, games)
+        games = [g for g in games if g._drives]
 
         # Remove any drives that are stale.
-        cursor.execute('''
-            DELETE FROM drive
-            WHERE gsis_id = %s AND NOT (drive_id = ANY (%s))
-        ''', (self.gsis_id, [d.drive_id for d in self._drives]))
-        for drive in (self._drives or []):
-            drive._save(cursor)
+        drives = [d for g in games for d in g._drives]
+        sql._delete_stale(
+            cursor, 'drive', ['gsis_id'], 'drive_id',
+            [(g.gsis_id,) for g in games],
+            [(d.gsis_id, d.drive_id) for d in drives])
+        Drive._save_all(cursor, drives)
+        _refresh_player_game(cursor, [g.gsis_id for g in games])
 
     def __str__(self):
         return '%s %d week %d on %s at %s, %s (%d) at %s (%d)' \
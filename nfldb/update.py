@@ -129,6 +129,32 @@ def run_cmd(*cmd):
             % (' '.join(cmd), e.errno, e.strerror))
 
 
+def upsert_rows(cursor, entities):
+    """
+    Upserts the rows of every entity in `entities` without touching
+    any related entities (unlike `_save`). Rows are batched by table.
+    """
+    upsert = OrderedDict()
+    for ent in entities:
+        for table, prim, vals in ent._rows:
+            pk = [k for k, _ in prim]
+            upsert.setdefault(table, (pk, []))[1].append(vals)
+    for table, (pk, datas) in upsert.items():
+        nfldb.db._big_upsert(cursor, table, datas, pk)
+
+
+def players_digest(cursor):
+    """
+    Returns a digest of the contents of the `player` table, which
+    changes if and only if (with high probability) any player does.
+    """
+    cursor.execute('''
+        SELECT md5(string_agg(player::text, '' ORDER BY player_id)) AS d
+        FROM player
+    ''')
+    return cursor.fetchone()['d']
+
+
 def update_players(cursor, interval):
     db = cursor.connection
     cursor.execute('SELECT last_roster_download FROM meta')
@@ -154,10 +180,13 @@ def update_players(cursor, interval):
     ''')
 
     log('Updating %d players... ' % len(nflgame.players), end='')
-    for p in nflgame.players.itervalues():
-        dbp = nfldb.Player._from_nflgame_player(db, p)
-        for table, prim, vals in dbp._rows:
-            nfldb.db._upsert(cursor, table, vals, prim)
+    before = players_digest(cursor)
+    upsert_rows(cursor, (nfldb.Player._from_nflgame_player(db, p)
+                         for p in nflgame.players.itervalues()))
+    if players_digest(cursor) != before:
+        # Only cached results that depend on player data are invalidated.
+        # (They aren't restricted to any games.)
+        nfldb.db._bump_generation(cursor, [])
     log('done.')
 
     # If the player table is empty at this point, then something is very
@@ -183,12 +212,15 @@ def bulk_insert_game_data(cursor, scheduled, batch_size=5):
     """
     def do():
         log('\tSending batch of data to database.')
+        upsert_rows(cursor, games)
+        del games[:]
         for table in ('drive', 'play', 'play_player'):  # order matters
             if len(bulk.get(table, [])) > 0:
-                nfldb.db._big_insert(cursor, table, bulk[table])
+                nfldb.db._big_copy(cursor, table, bulk[table])
                 bulk[table] = []
 
     bulk = OrderedDict()
+    games = []
     queued = 0
     for gsis_id in scheduled:
         if queued >= batch_size:
@@ -199,8 +231,7 @@ def bulk_insert_game_data(cursor, scheduled, batch_size=5):
         # This updates the schedule data to include all game meta data.
         # We don't use _save here, as that would recursively upsert all
         # drive/play data in the game.
-        for table, prim, vals in g._rows:
-            nfldb.db._upsert(cursor, table, vals, prim)
+        games.append(g)
 
         queued += 1
         for drive in g.drives:
@@ -301,10 +332,9 @@ def update_game_schedules(db):
     log('Updating all game schedules... ', end='')
     with nfldb.Tx(db) as cursor:
         lock_tables(cursor)
-        for gsis_id in nflgame.sched.games:
-            g = game_from_id(cursor, gsis_id)
-            for table, prim, vals in g._rows:
-                nfldb.db._upsert(cursor, table, vals, prim)
+        upsert_rows(cursor, (game_from_id(cursor, gsis_id)
+                             for gsis_id in nflgame.sched.games))
+        nfldb.db._bump_generation(cursor)
     log('done.')
 
 
@@ -315,22 +345,62 @@ def update_current_week_schedule(db):
     phase, year, week = nfldb.current(db)
     log('Updating schedule for (%s, %d, %d)' % (phase, year, week))
     with nfldb.Tx(db) as cursor:
+        games = []
         for gsis_id, info in nflgame.sched.games.iteritems():
             if year == info['year'] and week == info['week'] \
                     and phase == phase_map[info['season_type']]:
-                g = game_from_id(cursor, gsis_id)
-                for table, prim, vals in g._rows:
-                    nfldb.db._upsert(cursor, table, vals, prim)
+                games.append(game_from_id(cursor, gsis_id))
+        games = changed_games(cursor, games)
+        if len(games) > 0:
+            gids = changed_generation(cursor, [g.gsis_id for g in games])
+            upsert_rows(cursor, games)
+            nfldb.db._bump_generation(cursor, gids)
     log('done.')
 
 
+def changed_games(cursor, games):
+    """
+    Returns the games in `games` whose rows differ from the rows
+    already in the database (or that aren't in the database at all).
+    """
+    if len(games) == 0:
+        return []
+    cursor.execute('SELECT * FROM game WHERE gsis_id IN %s',
+                   (tuple(g.gsis_id for g in games),))
+    existing = dict((row['gsis_id'], row) for row in cursor.fetchall())
+    changed = []
+    for g in games:
+        row = existing.get(g.gsis_id)
+        for _, _, vals in g._rows:
+            if row is None or any(row[k] != v for k, v in vals):
+                changed.append(g)
+                break
+    return changed
+
+
+def changed_generation(cursor, gsis_ids):
+    """
+    Returns the argument to give `nfldb.db._bump_generation` after
+    the games with identifiers in `gsis_ids` are saved: `gsis_ids` if
+    every game is already in the database, or `None` if any are new.
+    This must be called before the games are saved.
+    """
+    if len(gsis_ids) == 0:
+        return gsis_ids
+    cursor.execute('SELECT COUNT(*) AS n FROM game WHERE gsis_id IN %s',
+                   (tuple(gsis_ids),))
+    if cursor.fetchone()['n'] < len(set(gsis_ids)):
+        return None
+    return gsis_ids
+
+
 def update_nflgame_schedules():
     log('Updating schedule JSON database...')
     run_cmd(sys.executable, '-m', 'nflgame.update_sched')
     log('done.')
 
 
-def update_games(db, batch_size=5):
+def update_games(db, batch_size=5, bulk_load=False):
     """
     Does a single monolithic update of players, games, drives and
     plays.  If `update` terminates, then the database will be
@@ -341,6 +411,11 @@ def update_games(db, batch_size=5):
     The huge lock is used so that there aren't any races introduced
     when updating the database. Other clients will still be able to
     read from the database.
+
+    If `bulk_load` is true, then games without any drives are inserted
+    inside `nfldb.bulk_load`. This is much faster when inserting many
+    games, but reads of the play and play_player tables will also be
+    blocked until the update is done.
     """
     # The complexity of this function has one obvious culprit:
     # performance reasons. On the one hand, we want to make infrequent
@@ -388,22 +463,40 @@ def update_games(db, batch_size=5):
                 for table, prim, vals in g._rows:
                     insert.setdefault(table, []).append(vals)
             for table, vals in insert.items():
-                nfldb.db._big_insert(cursor, table, vals)
+                nfldb.db._big_copy(cursor, table, vals)
+            nfldb.db._bump_generation(cursor)
             log('done.')
 
         scheduled = games_scheduled(cursor)
         if len(scheduled) > 0:
             log('Bulk inserting data for %d games...' % len(scheduled))
-            bulk_insert_game_data(cursor, scheduled, batch_size=batch_size)
+            if bulk_load:
+                log('Disabling triggers and dropping statistic indexes... ',
+                    end='')
+                with nfldb.bulk_load(cursor):
+                    log('done.')
+                    bulk_insert_game_data(cursor, scheduled,
+                                          batch_size=batch_size)
+                    log('Rebuilding agg_play, player_game, indexes and '
+                        'statistics... ', end='')
+            else:
+                bulk_insert_game_data(cursor, scheduled, batch_size=batch_size)
+                nfldb.db._refresh_player_game(cursor, scheduled)
+            # Scheduled games are already in the database, so only
+            # cached results for them are invalidated.
+            nfldb.db._bump_generation(cursor, scheduled)
             log('done.')
 
         playing = games_in_progress(cursor)
         if len(playing) > 0:
             log('Updating %d games in progress...' % len(playing))
+            games = []
             for gid in playing:
                 g = game_from_id(cursor, gid)
                 log('\t%s' % g)
-                g._save(cursor)
+                games.append(g)
+            nfldb.Game._save_all(cursor, games)
+            nfldb.db._bump_generation(cursor, playing)
             log('done.')
 
         # This *must* come after everything else because it could set
@@ -417,10 +510,14 @@ def update_games(db, batch_size=5):
 def update_simulate(db):
     with nfldb.Tx(db) as cursor:
         log('Simulating %d games...' % len(_simulate['gsis_ids']))
+        gids = changed_generation(cursor, _simulate['gsis_ids'])
+        games = []
         for gid in _simulate['gsis_ids']:
             g = game_from_id_simulate(cursor, gid)
             log('\t%s' % g)
-            g._save(cursor)
+            games.append(g)
+        nfldb.Game._save_all(cursor, games)
+        nfldb.db._bump_generation(cursor, gids)
         log('done.')
 
         if len(_simulate['gsis_ids']) == 0:
@@ -442,7 +539,7 @@ def lock_tables(cursor):
 
 
 def run(player_interval=43200, interval=None, update_schedules=False,
-        batch_size=5, simulate=None):
+        batch_size=5, simulate=None, bulk_load=False):
     global _simulate
 
     if simulate is not None:
@@ -487,6 +584,7 @@ def run(player_interval=43200, interval=None, update_schedules=False,
         with nfldb.Tx(db) as cursor:
             cursor.execute('DELETE FROM game WHERE gsis_id IN %s',
                            (tuple(simulate),))
+            nfldb.db._bump_generation(cursor)
 
         if interval is None:
             # Simulation implies a repeated update at some interval.
@@ -522,7 +620,7 @@ def run(player_interval=43200, interval=None, update_schedules=False,
                 update_players(cursor, player_interval)
 
             # Now update games.
-            update_games(db, batch_size=batch_size)
+            update_games(db, batch_size=batch_size, bulk_load=bulk_load)
 
         log('Closing database connection... ', end='')
         db.close()
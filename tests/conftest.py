@@ -0,0 +1,25 @@
+import pytest
+from psycopg2.extras import RealDictCursor
+
+import nfldb
+
+
+@pytest.fixture
+def db(request):
+    """
+    A connection whose open transaction is rolled back (and which is
+    closed) when the test is done, so tests can write freely.
+    """
+    db = nfldb.connect()
+
+    def fin():
+        db.rollback()
+        db.close()
+    request.addfinalizer(fin)
+    return db
+
+
+@pytest.fixture
+def cursor(db):
+    """A dictionary cursor on the `db` fixture's connection."""
+    return db.cursor(cursor_factory=RealDictCursor)
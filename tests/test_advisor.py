@@ -0,0 +1,50 @@
+import nfldb
+import nfldb.advisor
+
+
+class Event (object):
+    def __init__(self, query, seconds=1.0):
+        self.query = query
+        self.seconds = seconds
+
+
+def test_shapes_team_disjunction():
+    advisor = nfldb.advisor.IndexAdvisor()
+    q = nfldb.Query(None).game(season_year=2013, week__ge=5, team='NE')
+    advisor(Event(q))
+    shapes = sorted((t, cols) for t, cols, _ in advisor.shapes())
+    assert shapes == [
+        ('game', [('away_team', 'eq'), ('season_year', 'eq'),
+                  ('week', 'range')]),
+        ('game', [('home_team', 'eq'), ('season_year', 'eq'),
+                  ('week', 'range')]),
+    ]
+
+
+def test_shapes_skip_derived_and_ne():
+    advisor = nfldb.advisor.IndexAdvisor()
+    q = nfldb.Query(None).play(down=3, offense_yds__ge=10, pos_team__ne='NE')
+    advisor(Event(q))
+    assert advisor.shapes() == [('play', [('down', 'eq')], 1)]
+
+
+def test_covered_partial():
+    covered = nfldb.advisor._covered
+    indexes = [(['player_id'], "(pos = 'K'::player_pos)")]
+    assert not covered(indexes, ['player_id'], "pos = 'QB'")
+    assert not covered(indexes, ['player_id'], None)
+    assert covered(indexes, ['player_id'], "pos = 'K'")
+    assert covered([(['player_id'], None)], ['player_id'], "pos = 'QB'")
+
+
+def test_suggest_composite():
+    db = nfldb.connect()
+    advisor = nfldb.advisor.IndexAdvisor()
+    q = nfldb.Query(db).play_player(player_id='00-0019596', team='NE')
+    advisor(Event(q))
+    with nfldb.Tx(db) as cursor:
+        cursor.execute('ANALYZE play_player')
+        suggestions = advisor.suggest(cursor)
+    assert len(suggestions) == 1
+    assert suggestions[0].table == 'play_player'
+    assert suggestions[0].columns == ['player_id', 'team']
@@ -0,0 +1,52 @@
+import pytest
+
+import nfldb
+import nfldb.aio
+
+
+def test_concurrent_games():
+    conns = [nfldb.aio.connect() for _ in range(3)]
+    pending = []
+    for week, conn in zip([1, 2, 3], conns):
+        q = nfldb.aio.AsyncQuery(conn).game(season_year=2013,
+                                            season_type='Regular', week=week)
+        pending.append(q.as_games_async())
+    assert [len(games) for games in nfldb.aio.wait(pending)] == [16] * 3
+
+
+def test_plays_fill():
+    db = nfldb.connect()
+    q = nfldb.Query(db).game(gsis_id='2013090800')
+    aq = nfldb.aio.AsyncQuery(nfldb.aio.connect()).game(gsis_id='2013090800')
+    plays = aq.as_plays_async().result()
+    expected = q.as_plays()
+    assert len(plays) == len(expected)
+    for p, e in zip(plays, expected):
+        assert p.play_id == e.play_id
+        assert len(p.play_players) == len(e.play_players)
+
+
+def test_aggregate():
+    aq = nfldb.aio.AsyncQuery(nfldb.aio.connect())
+    aq.game(season_year=2013, season_type='Regular')
+    aq.player(full_name='Tom Brady')
+    agg = aq.as_aggregate_async().result()
+    assert len(agg) == 1 and agg[0].passing_yds > 4000
+
+
+def test_lazy_load():
+    aq = nfldb.aio.AsyncQuery(nfldb.aio.connect(), db=nfldb.connect())
+    game = aq.game(gsis_id='2013090800').as_games_async().result()[0]
+    assert len(game.drives) > 0
+
+    aq = nfldb.aio.AsyncQuery(nfldb.aio.connect())
+    game = aq.game(gsis_id='2013090800').as_games_async().result()[0]
+    with pytest.raises(AssertionError):
+        game.drives
+
+
+def test_error():
+    aq = nfldb.aio.AsyncQuery(nfldb.aio.connect())
+    aq.sort('no_such_field')
+    with pytest.raises(ValueError):
+        aq.as_games_async().result()
@@ -0,0 +1,113 @@
+import nfldb
+import nfldb.cache
+import nfldb.db
+
+
+def check_bumped(db, cache, gsis_ids=None):
+    """
+    Bumps the data generation in a transaction that is rolled back,
+    and has `cache` check the generation from inside of it.
+    """
+    cursor = db.cursor()
+    try:
+        nfldb.db._bump_generation(cursor, gsis_ids)
+        cache._check(cursor, db.dsn)
+    finally:
+        db.rollback()
+
+
+def test_normalize_sql():
+    norm = nfldb.cache.normalize_sql
+    assert norm("SELECT  *\n  FROM game") == 'SELECT * FROM game'
+    assert norm("WHERE x = 'a  b'") != norm("WHERE x = 'a b'")
+
+
+def test_cache_hit(db):
+    cache = nfldb.cache.QueryCache()
+    q = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    first = q.as_plays()
+    second = q.as_plays()
+    assert cache.misses == 2  # plays and their play players
+    assert cache.hits == 2
+    assert len(first) == len(second)
+    assert first[0] is not second[0]
+    assert len(first[0].play_players) == len(second[0].play_players)
+
+
+def test_cache_invalidate(db):
+    cache = nfldb.cache.QueryCache(check_interval=0)
+    q = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    q.as_games()
+    assert len(cache) == 1
+    check_bumped(db, cache)
+    assert len(cache) == 0
+
+
+def test_cache_invalidate_game(db):
+    cache = nfldb.cache.QueryCache(check_interval=0)
+    ne = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    den = nfldb.Query(db, cache=cache).game(gsis_id='2013090500')
+    anywhere = nfldb.Query(db, cache=cache).play(down=4)
+    for q in (ne, den, anywhere):
+        q.as_games()
+    assert len(cache) == 3
+    check_bumped(db, cache, ['2013090800'])
+    assert len(cache) == 1
+
+    # The bump was rolled back, so checking again would see the
+    # generation go backwards and drop everything.
+    cache.check_interval = 60
+    den.as_games()
+    assert cache.hits == 1
+
+
+def test_cache_bypassed_after_writes(db):
+    cache = nfldb.cache.QueryCache(check_interval=0)
+    q = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    cursor = db.cursor()
+    try:
+        cursor.execute('UPDATE game SET home_score = home_score + 100 '
+                       'WHERE gsis_id = %s', ('2013090800',))
+        assert q.as_games()[0].home_score >= 100
+        assert len(cache) == 0 and cache.misses == 0
+    finally:
+        db.rollback()
+    assert q.as_games()[0].home_score < 100
+    assert len(cache) == 1
+
+
+def test_cache_eviction(db):
+    cache = nfldb.cache.QueryCache()
+    nfldb.Query(db, cache=cache).game(gsis_id='2013090800').as_games()
+    cache.max_bytes = cache.size
+    nfldb.Query(db, cache=cache).game(gsis_id='2013090500').as_games()
+    assert len(cache) == 1
+    assert cache.size <= cache.max_bytes
+
+
+def test_cache_invalidate_players(db):
+    cache = nfldb.cache.QueryCache(check_interval=0)
+    game = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    brady = nfldb.Query(db, cache=cache).game(gsis_id='2013090800') \
+                                        .player(full_name='Tom Brady')
+    game.as_plays(fill=False)
+    brady.as_plays(fill=False)
+    game.as_players()
+    assert len(cache) == 3
+    check_bumped(db, cache, [])
+    assert len(cache) == 1
+
+
+def test_cache_writes_checked_once(db):
+    cache = nfldb.cache.QueryCache(check_interval=0)
+    q = nfldb.Query(db, cache=cache).game(gsis_id='2013090800')
+    q.as_plays()
+    events = []
+    hook = events.append
+    nfldb.add_query_hook(hook)
+    try:
+        q.as_plays()
+    finally:
+        nfldb.remove_query_hook(hook)
+    assert cache.hits == 2
+    assert not any('pg_locks' in e.sql for e in events)
@@ -0,0 +1,142 @@
+import pytest
+
+import nfldb
+
+
+@pytest.fixture
+def pool(request):
+    p = nfldb.pool(minconn=1, maxconn=2)
+    request.addfinalizer(p.close)
+    return p
+
+
+def test_pool_checkout_checkin(pool):
+    db = pool.checkout()
+    try:
+        assert nfldb.schema_version(db) == nfldb.api_version
+    finally:
+        pool.checkin(db)
+
+
+def test_pool_connection_query(pool):
+    with pool.connection() as db:
+        q = nfldb.Query(db).game(gsis_id='2013090800')
+        assert len(q.as_games()) == 1
+
+
+def test_pool_checkin_dead(pool):
+    dead = pool.checkout()
+    dead.cursor().execute('SELECT 1')
+    with pool.connection() as db:
+        db.cursor().execute('SELECT pg_terminate_backend(%s)',
+                            (dead.get_backend_pid(),))
+    pool.checkin(dead)
+
+    # Both connections can still be checked out, so the dead one was
+    # given back.
+    db1, db2 = pool.checkout(), pool.checkout()
+    try:
+        assert nfldb.schema_version(db1) == nfldb.api_version
+        assert nfldb.schema_version(db2) == nfldb.api_version
+    finally:
+        pool.checkin(db1)
+        pool.checkin(db2)
+
+
+def test_pool_timezone(pool):
+    conf, _ = nfldb.db.config()
+    with pool.connection() as db:
+        with nfldb.Tx(db) as cursor:
+            cursor.execute('SHOW timezone')
+            assert cursor.fetchone()['TimeZone'] == conf['timezone']
+
+
+def test_big_upsert(cursor):
+    db = cursor.connection
+    games = nfldb.Query(db).game(gsis_id=['2013090800', '2013090500'])
+    games = games.as_games()
+    for g in games:
+        g.home_score += 100
+    rows = [vals for g in games for _, _, vals in g._rows]
+    nfldb.db._big_upsert(cursor, 'game', rows, ['gsis_id'])
+    cursor.execute('''
+        SELECT gsis_id, home_score FROM game WHERE gsis_id IN %s
+    ''', (tuple(g.gsis_id for g in games),))
+    got = dict((r['gsis_id'], r['home_score']) for r in cursor.fetchall())
+    assert got == dict((g.gsis_id, g.home_score) for g in games)
+
+
+def test_bulk_load_restores_schema(cursor):
+    cursor.execute('SELECT COUNT(*) AS n FROM pg_indexes')
+    indexes = cursor.fetchone()['n']
+    with nfldb.bulk_load(cursor):
+        cursor.execute('DELETE FROM agg_play')
+    cursor.execute('SELECT COUNT(*) AS n FROM pg_indexes')
+    assert cursor.fetchone()['n'] == indexes
+    assert nfldb.db._num_rows(cursor, 'agg_play') \
+        == nfldb.db._num_rows(cursor, 'play')
+
+
+def test_agg_play_delta_trigger(cursor):
+    pid = ('2013090800', 1, 39)
+    cursor.execute('''
+        UPDATE play_player SET passing_yds = passing_yds + 10
+        WHERE (gsis_id, drive_id, play_id) = (%s, %s, %s)
+    ''', pid)
+    cursor.execute('''
+        DELETE FROM play_player
+        WHERE (gsis_id, drive_id, play_id) = (%s, %s, %s)
+              AND player_id = (
+                SELECT MIN(player_id) FROM play_player
+                WHERE (gsis_id, drive_id, play_id) = (%s, %s, %s)
+              )
+    ''', pid + pid)
+    cursor.execute('''
+        SELECT passing_yds FROM agg_play
+        WHERE (gsis_id, drive_id, play_id) = (%s, %s, %s)
+    ''', pid)
+    agg = cursor.fetchone()['passing_yds']
+    cursor.execute('''
+        SELECT COALESCE(SUM(passing_yds), 0) AS s FROM play_player
+        WHERE (gsis_id, drive_id, play_id) = (%s, %s, %s)
+    ''', pid)
+    assert agg == cursor.fetchone()['s']
+
+
+def test_refresh_player_game(cursor):
+    gsis_id = '2013090800'
+    cursor.execute('''
+        UPDATE play_player SET passing_yds = passing_yds + 10
+        WHERE gsis_id = %s
+    ''', (gsis_id,))
+    nfldb.db._refresh_player_game(cursor, [gsis_id])
+    cursor.execute('''
+        SELECT COUNT(*) AS n
+        FROM player_game AS pg
+        FULL JOIN (
+            SELECT gsis_id, player_id, team, SUM(passing_yds) AS s
+            FROM play_player
+            WHERE gsis_id = %s
+            GROUP BY gsis_id, player_id, team
+        ) AS pp USING (gsis_id, player_id, team)
+        WHERE gsis_id = %s AND pg.passing_yds IS DISTINCT FROM pp.s
+    ''', (gsis_id, gsis_id))
+    assert cursor.fetchone()['n'] == 0
+
+
+def test_save_refreshes_player_game(cursor):
+    g = nfldb.Game.load_full(cursor.connection, '2013090800')
+    pp = [pp for d in g.drives for p in d.plays
+          for pp in p.play_players][0]
+    pp.passing_yds += 10
+    nfldb.Game._save_all(cursor, [g])
+    cursor.execute('''
+        SELECT passing_yds FROM player_game
+        WHERE (gsis_id, player_id, team) = (%s, %s, %s)
+    ''', (pp.gsis_id, pp.player_id, pp.team))
+    got = cursor.fetchone()['passing_yds']
+    cursor.execute('''
+        SELECT SUM(passing_yds) AS s FROM play_player
+        WHERE (gsis_id, player_id, team) = (%s, %s, %s)
+    ''', (pp.gsis_id, pp.player_id, pp.team))
+    assert got == cursor.fetchone()['s']
@@ -0,0 +1,54 @@
+import contextlib
+
+import nfldb
+import nfldb.instrument
+
+
+@contextlib.contextmanager
+def hooked(hook, explain=0.0):
+    nfldb.add_query_hook(hook, explain=explain)
+    try:
+        yield
+    finally:
+        nfldb.remove_query_hook(hook)
+
+
+def test_query_shape():
+    shape = nfldb.instrument.query_shape
+    a = "SELECT * FROM play WHERE gsis_id IN ('2013090800', '2013090500')"
+    b = "SELECT * FROM play WHERE gsis_id IN ('2012090900')"
+    assert shape(a) == shape(b)
+    assert shape("SELECT  1\n  WHERE x = 5") == 'SELECT ? WHERE x = ?'
+
+
+def test_hook_caller():
+    db = nfldb.connect()
+    events = []
+    with hooked(events.append):
+        nfldb.Query(db).game(gsis_id='2013090800').as_games()
+    assert len(events) == 1
+    assert events[0].caller == 'Query.as_games'
+    assert events[0].rows == 1
+
+
+def test_hook_stream_rows():
+    db = nfldb.connect()
+    events = []
+    with hooked(events.append):
+        q = nfldb.Query(db).game(gsis_id='2013090800')
+        n = len(list(q.iter_play_players(itersize=10)))
+    assert [e.caller for e in events] == ['Query.iter_play_players']
+    assert events[0].rows == n
+
+
+def test_hook_explain_histogram():
+    db = nfldb.connect()
+    hist = nfldb.instrument.LatencyHistogram()
+    with hooked(hist, explain=1.0):
+        for week in (1, 2):
+            nfldb.Query(db).game(season_year=2013, week=week).as_games()
+    shapes = hist.shapes()
+    assert len(shapes) == 1
+    assert hist.count(shapes[0]) == 2
+    assert hist.callers(shapes[0]) == ['Query.as_games']
+    assert 'actual time' in hist.plan(shapes[0])
@@ -0,0 +1,56 @@
+import pytest
+
+import nfldb
+import nfldb.parallel
+
+
+@pytest.fixture(scope='module')
+def pool():
+    return nfldb.pool(maxconn=4)
+
+
+def key(pps, field):
+    return [(pp.player_id, getattr(pp, field)) for pp in pps]
+
+
+@pytest.mark.parametrize('by', ['season', 'week'])
+def test_aggregate(pool, by):
+    with pool.connection() as db:
+        q = nfldb.Query(db).game(season_year=2013, season_type='Regular')
+        q.aggregate(passing_yds__ge=1000).sort('passing_yds').limit(10)
+        expected = q.as_aggregate()
+    got = nfldb.parallel.as_aggregate(pool, q, by=by)
+    assert key(got, 'passing_yds') == key(expected, 'passing_yds')
+    assert key(got, 'offense_yds') == key(expected, 'offense_yds')
+
+
+def test_aggregate_derived(pool):
+    with pool.connection() as db:
+        q = nfldb.Query(db).game(season_year=2013, season_type='Regular')
+        q.aggregate(offense_yds__ge=1000).sort('offense_yds')
+        expected = q.as_aggregate()
+    got = nfldb.parallel.as_aggregate(pool, q)
+    assert key(got, 'offense_yds') == key(expected, 'offense_yds')
+
+
+def test_play_players(pool):
+    with pool.connection() as db:
+        q = nfldb.Query(db).player(full_name='Tom Brady')
+        q.sort('passing_yds').limit(5)
+        expected = q.as_play_players()
+    got = nfldb.parallel.as_play_players(pool, q)
+    assert [pp.passing_yds for pp in got] \
+        == [pp.passing_yds for pp in expected]
+
+
+def test_lazy_load(pool):
+    db = nfldb.connect()
+    q = nfldb.Query(db).game(season_year=2013, season_type='Regular')
+    q.player(full_name='Tom Brady')
+    got = nfldb.parallel.as_aggregate(pool, q, db=db)
+    assert got[0]._db is db
+    assert got[0].player.full_name == 'Tom Brady'
+
+    got = nfldb.parallel.as_aggregate(pool, q)
+    with pytest.raises(AssertionError):
+        got[0].player
@@ -195,3 +195,378 @@ def test_fill_play_player(db):
         assert pp._play is not None
         assert pp._play._drive is not None
         assert pp._play._drive._game is not None
+
+
+def test_iter_games(q):
+    gids = [g.gsis_id for g in q.game(week=1).sort('gsis_id').iter_games()]
+    assert gids == [g.gsis_id for g in q.as_games()]
+
+
+def test_iter_plays_fill(qgame):
+    plays = list(qgame.play(passing_yds__ge=20).iter_plays(itersize=3))
+    expected = qgame.as_plays()
+    assert len(plays) == len(expected)
+    for p, e in zip(plays, expected):
+        assert p.play_id == e.play_id
+        assert len(p.play_players) == len(e.play_players)
+
+
+def test_iter_aggregate(qgame):
+    qgame.aggregate(passing_yds__ge=100)
+    agg = list(qgame.iter_aggregate(itersize=1))
+    assert len(agg) == len(qgame.as_aggregate())
+
+
+def test_as_plays_fill_sorted_limit(qgame):
+    qgame.play(passing_yds__ge=1).sort('passing_yds').limit(5)
+    plays = qgame.as_plays()
+    assert len(plays) == 5
+    for p in plays:
+        pps = nfldb.Query(qgame._db).play_player(
+            gsis_id=p.gsis_id, drive_id=p.drive_id, play_id=p.play_id)
+        assert len(p.play_players) == len(pps.as_play_players())
+
+
+def test_compiled_params():
+    cq = nfldb.query.CompiledQuery(
+        None, nfldb.Game, "SELECT $(a) WHERE x = '$(b)' AND y IN ($(c), $(a))")
+    assert cq.params == ['a', 'c']
+    assert cq.sql == "SELECT $1 WHERE x = '$(b)' AND y IN ($2, $1)"
+
+
+def test_compile_games(q):
+    compiled = q.game(week=nfldb.Param('week'), team=nfldb.Param('team')) \
+                .compile(nfldb.Game)
+    for week in (1, 2, 17):
+        games = compiled.execute(week=week, team='NE')
+        assert len(games) == 1
+        assert games[0].week == week
+        assert 'NE' in (games[0].home_team, games[0].away_team)
+
+
+def test_compile_param_in_list(q):
+    compiled = q.game(week=[1, nfldb.Param('week')]).compile(nfldb.Game)
+    games = compiled.execute(week=2)
+    assert len(games) == 32
+    assert set(g.week for g in games) == set([1, 2])
+
+
+def test_param_outside_compile(q):
+    q.game(week=[1, nfldb.Param('week')])
+    with pytest.raises(AssertionError):
+        q.as_games()
+    with pytest.raises(AssertionError):
+        q.count(nfldb.Game)
+    with pytest.raises(AssertionError):
+        q.show_where()
+
+
+def test_compile_aggregate(q):
+    q.player(full_name=nfldb.Param('name')).aggregate(passing_yds__ge=1)
+    compiled = q.compile(nfldb.PlayPlayer)
+    agg = compiled.execute(name='Tom Brady')
+    assert len(agg) == 1
+    assert agg[0].passing_yds > 4000
+
+
+def test_load_full(db):
+    g = nfldb.Game.load_full(db, '2013090800')
+    events = []
+    hook = events.append
+    nfldb.add_query_hook(hook)
+    try:
+        pps = g.play_players
+        assert len(g.players) > 0
+        for d in g.drives:
+            assert d.game is g
+            for p in d.plays:
+                assert p.drive is d
+                for pp in p.play_players:
+                    assert pp.play is p
+    finally:
+        nfldb.remove_query_hook(hook)
+    assert len(events) == 0
+    q = nfldb.Query(db).game(gsis_id=g.gsis_id)
+    assert len(g.plays) == len(q.as_plays())
+    assert len(pps) == len(q.as_play_players())
+
+
+def test_load_full_many(db):
+    gids = ['2013090800', '2013090500', '0000000000']
+    games = nfldb.Game.load_full_many(db, gids)
+    assert [g.gsis_id for g in games] == gids[0:2]
+    for g in games:
+        assert all(d.gsis_id == g.gsis_id for d in g.drives)
+
+
+def test_entities_by_ids(db):
+    pps = nfldb.Query(db).game(gsis_id='2013090800').as_play_players()
+    pk = nfldb.PlayPlayer._sql_tables['primary']
+    ids = [tuple(getattr(pp, k) for k in pk) for pp in pps]
+    found = nfldb.query._entities_by_ids(db, nfldb.PlayPlayer, *ids)
+    assert sorted(tuple(getattr(pp, k) for k in pk) for pp in found) \
+        == sorted(ids)
+
+    # Prefixes of a primary key are allowed too.
+    drives = nfldb.query._entities_by_ids(db, nfldb.Drive, ('2013090800',))
+    assert len(drives) == len(nfldb.Game.from_id(db, '2013090800').drives)
+
+
+def test_fill_plays_fills_play_players(q):
+    pps = q.game(gsis_id='2013090800').limit(20).as_play_players()
+    nfldb.PlayPlayer.fill_plays(q._db, pps)
+    for pp in pps:
+        assert pp._play._play_players is not None
+        assert any(p.player_id == pp.player_id
+                   for p in pp._play._play_players)
+
+
+def test_as_arrays(q):
+    np = pytest.importorskip('numpy')
+    q.game(week=1, team='NE').sort('passing_yds').limit(50)
+    pps = q.as_play_players()
+    arrays = q.as_arrays(nfldb.PlayPlayer, ['player_id', 'passing_yds'])
+    assert arrays.keys() == ['player_id', 'passing_yds']
+    assert arrays['passing_yds'].dtype == np.int16
+    assert list(arrays['player_id']) == [pp.player_id for pp in pps]
+    assert list(arrays['passing_yds']) == [pp.passing_yds for pp in pps]
+
+
+def test_as_arrays_encoded(q):
+    pytest.importorskip('numpy')
+    q.game(gsis_id='2013090800')
+    plays = dict(((p.drive_id, p.play_id), p)
+                 for p in q.as_plays(fill=False))
+    arrays = q.as_arrays(nfldb.Play,
+                         ['drive_id', 'play_id', 'time', 'yardline'])
+    assert len(arrays['time']) == len(plays)
+    for i in xrange(len(plays)):
+        p = plays[(arrays['drive_id'][i], arrays['play_id'][i])]
+        assert arrays['time'][i] == p.time.phase.value * 901 + p.time.elapsed
+        if p.yardline.valid:
+            assert arrays['yardline'][i] == p.yardline._offset
+
+    games = q.as_arrays(nfldb.Game, ['season_type'])
+    regular = nfldb.Enums.season_phase.Regular.value
+    assert list(games['season_type']) == [regular]
+
+
+def test_aggregate_group_by(q):
+    q.player(full_name='Tom Brady')
+    weeks = q.as_aggregate(group_by=['week', 'opponent'])
+    assert [pp.week for pp in weeks] == sorted(pp.week for pp in weeks)
+    assert weeks[0].opponent == 'BUF'
+
+    total = q.as_aggregate()[0]
+    assert sum(pp.passing_yds for pp in weeks) == total.passing_yds
+
+
+def test_aggregate_group_by_sort_limit(q):
+    q.aggregate(passing_yds__ge=400).sort('passing_yds').limit(3)
+    games = q.as_aggregate(group_by=['gsis_id'])
+    assert len(games) == 3
+    assert all(pp.passing_yds >= 400 for pp in games)
+    assert games[0].passing_yds >= games[1].passing_yds >= games[2].passing_yds
+
+
+def test_team_aggregate(db, q):
+    teams = q.as_team_aggregate()
+    assert len(teams) == 32
+
+    game = nfldb.Query(db).game(gsis_id='2013090800')
+    games = game.as_team_aggregate(per_game=True)
+    assert sorted(t.team for t in games) == ['BUF', 'NE']
+    pps = game.as_play_players()
+    for t in games:
+        assert t.gsis_id == '2013090800'
+        team_pps = [pp for pp in pps if pp.team == t.team]
+        assert t.passing_yds == sum(pp.passing_yds for pp in team_pps)
+
+        # Receiving statistics repeat passing statistics, so they
+        # aren't counted again in the team's derived fields.
+        assert t.offense_yds == sum(pp.passing_yds + pp.rushing_yds
+                                    + pp.fumbles_rec_yds for pp in team_pps)
+        assert t.points == sum(
+            6 * (pp.defense_frec_tds + pp.defense_int_tds
+                 + pp.defense_misc_tds + pp.fumbles_rec_tds
+                 + pp.kicking_rec_tds + pp.kickret_tds + pp.passing_tds
+                 + pp.puntret_tds + pp.rushing_tds)
+            + pp.kicking_xpmade + 3 * pp.kicking_fgm
+            + 2 * (pp.passing_twoptm + pp.rushing_twoptm + pp.defense_safe)
+            for pp in team_pps)
+        plays = nfldb.Query(db).game(gsis_id='2013090800') \
+                               .play(pos_team=t.team).as_plays(fill=False)
+        assert t.first_down == sum(p.first_down for p in plays)
+
+
+def test_team_aggregate_sort_limit(q):
+    teams = q.sort('offense_yds').limit(5).as_team_aggregate()
+    assert len(teams) == 5
+    yds = [t.offense_yds for t in teams]
+    assert yds == sorted(yds, reverse=True)
+
+
+def test_explain(q):
+    e = q.explain(nfldb.Game)
+    assert not e.fanout and not e.analyzed and e.time is None
+    assert 'FROM game' in e.sql
+    assert e.cost > 0
+
+    q.play(third_down_att=1)
+    e = q.explain(nfldb.Game, analyze=True)
+    assert e.fanout and e.analyzed and e.time is not None
+    assert 'GROUP BY' in e.sql
+    assert 'Actual Rows' in e.plan['Plan']
+    assert str(e).startswith(e.sql.strip())
+
+
+def test_explain_aggregate(q):
+    e = q.explain(nfldb.PlayPlayer, aggregate=True)
+    assert 'player_game' in e.sql and not e.fanout
+    e = q.explain(nfldb.PlayPlayer, group_by=['drive_id'])
+    assert 'player_game' not in e.sql and 'GROUP BY' in e.sql
+
+    q.play_player(team='NE')
+    e = q.explain(nfldb.Team, aggregate=True, per_game=True)
+    assert 'pos_team' in e.sql and e.fanout
+
+
+def test_page(q):
+    q.game(gsis_id='2013090800')
+    expected = q.as_plays(fill=False)
+    pages, plays = [], q.page(50).as_plays(fill=False)
+    while len(plays) > 0:
+        assert len(plays) <= 50
+        pages += plays
+        plays = q.page(50, after=plays[-1]).as_plays(fill=False)
+    assert [p.play_id for p in pages] == [p.play_id for p in expected]
+
+
+def test_page_sorted(q):
+    q.game(week=1).sort('passing_yds')
+    expected = q.limit(30).as_play_players()
+    first = q.page(10).as_play_players()
+    last = first[-1]
+    key = (last.passing_yds, last.gsis_id, last.drive_id, last.play_id,
+           last.player_id)
+    second = q.page(20, after=key).as_play_players()
+    assert [pp.passing_yds for pp in first + second] \
+        == [pp.passing_yds for pp in expected]
+    ids = [(pp.gsis_id, pp.drive_id, pp.play_id, pp.player_id)
+           for pp in first + second]
+    assert len(set(ids)) == 30
+
+
+def test_sort_joined_entity(db):
+    q = nfldb.Query(db).game(season_year=2013, season_type='Regular')
+    q.sort([('game.start_time', 'desc'), ('time', 'desc')]).limit(20)
+    plays = q.as_plays(fill=False)
+    assert len(plays) == 20
+    last = max(g.start_time for g in nfldb.Query(db).game(
+        season_year=2013, season_type='Regular').as_games())
+    assert plays[0].game.start_time == last
+    assert plays[0].time >= plays[1].time
+
+
+def test_sort_joined_entity_grouped(q):
+    q.play_player(team='NE').sort(('game', 'week', 'asc')).limit(5)
+    plays = q.as_plays(fill=False)
+    assert all(p.gsis_id == plays[0].gsis_id for p in plays)
+    assert plays[0].game.week == 1
+
+
+def test_sort_more_specific_entity(q):
+    with pytest.raises(ValueError):
+        q.sort('play.down').as_games()
+
+
+def test_count(q):
+    assert q.count(nfldb.Game) == len(q.as_games())
+    q.game(week=1).play(third_down_att=1)
+    assert q.count(nfldb.Game) == len(q.as_games())
+    assert q.count(nfldb.Play) == len(q.as_plays(fill=False))
+    assert q.count(nfldb.Player) == len(q.as_players())
+
+
+def test_exists(q):
+    assert q.exists(nfldb.Play)
+    assert not q.game(week=1).play(down=5).exists(nfldb.Game)
+
+
+def test_fields_projection(q):
+    q.game(gsis_id='2013090800')
+    full = q.as_plays(fill=False)
+    plays = q.as_plays(fill=False, fields=['description', 'time'])
+    assert [p.description for p in plays] == [p.description for p in full]
+    assert [p.play_id for p in plays] == [p.play_id for p in full]
+
+    # Other fields are loaded when used, for every play at once.
+    assert plays[0].yardline == full[0].yardline
+    assert plays[0].passing_yds == full[0].passing_yds
+    assert all(p._partial is None for p in plays)
+    assert all(p._play_players is None for p in plays)
+    assert [p.yardline for p in plays] == [p.yardline for p in full]
+    assert all(p._partial is None for p in full)
+
+
+def test_fields_projection_game(q):
+    games = q.game(week=1).as_games(fields=['home_team'])
+    assert len(games) == 16
+    assert all(g.away_team is not None for g in games)
+    with pytest.raises(AssertionError):
+        q.as_games(fields=['not_a_field'])
+
+
+def test_derived_stored(q):
+    q.game(week=1).play_player(offense_yds__ge=50)
+    pps = q.as_play_players()
+    assert len(pps) > 0
+    for pp in pps:
+        assert pp.offense_yds == max(pp.passing_yds, pp.rushing_yds,
+                                     pp.receiving_yds, pp.fumbles_rec_yds)
+
+
+def test_derived_offense_yds_eq_zero(q):
+    q.game(gsis_id='2013090800').play_player(offense_yds=0)
+    assert all(pp.offense_yds == 0 for pp in q.as_play_players())
+
+
+def test_game_date(q):
+    q.game(gsis_id='2013090800')
+    plays = q.play(game_date='20130908').as_plays(fill=False)
+    assert len(plays) > 0
+    assert all(p.game_date == '20130908' for p in plays)
+
+
+def test_aggregate_player_game(q):
+    q.player(full_name='Tom Brady').aggregate(passing_yds__ge=1)
+    assert 'player_game' in q.explain(nfldb.PlayPlayer).sql
+    rollup = q.as_aggregate()
+
+    # Play player criteria on a column that `player_game` doesn't have
+    # force the statistics to be summed from `play_player`.
+    q.play_player(drive_id__ge=0)
+    assert 'player_game' not in q.explain(nfldb.PlayPlayer).sql
+    plays = q.as_aggregate()
+    assert len(rollup) == len(plays) == 1
+    assert rollup[0].passing_yds == plays[0].passing_yds
+    assert rollup[0].offense_yds == plays[0].offense_yds
+    assert rollup[0].points == plays[0].points
+
+
+def test_aggregate_player_game_group_by(q):
+    q.player(full_name='Tom Brady')
+    weeks = q.as_aggregate(group_by=['week'])
+    drives = q.as_aggregate(group_by=['week', 'drive_id'])
+    assert sum(pp.passing_yds for pp in weeks) \
+        == sum(pp.passing_yds for pp in drives)
+
+
+def test_aggregate_player_game_derived(q):
+    # `player_game` has no derived columns, so aggregate criteria on
+    # them are applied to sums over `play_player`.
+    q.aggregate(offense_yds__ge=1000)
+    assert 'player_game' not in q.explain(nfldb.PlayPlayer).sql
+    pps = q.as_aggregate()
+    assert len(pps) > 0
+    assert all(pp.offense_yds >= 1000 for pp in pps)